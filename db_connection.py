@@ -1,7 +1,156 @@
+import asyncio
+import logging
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
 import pymongo
+from django.conf import settings
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_client = None
+_client_pid = None
+
+# PID of the process whose pool warm_pool has warmed
+_warmed_pid = None
+
+# One AsyncMongoClient per event loop; a client cannot be shared across loops
+_async_clients = weakref.WeakKeyDictionary()
+
+# Client serving async views in place of those, set by use_client
+_async_client = None
+
+
+def client_options():
+    """Keyword arguments for MongoClient from settings.MONGO['OPTIONS']"""
+    options = settings.MONGO.get('OPTIONS', {})
+    return {key: value for key, value in options.items() if value is not None}
+
+
+def get_client():
+    """The process's MongoClient, created on first use.
+
+    A client must not be shared across fork(), so the client is tied to the
+    PID that created it and is rebuilt in a forked child (e.g. a gunicorn
+    worker forked from a master that imported the app).
+    """
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _lock:
+            if _client is None or _client_pid != os.getpid():
+                _client = pymongo.MongoClient(
+                    settings.MONGO['URL'], connect=False, **client_options()
+                )
+                _client_pid = os.getpid()
+    return _client
+
+
+def use_client(client, async_client=None):
+    """Serve this process from ``client`` instead of a client connected to
+    MONGO['URL'], such as an in-memory stand-in for benchmarks and tests,
+    and async views from ``async_client`` when given; None goes back to
+    connecting on next use"""
+    global _client, _client_pid, _async_client
+    with _lock:
+        _client = client
+        _client_pid = os.getpid()
+        _async_client = async_client
+
+
+def get_db():
+    """The application database on the process's MongoClient"""
+    return get_client()[settings.MONGO['NAME']]
+
+
+def get_async_db():
+    """Database handle backed by an AsyncMongoClient, for async views.
+
+    The client is created on first use from the running event loop, so it
+    binds to the loop of the ASGI worker serving requests.
+    """
+    if _async_client is not None:
+        return _async_client[settings.MONGO['NAME']]
+    loop = asyncio.get_running_loop()
+    if loop not in _async_clients:
+        _async_clients[loop] = pymongo.AsyncMongoClient(
+            settings.MONGO['URL'], **client_options()
+        )
+    return _async_clients[loop][settings.MONGO['NAME']]
+
+
+def _reset_after_fork():
+    """Drop clients inherited from the parent; the child creates its own"""
+    global _client, _client_pid, _lock, _async_client
+    _client = None
+    _client_pid = None
+    _lock = threading.Lock()
+    _async_clients.clear()
+    _async_client = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def warm_pool(connections=None):
+    """Open connections ahead of the first request.
+
+    Runs ``connections`` concurrent pings (default: the pool's minPoolSize, at
+    least one) so that many sockets are established and authenticated. A
+    server that is down is logged rather than raised, so workers still start.
+    Does nothing once the process's pool is warm, so it can be called both
+    when the app is imported and when a server's worker starts (see
+    gunicorn.conf.py); a forked worker has a pool of its own to warm.
+    """
+    global _warmed_pid
+    if _warmed_pid == os.getpid():
+        return
+    _warmed_pid = os.getpid()
+    if connections is None:
+        connections = client_options().get('minPoolSize') or 1
+    client = get_client()
+    try:
+        with ThreadPoolExecutor(max_workers=connections) as pool:
+            list(pool.map(lambda _: client.admin.command('ping'), range(connections)))
+    except PyMongoError as exc:
+        logger.warning('Could not warm the MongoDB connection pool: %s', exc)
+
+
+class LazyCollection:
+    """A collection handle that resolves against the current process's client.
+
+    Models bind ``collection = db['name']`` at import time; resolving on each
+    use keeps that import from connecting and keeps it valid after fork.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(get_db()[self.name], attr)
+
+    def __repr__(self):
+        return f'LazyCollection({self.name!r})'
+
+
+class LazyDatabase:
+    """Stand-in for the module-level ``db`` that hands out lazy collections"""
+
+    def __getitem__(self, name):
+        return LazyCollection(name)
+
+    def __getattr__(self, attr):
+        return getattr(get_db(), attr)
+
 
-url = 'mongodb://localhost:27017'
-client = pymongo.MongoClient(url)
+db = LazyDatabase()
 
-db = client['inventory']
 
+def __getattr__(name):
+    # Backwards compatibility for code importing the old module-level client
+    if name == 'client':
+        return get_client()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
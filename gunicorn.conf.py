@@ -0,0 +1,19 @@
+"""
+gunicorn configuration, read from the working directory by default.
+
+wsgi.py and asgi.py warm the MongoDB connection pool when they are imported.
+Under ``--preload`` that import happens once in the master, and each forked
+worker drops the master's client (see db_connection._reset_after_fork), so
+the workers would serve their first requests on a cold pool. This hook warms
+every worker's own pool once it has loaded the app; without ``--preload`` the
+pool is already warm by then and it does nothing.
+"""
+
+
+def post_worker_init(worker):
+    from django.conf import settings
+
+    from db_connection import warm_pool
+
+    if settings.MONGO.get('WARM_POOL'):
+        warm_pool()
@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
+from db_connection import warm_pool
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'inventory_db.settings')
 
 application = get_asgi_application()
+
+if settings.MONGO.get('WARM_POOL'):
+    warm_pool()
@@ -0,0 +1,653 @@
+import asyncio
+import json
+import random
+import re
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from django.test import RequestFactory
+from django.urls import resolve
+from pymongo import monitoring
+
+# Benchmark scenarios run by `manage.py benchmark`, keyed by name. Each takes
+# the parsed command options and returns a dict of results.
+SCENARIOS = {}
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts the commands sent to MongoDB, i.e. round trips"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def started(self, event):
+        with self.lock:
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+# Registered on import, before the benchmark command creates a client, so
+# that every client it uses reports here. The mongomock stand-in sends no
+# commands and reports no round trips.
+commands = CommandCounter()
+monitoring.register(commands)
+
+
+def scenario(name):
+    """Register a benchmark scenario under ``name``"""
+
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+
+    return register
+
+
+def summarize(latencies, elapsed):
+    """Throughput and latency percentiles (in ms) for a list of request timings"""
+    latencies = sorted(latencies)
+    if not latencies:
+        return {"requests": 0}
+
+    def percentile(p):
+        return round(
+            latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 2
+        )
+
+    return {
+        "requests": len(latencies),
+        "requests_per_sec": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+    }
+
+
+def run_sync(view, path, requests, concurrency):
+    """Call a sync view ``requests`` times from a pool of ``concurrency`` threads,
+    the way a threaded WSGI server would serve it."""
+    factory = RequestFactory()
+
+    def call(_):
+        started = time.perf_counter()
+        response = view(factory.get(path))
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} returned {response.status_code}")
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(call, range(requests)))
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def run_async(view, path, requests, concurrency):
+    """Await an async view ``requests`` times with at most ``concurrency`` in
+    flight on a single event loop, the way an ASGI worker would serve it."""
+    factory = RequestFactory()
+
+    async def call(semaphore):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await view(factory.get(path))
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} returned {response.status_code}")
+            return time.perf_counter() - started
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*(call(semaphore) for _ in range(requests)))
+
+    started = time.perf_counter()
+    latencies = asyncio.run(main())
+    return summarize(latencies, time.perf_counter() - started)
+
+
+@scenario("async_views")
+def async_views(options):
+    """Compare the sync and async product views under concurrent load"""
+    from products import async_views, views
+
+    endpoints = [
+        (
+            "detail",
+            "/products/products/{id}/",
+            views.ProductDetailView,
+            async_views.AsyncProductDetailView,
+        ),
+        (
+            "sort",
+            "/products/products/sort/?sort_by=price&limit=50",
+            views.ProductSortView,
+            async_views.AsyncProductSortView,
+        ),
+        (
+            "search",
+            "/products/products/search/?prefix=a&limit=50",
+            views.ProductSearchView,
+            async_views.AsyncProductSearchView,
+        ),
+        (
+            "metrics",
+            "/products/products/metrics/",
+            views.ProductMetricsView,
+            async_views.AsyncProductMetricsView,
+        ),
+    ]
+
+    from products.models import Product
+
+    product = Product.collection.find_one({}, {"_id": 1})
+    if not product:
+        raise RuntimeError("No products to benchmark; seed the database first")
+
+    results = {}
+    for name, path, sync_view, async_view in endpoints:
+        path = path.format(id=product["_id"])
+        kwargs = {"product_id": str(product["_id"])} if name == "detail" else {}
+        sync_call = sync_view.as_view()
+        async_call = async_view.as_view()
+        results[name] = {
+            "sync": run_sync(
+                lambda request: sync_call(request, **kwargs),
+                path,
+                options["requests"],
+                options["concurrency"],
+            ),
+            "async": run_async(
+                lambda request: async_call(request, **kwargs),
+                path,
+                options["requests"],
+                options["concurrency"],
+            ),
+        }
+    return results
+
+
+@scenario("serialization")
+def serialization(options):
+    """Encoding cost of 10k product documents: the former per-document string
+    conversion plus DjangoJSONEncoder, against to_api plus dumps on the
+    stdlib encoder and on orjson when it is installed"""
+    import copy
+    import json
+    from datetime import datetime
+    from bson import ObjectId
+    from django.core.serializers.json import DjangoJSONEncoder
+    from inventory_db import serialization
+
+    now = datetime.utcnow()
+    documents = [
+        {
+            "_id": ObjectId(),
+            "name": f"Product {i}",
+            "description": "Benchmark product",
+            "price": i * 0.25,
+            "quantity": i,
+            "category_id": ObjectId(),
+            "supplier_id": ObjectId(),
+            "sku": f"SKU-{i}",
+            "created_at": now,
+            "updated_at": now,
+        }
+        for i in range(10000)
+    ]
+
+    def legacy(batch):
+        for document in batch:
+            document["id"] = str(document["_id"])
+            document["category_id"] = str(document["category_id"])
+            document["supplier_id"] = str(document["supplier_id"])
+            del document["_id"]
+        return json.dumps({"data": batch}, cls=DjangoJSONEncoder).encode()
+
+    def stdlib(batch):
+        data = [serialization.to_api(document) for document in batch]
+        return serialization._encoder.encode({"data": data}).encode()
+
+    def fast(batch):
+        data = [serialization.to_api(document) for document in batch]
+        return serialization.dumps({"data": data})
+
+    encoders = {"legacy": legacy, "stdlib": stdlib}
+    if serialization.orjson:
+        encoders["orjson"] = fast
+
+    results = {}
+    for name, encode in encoders.items():
+        timings = []
+        for _ in range(5):
+            batch = copy.deepcopy(documents)
+            started = time.perf_counter()
+            encode(batch)
+            timings.append(time.perf_counter() - started)
+        results[name] = {
+            "ms_per_10k_documents": round(statistics.median(timings) * 1000, 2),
+            "min_ms": round(min(timings) * 1000, 2),
+        }
+    return results
+
+
+@scenario("raw_reads")
+def raw_reads(options):
+    """CPU time to turn 100k stored product documents into JSON: decoding
+    cursor batches to dicts and encoding the API representation, against
+    RawBSONDocument batches passed through dumps_raw"""
+    from datetime import datetime
+    import bson
+    from bson import ObjectId
+    from inventory_db import serialization
+
+    now = datetime.utcnow()
+    batch = b"".join(
+        bson.encode(
+            {
+                "_id": ObjectId(),
+                "name": f"Product {i}",
+                "description": "Benchmark product",
+                "price": i * 0.25,
+                "quantity": i,
+                "category_id": ObjectId(),
+                "supplier_id": ObjectId(),
+                "sku": f"SKU-{i}",
+                "created_at": now,
+                "updated_at": now,
+            }
+        )
+        for i in range(1000)
+    )
+
+    def decoded():
+        # What the driver does for each cursor batch, then the list view
+        for document in bson.decode_all(batch):
+            serialization.dumps(serialization.to_api(document))
+
+    def raw():
+        for document in bson.decode_all(batch, serialization.RAW_CODEC_OPTIONS):
+            serialization.dumps_raw(document)
+
+    results = {"encoder": "orjson" if serialization.orjson else "stdlib"}
+    for name, read in (("decoded", decoded), ("raw", raw)):
+        started = time.process_time()
+        for _ in range(100):
+            read()
+        results[name] = {
+            "cpu_ms_per_100k_documents": round(
+                (time.process_time() - started) * 1000, 1
+            )
+        }
+    return results
+
+
+def parse_size(value):
+    """Parse a dataset size such as 10k, 100k, 1m or 2500"""
+    match = re.fullmatch(r"(\d+)([km]?)", value.strip().lower())
+    if not match:
+        raise ValueError(f"Invalid size {value!r}, expected e.g. 10k, 100k or 1m")
+    return int(match[1]) * {"": 1, "k": 1000, "m": 1000000}[match[2]]
+
+
+# Words product names are made of, so prefix and text searches match a
+# realistic share of products
+ADJECTIVES = ["steel", "plastic", "compact", "heavy", "premium", "basic", "mini"]
+NOUNS = ["bolt", "widget", "bracket", "valve", "sensor", "cable", "panel", "pump"]
+
+
+def seed(size, reset=False, random_seed=0):
+    """Fill the database with ``size`` synthetic products and as many
+    transactions over the past year, plus categories, suppliers, locations
+    and users in proportion, then create the declared indexes.
+
+    Data comes from a fixed random seed so runs are comparable. The
+    database must have no products unless ``reset`` drops every managed
+    collection first. Returns the documents written per collection and any
+    index errors.
+    """
+    from bson import ObjectId
+    from inventory_db.conditional import versions
+    from inventory_db.indexes import ensure_indexes, registered_models
+    from locations.models import Location
+    from products.models import Category, Product, ProductMetrics
+    from suppliers.models import Supplier
+    from transcations.models import InventoryTransaction
+    from users.models import User
+
+    models = registered_models()
+    if reset:
+        for collection in [model.collection for model in models]:
+            collection.drop()
+        ProductMetrics.collection.drop()
+        versions.drop()
+    elif Product.collection.estimated_document_count():
+        raise RuntimeError("The database already has products; pass --reset")
+    for model in models:
+        if hasattr(model, "ensure_collection"):
+            model.ensure_collection()
+
+    rng = random.Random(random_seed)
+    now = datetime.utcnow()
+    written = {}
+
+    def stamped(document):
+        created = now - timedelta(seconds=rng.uniform(0, 365 * 86400))
+        document["created_at"] = document["updated_at"] = created
+        return document
+
+    def insert(model, documents):
+        batch, count = [], 0
+        for document in documents:
+            batch.append(stamped(document))
+            if len(batch) >= 10000:
+                model.collection.insert_many(batch, ordered=False)
+                count += len(batch)
+                batch = []
+        if batch:
+            model.collection.insert_many(batch, ordered=False)
+            count += len(batch)
+        written[model.collection.name] = count
+
+    def ids(count):
+        return [ObjectId() for _ in range(count)]
+
+    category_ids = ids(max(10, size // 1000))
+    supplier_ids = ids(max(10, size // 500))
+    location_ids = ids(20)
+    product_ids = ids(size)
+
+    insert(
+        Category,
+        (
+            Category.prepare(
+                {"_id": _id, "name": f"Category {i}", "description": "Benchmark"}
+            )
+            for i, _id in enumerate(category_ids)
+        ),
+    )
+    insert(
+        Supplier,
+        (
+            Supplier.prepare(
+                {
+                    "_id": _id,
+                    "name": f"Supplier {i}",
+                    "contact_info": "Benchmark",
+                    "email": f"supplier{i}@example.com",
+                    "address": f"{i} Supplier Street",
+                    "phone": f"555-{i:06d}",
+                }
+            )
+            for i, _id in enumerate(supplier_ids)
+        ),
+    )
+    insert(
+        Location,
+        (
+            Location.prepare(
+                {
+                    "_id": _id,
+                    "name": f"Warehouse {i}",
+                    "address": f"{i} Benchmark Road",
+                    "city": "Springfield",
+                    "state": "IL",
+                    "country": "US",
+                    "postal_code": f"{62700 + i}",
+                }
+            )
+            for i, _id in enumerate(location_ids)
+        ),
+    )
+    insert(
+        User,
+        (
+            User.prepare(
+                {
+                    "username": f"user{i}",
+                    "email": f"user{i}@example.com",
+                    "password": "benchmark",
+                    "first_name": "Bench",
+                    "last_name": f"User {i}",
+                }
+            )
+            for i in range(max(10, size // 1000))
+        ),
+    )
+    insert(
+        Product,
+        (
+            {
+                "_id": _id,
+                **Product.prepare(
+                    Product.build(
+                        name=f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}",
+                        description=f"Benchmark {rng.choice(NOUNS)}",
+                        price=round(rng.uniform(1, 500), 2),
+                        quantity=rng.randint(0, 1000),
+                        category_id=rng.choice(category_ids),
+                        supplier_id=rng.choice(supplier_ids),
+                        sku=f"BENCH-{i:07d}",
+                    )
+                ),
+            }
+            for i, _id in enumerate(product_ids)
+        ),
+    )
+
+    def transaction(i):
+        document = InventoryTransaction.prepare(
+            {
+                "product_id": rng.choice(product_ids),
+                "quantity": rng.randint(1, 50),
+                "transaction_type": rng.choice(
+                    list(InventoryTransaction.TRANSACTION_TYPES)
+                ),
+                "reference": f"BENCH-{i}",
+            }
+        )
+        if i % 2:
+            document["location_id"] = rng.choice(location_ids)
+        document["posted"] = True
+        return document
+
+    insert(InventoryTransaction, (transaction(i) for i in range(size)))
+
+    # The transactions are stored posted, so move their locations' stock as
+    # posting them would have
+    located = InventoryTransaction.collection.find(
+        {"location_id": {"$exists": True}},
+        {"product_id": 1, "location_id": 1, "delta": 1},
+    )
+    batch = []
+    for document in located:
+        batch.append(document)
+        if len(batch) >= 10000:
+            InventoryTransaction.post_locations(batch)
+            batch = []
+    if batch:
+        InventoryTransaction.post_locations(batch)
+
+    index_errors = {}
+    for model in models:
+        _, errors = ensure_indexes(model)
+        if errors:
+            index_errors[model.collection.name] = errors
+        # As ensure_indexes does: derived fields, and the opening balances
+        # that put the seeded quantities in the stock ledger
+        if hasattr(model, "backfill"):
+            model.backfill()
+    return {"documents": written, "index_errors": index_errors}
+
+
+def check_payload(path, response, body):
+    """Raise if a 200 response carries an error envelope, so a failure path
+    is not timed as if it had succeeded. Returns whether it carries any
+    data."""
+    if not response.get("Content-Type", "").startswith("application/json"):
+        return bool(body.strip())
+    document = json.loads(body)
+    if not isinstance(document, dict):
+        return bool(document)
+    if document.get("status") == "error" or "error" in document:
+        raise RuntimeError(f"{path} returned an error: {document}")
+    return bool(document.get("data"))
+
+
+def run_paths(paths, requests, concurrency, validate=False):
+    """Request ``paths`` in turn, ``requests`` times in all, through the views
+    they resolve to from a pool of ``concurrency`` threads. Returns the
+    latency summary and the MongoDB commands sent per request.
+
+    With ``validate`` the payloads are checked after each request is timed:
+    an error envelope fails the run, as does no path returning any data.
+    """
+    factory = RequestFactory()
+    matches = [resolve(path.split("?")[0]) for path in paths]
+    found = []
+
+    def call(i):
+        path = paths[i % len(paths)]
+        match = matches[i % len(paths)]
+        started = time.perf_counter()
+        response = match.func(factory.get(path), *match.args, **match.kwargs)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} returned {response.status_code}")
+        if not validate:
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+            return time.perf_counter() - started
+        if response.streaming:
+            body = b"".join(response.streaming_content)
+        else:
+            body = response.content
+        elapsed = time.perf_counter() - started
+        found.append(check_payload(path, response, body))
+        return elapsed
+
+    sent = commands.count
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(call, range(requests)))
+    if validate and not any(found):
+        raise RuntimeError(f"{paths[0]} returned no data")
+    results = summarize(latencies, time.perf_counter() - started)
+    results["round_trips_per_request"] = round((commands.count - sent) / requests, 2)
+    return results
+
+
+@scenario("endpoints")
+def endpoints(options):
+    """Latency percentiles, throughput and MongoDB round trips per request of
+    the read endpoints over the data in the database (see --seed). Detail
+    and per-product endpoints rotate through 100 documents; full lists and
+    exports run --list-requests times."""
+    from datetime import date
+    import pymongo
+    from db_connection import get_client
+    from locations.models import Location
+    from products.models import Category, Product
+    from suppliers.models import Supplier
+    from transcations.models import InventoryTransaction
+    from users.models import User
+
+    def sample(model):
+        return [
+            str(document["_id"])
+            for document in model.collection.find({}, {"_id": 1}).limit(100)
+        ]
+
+    products = sample(Product)
+    if not products:
+        raise RuntimeError("No products to benchmark; seed the database first")
+    today = date.today().isoformat()
+
+    light = {
+        "product_detail": [f"/products/products/{id}/" for id in products],
+        "product_search_prefix": [
+            f"/products/products/search/?prefix={word}&limit=50" for word in ADJECTIVES
+        ],
+        "product_search_text": [
+            f"/products/products/search/?q={word}&limit=50" for word in NOUNS
+        ],
+        "product_search_price": [
+            "/products/products/search/?min_price=10&max_price=20&limit=50"
+        ],
+        "product_sort": [
+            f"/products/products/sort/?sort_by={field}&limit=50"
+            for field in Product.SORT_FIELDS
+        ],
+        "product_metrics": ["/products/products/metrics/"],
+        "product_metrics_by_category": [
+            "/products/products/metrics/?breakdown=category"
+        ],
+        "category_detail": [f"/products/categories/{id}/" for id in sample(Category)],
+        "category_list": ["/products/categories/"],
+        "supplier_detail": [f"/suppliers/suppliers/{id}/" for id in sample(Supplier)],
+        "supplier_list": ["/suppliers/suppliers/"],
+        "location_list": ["/locations/locations/"],
+        "user_detail": [f"/users/users/{id}/" for id in sample(User)],
+        "transaction_detail": [
+            f"/transactions/transactions/{id}/" for id in sample(InventoryTransaction)
+        ],
+        "transaction_history": [
+            f"/transactions/transactions/?product_id={id}&limit=100" for id in products
+        ],
+        "stock_as_of": [f"/transactions/stock/{id}/?as_of={today}" for id in products],
+        "location_stock": [
+            f"/locations/locations/{id}/stock/" for id in sample(Location)
+        ],
+    }
+    heavy = {
+        "product_list": ["/products/products/?stream=1"],
+        "transaction_list": ["/transactions/transactions/?stream=1"],
+        "export_products_csv": ["/export/products/?format=csv"],
+    }
+
+    # The mongomock stand-in sends no commands to count
+    counted = isinstance(get_client(), pymongo.MongoClient)
+    results = {
+        "backend": (
+            f"mongod {get_client().server_info()['version']}"
+            if counted
+            else "mongomock"
+        ),
+        "dataset": {
+            model.collection.name: model.collection.estimated_document_count()
+            for model in (
+                Product,
+                Category,
+                Supplier,
+                Location,
+                User,
+                InventoryTransaction,
+            )
+        },
+        "results": {},
+    }
+    for endpoints, requests, concurrency in (
+        (light, options["requests"], options["concurrency"]),
+        (heavy, options["list_requests"], 1),
+    ):
+        for name, paths in endpoints.items():
+            try:
+                # One untimed pass warms caches and lazily built stores, and
+                # checks that every path succeeds with data to time
+                run_paths(paths, len(paths), 1, validate=True)
+                measured = run_paths(paths, requests, concurrency)
+            except Exception as exc:
+                measured = {"error": f"{type(exc).__name__}: {exc}"}
+            if not counted:
+                measured.pop("round_trips_per_request", None)
+            results["results"][name] = measured
+    return results
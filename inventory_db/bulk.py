@@ -0,0 +1,127 @@
+from collections import Counter
+from django.conf import settings
+from pymongo.errors import BulkWriteError
+
+
+def bulk_batch_size():
+    """Number of documents sent per insert_many batch"""
+    return getattr(settings, "MONGO_BULK_BATCH_SIZE", 1000)
+
+
+def _insert(collection, batch, positions):
+    """insert_many one batch unordered, returning the documents written and
+    ``{"index", "message"}`` errors for the ones the server rejected"""
+    failed, errors = set(), []
+    if not batch:
+        return [], errors
+    try:
+        collection.insert_many(batch, ordered=False)
+    except BulkWriteError as exc:
+        for error in exc.details.get("writeErrors", []):
+            failed.add(error["index"])
+            errors.append(
+                {"index": positions[error["index"]], "message": error["errmsg"]}
+            )
+    return [doc for i, doc in enumerate(batch) if i not in failed], errors
+
+
+def _batches(rows, prepare, batch_size):
+    """Split rows into batches of prepared documents, yielding each with the
+    rows' positions and the errors of the rows ``prepare`` rejected"""
+    batch, positions, errors = [], [], []
+    for index, row in enumerate(rows):
+        try:
+            if isinstance(row, Exception):
+                raise row
+            batch.append(prepare(row))
+            positions.append(index)
+        except Exception as exc:
+            errors.append({"index": index, "message": f"Invalid row: {exc}"})
+
+        # Rejected rows count towards the batch so that their errors are
+        # not held until the end of the stream
+        if len(batch) + len(errors) >= batch_size:
+            yield batch, positions, errors
+            batch, positions, errors = [], [], []
+    if batch or errors:
+        yield batch, positions, errors
+
+
+def insert_batches(collection, rows, prepare, batch_size=None):
+    """Insert rows in unordered insert_many batches as they are read.
+
+    ``prepare`` turns a raw payload row into the document to store and may
+    raise to reject it; rows that are exceptions (items of a request body
+    that could not be parsed) are rejected as well. Yields, after each batch, the documents written
+    (with their ``_id`` set by the driver) and a list of ``{"index",
+    "message"}`` errors where ``index`` is the row's position in ``rows``.
+    Only one batch is held at a time, so ``rows`` may be a stream of any
+    length.
+    """
+    for batch, positions, errors in _batches(
+        rows, prepare, batch_size or bulk_batch_size()
+    ):
+        inserted, failed = _insert(collection, batch, positions)
+        yield inserted, sorted(errors + failed, key=lambda error: error["index"])
+
+
+def insert_in_batches(collection, rows, prepare, batch_size=None):
+    """Insert rows in unordered insert_many batches, collecting per-row errors.
+
+    Returns every document written and every error, as yielded by
+    insert_batches.
+    """
+    inserted, errors = [], []
+    for batch_inserted, batch_errors in insert_batches(
+        collection, rows, prepare, batch_size
+    ):
+        inserted.extend(batch_inserted)
+        errors.extend(batch_errors)
+    return inserted, errors
+
+
+def write_in_batches(collection, operations, batch_size=None):
+    """Run ``(position, operation)`` pairs as unordered bulk_write batches.
+
+    Returns ``{position: message}`` for the operations the server rejected.
+    """
+    batch_size = batch_size or bulk_batch_size()
+    errors = {}
+    for start in range(0, len(operations), batch_size):
+        batch = operations[start : start + batch_size]
+        try:
+            collection.bulk_write([operation for _, operation in batch], ordered=False)
+        except BulkWriteError as exc:
+            for error in exc.details.get("writeErrors", []):
+                errors[batch[error["index"]][0]] = error["errmsg"]
+    return errors
+
+
+def outcome_counts(outcomes):
+    """Number of per-item bulk outcomes with each status"""
+    return dict(Counter(outcome["status"] for outcome in outcomes))
+
+
+async def _ainsert(collection, batch, positions):
+    """Async counterpart of _insert for an async collection"""
+    failed, errors = set(), []
+    if not batch:
+        return [], errors
+    try:
+        await collection.insert_many(batch, ordered=False)
+    except BulkWriteError as exc:
+        for error in exc.details.get("writeErrors", []):
+            failed.add(error["index"])
+            errors.append(
+                {"index": positions[error["index"]], "message": error["errmsg"]}
+            )
+    return [doc for i, doc in enumerate(batch) if i not in failed], errors
+
+
+async def ainsert_batches(collection, rows, prepare, batch_size=None):
+    """Async counterpart of insert_batches for an async collection"""
+    for batch, positions, errors in _batches(
+        rows, prepare, batch_size or bulk_batch_size()
+    ):
+        inserted, failed = await _ainsert(collection, batch, positions)
+        yield inserted, sorted(errors + failed, key=lambda error: error["index"])
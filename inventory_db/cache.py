@@ -0,0 +1,238 @@
+import asyncio
+import functools
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from django.conf import settings
+from django.core.cache import caches
+
+# Stored in place of a document right after a write, so a read that loaded
+# the old document before the write cannot cache it (see ReadThroughCache)
+INVALIDATED = "__invalidated__"
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def cache_settings():
+    """The ENTITY_CACHE setting with defaults filled in"""
+    return {
+        "ALIAS": "default",
+        "TIMEOUT": 60,
+        "LOCK_TIMEOUT": 5,
+        "INVALIDATION_GRACE": 5,
+        **getattr(settings, "ENTITY_CACHE", {}),
+    }
+
+
+def stats():
+    """Hit and miss counts per cache prefix for this process"""
+    with _stats_lock:
+        counts = dict(_stats)
+    prefixes = {prefix for prefix, _ in counts}
+    return {
+        prefix: {
+            "hits": counts.get((prefix, "hits"), 0),
+            "misses": counts.get((prefix, "misses"), 0),
+        }
+        for prefix in sorted(prefixes)
+    }
+
+
+class ReadThroughCache:
+    """Read-through cache of serialized documents keyed by ID, on a Django
+    cache backend (see the ENTITY_CACHE and CACHES settings).
+
+    Entries expire after a jittered TTL, and the backend bounds the entry
+    count. On a miss, only one caller per key loads from Mongo: the others
+    wait for its result instead of all hitting the database at once, and
+    load themselves only if it finishes without one.
+    Writes replace entries with a short-lived INVALIDATED marker, and loads
+    store with ``add``, so a load racing a write cannot re-cache the old
+    document.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+
+    @property
+    def backend(self):
+        return caches[cache_settings()["ALIAS"]]
+
+    def key(self, object_id):
+        return f"{self.prefix}:{object_id}"
+
+    def count(self, outcome, n=1):
+        with _stats_lock:
+            _stats[self.prefix, outcome] += n
+
+    def timeout(self):
+        """TTL with jitter so entries cached together do not expire together"""
+        return cache_settings()["TIMEOUT"] * random.uniform(0.9, 1.1)
+
+    def get(self, object_id, load):
+        """Return the cached document for ``object_id``, calling ``load`` to
+        fetch it on a miss. Missing documents (None) are not cached."""
+        key = self.key(object_id)
+        document = self.backend.get(key)
+        if document is not None and document != INVALIDATED:
+            self.count("hits")
+            return document
+
+        self.count("misses")
+        options = cache_settings()
+        lock, token = f"{key}:lock", uuid.uuid4().hex
+        # Right after a write (INVALIDATED) there is nothing to wait for
+        locked = document is None and self.backend.add(
+            lock, token, options["LOCK_TIMEOUT"]
+        )
+        if document is None and not locked:
+            # Another caller is loading this key; wait for its result, or
+            # load here once it let go of the lock without one (a missing
+            # document, a racing write or an error)
+            deadline = time.monotonic() + options["LOCK_TIMEOUT"]
+            while time.monotonic() < deadline:
+                time.sleep(0.01)
+                values = self.backend.get_many([key, lock])
+                document = values.get(key)
+                if document is not None and document != INVALIDATED:
+                    return document
+                if lock not in values:
+                    break
+            return load()
+
+        try:
+            document = load()
+            if document is not None:
+                self.backend.add(key, document, self.timeout())
+            return document
+        finally:
+            # A load outliving LOCK_TIMEOUT may have lost the lock to
+            # another caller, whose lock is left alone
+            if locked and self.backend.get(lock) == token:
+                self.backend.delete(lock)
+
+    async def aget(self, object_id, load):
+        """Async counterpart of get; ``load`` is a coroutine function"""
+        key = self.key(object_id)
+        document = await self.backend.aget(key)
+        if document is not None and document != INVALIDATED:
+            self.count("hits")
+            return document
+
+        self.count("misses")
+        options = cache_settings()
+        lock, token = f"{key}:lock", uuid.uuid4().hex
+        locked = document is None and await self.backend.aadd(
+            lock, token, options["LOCK_TIMEOUT"]
+        )
+        if document is None and not locked:
+            deadline = time.monotonic() + options["LOCK_TIMEOUT"]
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+                values = await self.backend.aget_many([key, lock])
+                document = values.get(key)
+                if document is not None and document != INVALIDATED:
+                    return document
+                if lock not in values:
+                    break
+            return await load()
+
+        try:
+            document = await load()
+            if document is not None:
+                await self.backend.aadd(key, document, self.timeout())
+            return document
+        finally:
+            if locked and await self.backend.aget(lock) == token:
+                await self.backend.adelete(lock)
+
+    def get_many(self, object_ids, load_many):
+        """Return the cached documents for ``object_ids`` keyed by ID,
+        calling ``load_many`` with the IDs missing from the cache to fetch
+        them in one go. Unlike get, concurrent misses are not coalesced."""
+        keys = {object_id: self.key(object_id) for object_id in set(object_ids)}
+        cached = self.backend.get_many(list(keys.values()))
+        documents, missing = self.split(keys, cached)
+        if missing:
+            loaded = load_many(missing)
+            for object_id, document in loaded.items():
+                self.backend.add(keys[object_id], document, self.timeout())
+            documents.update(loaded)
+        return documents
+
+    async def aget_many(self, object_ids, load_many):
+        """Async counterpart of get_many; ``load_many`` is a coroutine
+        function"""
+        keys = {object_id: self.key(object_id) for object_id in set(object_ids)}
+        cached = await self.backend.aget_many(list(keys.values()))
+        documents, missing = self.split(keys, cached)
+        if missing:
+            loaded = await load_many(missing)
+            for object_id, document in loaded.items():
+                await self.backend.aadd(keys[object_id], document, self.timeout())
+            documents.update(loaded)
+        return documents
+
+    def split(self, keys, cached):
+        """Split the IDs of ``keys`` into the documents found in ``cached``
+        and the IDs to load"""
+        documents, missing = {}, []
+        for object_id, key in keys.items():
+            document = cached.get(key)
+            if document is not None and document != INVALIDATED:
+                documents[object_id] = document
+            else:
+                missing.append(object_id)
+        self.count("hits", len(documents))
+        self.count("misses", len(missing))
+        return documents, missing
+
+    def invalidate(self, *object_ids):
+        """Drop the cached documents for IDs that were just written"""
+        if object_ids:
+            self.backend.set_many(
+                {self.key(object_id): INVALIDATED for object_id in object_ids},
+                cache_settings()["INVALIDATION_GRACE"],
+            )
+
+    async def ainvalidate(self, *object_ids):
+        """Async counterpart of invalidate"""
+        if object_ids:
+            await self.backend.aset_many(
+                {self.key(object_id): INVALIDATED for object_id in object_ids},
+                cache_settings()["INVALIDATION_GRACE"],
+            )
+
+    def discard(self, *object_ids):
+        """Drop any cached documents for IDs without leaving markers, for
+        large batches of mostly uncached IDs (e.g. new documents)"""
+        if object_ids:
+            self.backend.delete_many([self.key(object_id) for object_id in object_ids])
+
+
+def read_through(method):
+    """Serve a ``get_by_id(cls, object_id, fields=None)`` classmethod from
+    ``cls.cache``. Reads of selected fields bypass the cache."""
+
+    @functools.wraps(method)
+    def wrapper(cls, object_id, fields=None):
+        if fields:
+            return method(cls, object_id, fields)
+        return cls.cache.get(str(object_id), lambda: method(cls, object_id))
+
+    return wrapper
+
+
+def aread_through(method):
+    """Async counterpart of read_through for async ``get_by_id`` methods"""
+
+    @functools.wraps(method)
+    async def wrapper(cls, object_id, fields=None):
+        if fields:
+            return await method(cls, object_id, fields)
+        return await cls.cache.aget(str(object_id), lambda: method(cls, object_id))
+
+    return wrapper
@@ -0,0 +1,169 @@
+import functools
+import hashlib
+from datetime import datetime
+from asgiref.sync import iscoroutinefunction
+from bson import ObjectId
+from pymongo import UpdateOne
+from django.views.decorators.http import condition
+from db_connection import db, get_async_db
+
+# One document per collection counting the writes made through the models;
+# list ETags are derived from it so an unchanged list is never re-read
+versions = db["collection_versions"]
+
+
+def _bumps(names):
+    now = datetime.utcnow()
+    return [
+        UpdateOne(
+            {"_id": name},
+            {"$inc": {"version": 1}, "$set": {"updated_at": now}},
+            upsert=True,
+        )
+        for name in names
+    ]
+
+
+def bump_version(*names):
+    """Record a write to the named collections"""
+    versions.bulk_write(_bumps(names), ordered=False)
+
+
+def _digest(*parts):
+    """Opaque strong ETag for the given representation parts"""
+    key = "\0".join(str(part) for part in parts)
+    return '"%s"' % hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+def _conditional(etag, last_modified, prefetch, unless=None):
+    """condition() for sync and async views. Before an async view, the
+    ``prefetch`` coroutine reads what the ETag and Last-Modified functions
+    need on the async client and leaves it on the request, so they do not
+    block the event loop. Requests for which ``unless`` returns True go
+    straight to the view, without conditional handling."""
+    decorator = condition(etag_func=etag, last_modified_func=last_modified)
+
+    def wrap(view):
+        conditional = decorator(view)
+        if not iscoroutinefunction(view):
+            if unless is None:
+                return conditional
+
+            @functools.wraps(view)
+            def inner(request, *args, **kwargs):
+                if unless(request):
+                    return view(request, *args, **kwargs)
+                return conditional(request, *args, **kwargs)
+
+            return inner
+
+        @functools.wraps(view)
+        async def inner(request, *args, **kwargs):
+            if unless is not None and unless(request):
+                return await view(request, *args, **kwargs)
+            await prefetch(request, *args, **kwargs)
+            return await conditional(request, *args, **kwargs)
+
+        return inner
+
+    return wrap
+
+
+def list_condition(*names, unless=None):
+    """Conditional GET for a list view whose payload is built from the named
+    collections.
+
+    The ETag covers their version counters, the URL arguments and the query
+    string; a matching If-None-Match (or If-Modified-Since against the latest
+    write) returns 304 Not Modified after a single small read, without
+    touching the documents. Requests for which ``unless`` returns True are
+    always served in full.
+    """
+
+    def state(request):
+        if not hasattr(request, "_collection_versions"):
+            found = {
+                doc["_id"]: doc for doc in versions.find({"_id": {"$in": list(names)}})
+            }
+            request._collection_versions = [found.get(name, {}) for name in names]
+        return request._collection_versions
+
+    async def prefetch(request, *args, **kwargs):
+        if not hasattr(request, "_collection_versions"):
+            cursor = get_async_db()[versions.name].find({"_id": {"$in": list(names)}})
+            found = {doc["_id"]: doc async for doc in cursor}
+            request._collection_versions = [found.get(name, {}) for name in names]
+
+    def etag(request, *args, **kwargs):
+        return _digest(
+            *(
+                f"{name}:{doc.get('version', 0)}"
+                for name, doc in zip(names, state(request))
+            ),
+            *args,
+            *sorted(kwargs.items()),
+            request.GET.urlencode(),
+        )
+
+    def last_modified(request, *args, **kwargs):
+        times = [doc["updated_at"] for doc in state(request) if doc.get("updated_at")]
+        return max(times) if len(times) == len(names) else None
+
+    return _conditional(etag, last_modified, prefetch, unless)
+
+
+def detail_condition(model, id_kwarg):
+    """Conditional GET for a detail view, from the document's updated_at.
+
+    The timestamp comes from the model's read-through cache when the
+    document is cached, otherwise from a point read projecting only
+    updated_at, so a 304 never loads or serializes the document.
+    """
+
+    def updated_at(request, **kwargs):
+        if not hasattr(request, "_updated_at"):
+            request._updated_at = None
+            object_id = kwargs[id_kwarg]
+            if ObjectId.is_valid(object_id):
+                cached = model.cache.backend.get(model.cache.key(object_id))
+                if isinstance(cached, dict):
+                    request._updated_at = cached.get("updated_at")
+                else:
+                    criteria = (
+                        model.id_filter(object_id)
+                        if hasattr(model, "id_filter")
+                        else {"_id": ObjectId(object_id)}
+                    )
+                    document = model.collection.find_one(criteria, {"updated_at": 1})
+                    request._updated_at = (document or {}).get("updated_at")
+        return request._updated_at
+
+    async def prefetch(request, *args, **kwargs):
+        if not hasattr(request, "_updated_at"):
+            request._updated_at = None
+            object_id = kwargs[id_kwarg]
+            if ObjectId.is_valid(object_id):
+                cached = await model.cache.backend.aget(model.cache.key(object_id))
+                if isinstance(cached, dict):
+                    request._updated_at = cached.get("updated_at")
+                else:
+                    document = await model.acollection().find_one(
+                        model.id_filter(object_id), {"updated_at": 1}
+                    )
+                    request._updated_at = (document or {}).get("updated_at")
+
+    def etag(request, *args, **kwargs):
+        modified = updated_at(request, **kwargs)
+        if modified is None:
+            return None
+        return _digest(
+            model.collection.name,
+            kwargs[id_kwarg],
+            modified.isoformat(),
+            request.GET.urlencode(),
+        )
+
+    def last_modified(request, *args, **kwargs):
+        return updated_at(request, **kwargs)
+
+    return _conditional(etag, last_modified, prefetch)
@@ -0,0 +1,131 @@
+import csv
+import io
+import zlib
+from datetime import datetime, timezone
+from bson import Decimal128, ObjectId
+from locations.models import Location
+from products.models import Category, Product
+from suppliers.models import Supplier
+from transcations.models import InventoryTransaction
+from users.models import User
+from inventory_db.serialization import dumps
+
+# Collections that can be exported, by the name used in URLs and commands
+EXPORTS = {
+    "products": Product,
+    "categories": Category,
+    "suppliers": Supplier,
+    "locations": Location,
+    "users": User,
+    "transactions": InventoryTransaction,
+}
+
+FORMATS = ["ndjson", "csv"]
+
+CONTENT_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+# Encoded rows are gathered into chunks of about this many bytes before they
+# are written out
+CHUNK_SIZE = 64 * 1024
+
+
+class InvalidExport(ValueError):
+    """Raised when export options fail validation"""
+
+
+def parse_since(value):
+    """Parse an ISO 8601 ``updated_since`` into a naive UTC datetime"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise InvalidExport("Invalid updated_since, expected ISO 8601")
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _ndjson(documents):
+    for document in documents:
+        yield dumps(document) + b"\n"
+
+
+def _lookup(document, field):
+    """Value of a possibly dotted field in a document"""
+    for part in field.split("."):
+        if not isinstance(document, dict):
+            return None
+        document = document.get(part)
+    return document
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (ObjectId, Decimal128)):
+        return str(value)
+    return dumps(value).decode()
+
+
+def _csv(documents, fields=None):
+    """CSV rows under a header of ``fields``, or of the first document's
+    fields when None; fields the header does not name are left out"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    columns = ["id", *(field for field in fields if field != "id")] if fields else None
+
+    def row(values):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(values)
+        return buffer.getvalue().encode()
+
+    header = False
+    for document in documents:
+        if columns is None:
+            columns = ["id", *(field for field in document if field != "id")]
+        if not header:
+            yield row(columns)
+            header = True
+        yield row([_csv_value(_lookup(document, column)) for column in columns])
+    if columns and not header:
+        yield row(columns)
+
+
+def _chunked(pieces):
+    chunk, size = [], 0
+    for piece in pieces:
+        chunk.append(piece)
+        size += len(piece)
+        if size >= CHUNK_SIZE:
+            yield b"".join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield b"".join(chunk)
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_chunks(documents, format="ndjson", fields=None, compress=False):
+    """Encode documents as NDJSON or CSV byte chunks, gzipped when
+    ``compress`` is set.
+
+    Documents are consumed one at a time as chunks are pulled, so an export
+    over a server-side cursor runs in constant memory however many rows it
+    has.
+    """
+    if format not in FORMATS:
+        raise InvalidExport("Format must be ndjson or csv")
+    rows = _csv(documents, fields) if format == "csv" else _ndjson(documents)
+    chunks = _chunked(rows)
+    return _gzipped(chunks) if compress else chunks
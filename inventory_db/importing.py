@@ -0,0 +1,185 @@
+import csv
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from django.conf import settings
+from pymongo.errors import BulkWriteError
+from inventory_db.bulk import bulk_batch_size
+
+FORMATS = ["csv", "ndjson"]
+
+# Rejected rows listed in an import report; the rest are only counted
+MAX_REPORTED_REJECTS = 100
+
+
+def import_max_workers():
+    """Most parallel batch writers an import request may ask for"""
+    return getattr(settings, "IMPORT_MAX_WORKERS", 4)
+
+
+class InvalidImport(ValueError):
+    """Raised when an import stream cannot be read"""
+
+
+def _decode(lines):
+    """Decode byte lines as UTF-8, dropping a leading byte order mark.
+    Raises InvalidImport for a line that is not valid UTF-8."""
+    for number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            try:
+                line = line.decode("utf-8")
+            except UnicodeDecodeError as exc:
+                raise InvalidImport(f"Line {number}: invalid UTF-8 ({exc.reason})")
+        if number == 1:
+            line = line.lstrip("\ufeff")
+        yield line
+
+
+def read_rows(lines, format):
+    """Yield ``(number, row, error)`` for each record of a CSV (with a header
+    line) or NDJSON stream, given as an iterable of byte or str lines.
+
+    Records are numbered from 1 and read one at a time, so memory use does
+    not grow with the stream. Malformed records come with an error message
+    instead of a row; a stream that cannot be read raises InvalidImport.
+    """
+    if format not in FORMATS:
+        raise InvalidImport(f"Unknown format {format!r}, expected csv or ndjson")
+    lines = _decode(lines)
+
+    if format == "ndjson":
+        number = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield number, None, f"Invalid JSON: {exc}"
+                continue
+            if not isinstance(row, dict):
+                yield number, None, "Expected a JSON object"
+                continue
+            yield number, row, None
+        return
+
+    reader = csv.DictReader(lines)
+    try:
+        for number, row in enumerate(reader, 1):
+            if None in row or None in row.values():
+                yield number, None, f"Expected {len(reader.fieldnames)} columns"
+                continue
+            yield number, row, None
+    except csv.Error as exc:
+        raise InvalidImport(f"Line {reader.line_num}: {exc}")
+
+
+def write_batch(collection, operations):
+    """Run ``operations`` as one unordered bulk_write.
+
+    Returns the number of documents inserted by upserts and updated, and
+    ``{position: message}`` for the operations the server rejected.
+    """
+    try:
+        result = collection.bulk_write(operations, ordered=False).bulk_api_result
+        errors = {}
+    except BulkWriteError as exc:
+        result = exc.details
+        errors = {error["index"]: error["errmsg"] for error in result["writeErrors"]}
+    return result["nUpserted"], result["nMatched"], errors
+
+
+def import_rows(
+    records, prepare, write, batch_size=None, workers=1, skip=0, checkpoint=None
+):
+    """Validate and write records from read_rows in fixed-size batches.
+
+    ``prepare`` turns a row into the item to write and may raise to reject
+    it; ``write`` writes a list of items and returns ``(inserted, updated,
+    {position: message})`` like write_batch. Up to ``workers`` batches are
+    written in parallel. Records numbered up to ``skip`` are passed over, to
+    resume an earlier import.
+
+    ``checkpoint`` is called with a record number whenever every record up
+    to it has been written or rejected; resuming from that number with
+    ``skip`` neither loses nor repeats rows. Returns the import report.
+    """
+    batch_size = batch_size or bulk_batch_size()
+    report = {
+        "rows": 0,
+        "inserted": 0,
+        "updated": 0,
+        "rejected": 0,
+        "rejects": [],
+        "checkpoint": skip,
+    }
+    started = time.perf_counter()
+
+    def reject(number, message):
+        report["rejected"] += 1
+        if len(report["rejects"]) < MAX_REPORTED_REJECTS:
+            report["rejects"].append({"row": number, "message": message})
+
+    # Batches are numbered as they are submitted; the checkpoint advances
+    # over the ones completed in order, so that parallel writes finishing
+    # out of order never skip a batch on resume
+    pending, completed = {}, {}
+    next_batch, next_done = 0, 0
+
+    def collect(futures):
+        nonlocal next_done
+        for future in futures:
+            sequence, numbers, last = pending.pop(future)
+            inserted, updated, errors = future.result()
+            report["inserted"] += inserted
+            report["updated"] += updated
+            for position, message in errors.items():
+                reject(numbers[position], message)
+            completed[sequence] = last
+        while next_done in completed:
+            report["checkpoint"] = completed.pop(next_done)
+            next_done += 1
+            if checkpoint:
+                checkpoint(report["checkpoint"])
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        items, numbers = [], []
+
+        def submit(last):
+            nonlocal next_batch
+            if len(pending) >= workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending[pool.submit(write, items)] = (next_batch, numbers, last)
+            next_batch += 1
+
+        number = skip
+        for number, row, error in records:
+            if number <= skip:
+                continue
+            report["rows"] += 1
+            if error is None:
+                try:
+                    items.append(prepare(row))
+                    numbers.append(number)
+                except Exception as exc:
+                    error = f"Invalid row: {exc}"
+            if error is not None:
+                reject(number, error)
+            if len(items) >= batch_size:
+                submit(number)
+                items, numbers = [], []
+        if items:
+            submit(number)
+        collect(wait(pending).done)
+
+    # Trailing rejected rows are not part of any batch
+    report["checkpoint"] = max(report["checkpoint"], number)
+    if checkpoint and report["rows"]:
+        checkpoint(report["checkpoint"])
+
+    elapsed = time.perf_counter() - started
+    report["elapsed_sec"] = round(elapsed, 3)
+    report["rows_per_sec"] = round(report["rows"] / elapsed, 1) if elapsed else None
+    return report
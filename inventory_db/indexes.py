@@ -0,0 +1,129 @@
+from django.utils.module_loading import import_string
+from pymongo.errors import PyMongoError
+
+# Model classes whose declared indexes are managed by `manage.py ensure_indexes`
+MODELS = [
+    "products.models.Category",
+    "products.models.Product",
+    "suppliers.models.Supplier",
+    "locations.models.Location",
+    "locations.models.StockLevel",
+    "users.models.User",
+    "transcations.models.InventoryTransaction",
+    "transcations.models.StockSnapshot",
+]
+
+# Index options that change how an index behaves; a difference in any of them
+# between the declaration and the server counts as drift.
+INDEX_OPTIONS = [
+    "unique",
+    "sparse",
+    "partialFilterExpression",
+    "expireAfterSeconds",
+    "weights",
+    "default_language",
+    "collation",
+]
+
+
+def registered_models():
+    """Import and return every model class with managed indexes"""
+    return [import_string(path) for path in MODELS]
+
+
+def _normalize(spec):
+    """Reduce an index description to the parts that matter for comparison"""
+    key = spec["key"]
+    key = [tuple(item) for item in (key.items() if hasattr(key, "items") else key)]
+    options = {option: spec[option] for option in INDEX_OPTIONS if spec.get(option)}
+
+    # The server stores text indexes as _fts/_ftsx keys plus per-field weights
+    text_fields = [field for field, direction in key if direction == "text"]
+    if text_fields and text_fields != ["_fts"]:
+        first = key.index((text_fields[0], "text"))
+        key = [item for item in key if item[1] != "text"]
+        key[first:first] = [("_fts", "text"), ("_ftsx", 1)]
+        options["weights"] = {
+            **{field: 1 for field in text_fields},
+            **options.get("weights", {}),
+        }
+    if text_fields:
+        options["weights"] = dict(options["weights"])
+        options.setdefault("default_language", "english")
+    return key, options
+
+
+def index_drift(model):
+    """Compare a model's declared indexes with those on the server.
+
+    Returns a dict with the declared index names that are ``missing``, those
+    that exist with a ``different`` definition, and ``extra`` indexes that are
+    on the server but not declared.
+    """
+    existing = model.collection.index_information()
+    existing.pop("_id_", None)
+    drift = {"missing": [], "different": [], "extra": []}
+
+    declared = set()
+    for index in model.indexes:
+        spec = index.document
+        declared.add(spec["name"])
+        if spec["name"] not in existing:
+            drift["missing"].append(spec["name"])
+        elif _normalize(spec) != _normalize(existing[spec["name"]]):
+            drift["different"].append(spec["name"])
+
+    drift["extra"] = sorted(set(existing) - declared)
+    return drift
+
+
+def ensure_indexes(model):
+    """Create a model's missing indexes; existing ones are left untouched.
+
+    Returns the names of created indexes and a dict of index name to error
+    message for any that could not be built (e.g. a unique index over
+    duplicate data).
+    """
+    created, errors = [], {}
+    existing = model.collection.index_information()
+    for index in model.indexes:
+        name = index.document["name"]
+        if name in existing:
+            continue
+        try:
+            model.collection.create_indexes([index])
+            created.append(name)
+        except PyMongoError as exc:
+            errors[name] = str(exc)
+    return created, errors
+
+
+# Plan stages showing a query shape is not served by an index: a collection
+# scan, or a blocking sort of every matching document in memory
+UNINDEXED_STAGES = {"COLLSCAN": "collection scan", "SORT": "in-memory sort"}
+
+
+def _plan_stages(plan):
+    """Yield every stage name in an explain plan tree"""
+    yield plan.get("stage")
+    for child in ("inputStage", "queryPlan"):
+        if child in plan:
+            yield from _plan_stages(plan[child])
+    for stage in plan.get("inputStages", []):
+        yield from _plan_stages(stage)
+
+
+def explain_queries(model):
+    """Explain each query shape a model's views issue.
+
+    Returns a list of (description, winning plan stages) tuples; any shape
+    whose stages include one of UNINDEXED_STAGES is not served by an index.
+    """
+    results = []
+    for description, criteria, sort in model.explain_queries:
+        cursor = model.collection.find(criteria).limit(1)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        results.append((description, list(filter(None, _plan_stages(plan)))))
+    return results
@@ -0,0 +1,90 @@
+import json
+import time
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from inventory_db.benchmarks import SCENARIOS, parse_size, seed
+
+
+class Command(BaseCommand):
+    help = "Run performance benchmarks against the configured MongoDB"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "scenarios",
+            nargs="*",
+            help=f"Scenarios to run (default: all). Available: {', '.join(SCENARIOS)}",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=1000,
+            help="Requests per endpoint and view flavour",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=100,
+            help="Requests in flight at once",
+        )
+        parser.add_argument(
+            "--list-requests",
+            type=int,
+            default=5,
+            help="Requests per full-collection list or export endpoint",
+        )
+        parser.add_argument(
+            "--seed",
+            help="Fill the database with a synthetic dataset of this many products "
+            "and transactions first, e.g. 10k, 100k or 1m",
+        )
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Drop the existing collections before seeding",
+        )
+        parser.add_argument(
+            "--output",
+            "-o",
+            help="Also write the JSON results to this file",
+        )
+
+    def handle(self, *args, **options):
+        names = options["scenarios"] or list(SCENARIOS)
+        unknown = [name for name in names if name not in SCENARIOS]
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(unknown)}")
+
+        if settings.MONGO["URL"].startswith("mongomock://"):
+            from inventory_db.testing import use_mongomock
+
+            try:
+                use_mongomock()
+            except ImproperlyConfigured as exc:
+                raise CommandError(str(exc))
+
+        if options["seed"]:
+            try:
+                size = parse_size(options["seed"])
+                started = time.perf_counter()
+                seeded = seed(size, reset=options["reset"])
+            except (ValueError, RuntimeError) as exc:
+                raise CommandError(str(exc))
+            self.stderr.write(
+                f"Seeded {sum(seeded['documents'].values())} documents in "
+                f"{time.perf_counter() - started:.1f}s"
+            )
+            for name, errors in seeded["index_errors"].items():
+                self.stderr.write(f"Index errors on {name}: {errors}")
+
+        results = {}
+        for name in names:
+            try:
+                results[name] = SCENARIOS[name](options)
+            except RuntimeError as exc:
+                raise CommandError(f"{name}: {exc}")
+        output = json.dumps(results, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output)
+        self.stdout.write(output)
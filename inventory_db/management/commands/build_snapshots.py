@@ -0,0 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from django.core.management.base import BaseCommand, CommandError
+from products.models import Product
+from transcations.models import StockSnapshot
+
+# Transactions are stamped when written, so a snapshot time must be far
+# enough in the past that no transaction created before it is still in flight
+SETTLE_TIME = timedelta(minutes=5)
+
+
+def parse_time(value):
+    """Parse an ISO 8601 date or datetime option into a naive UTC datetime"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Invalid date {value!r}, expected ISO 8601")
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = "Build point-in-time stock snapshots from the transaction ledger"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--as-of",
+            help="Snapshot time (default: the latest --every boundary that has settled)",
+        )
+        parser.add_argument(
+            "--from",
+            dest="start",
+            help="Backfill snapshots every --every hours from this time to --as-of",
+        )
+        parser.add_argument(
+            "--every",
+            type=int,
+            default=24,
+            help="Hours between snapshots (default: 24)",
+        )
+        parser.add_argument(
+            "--locations",
+            action="store_true",
+            help="Also snapshot stock per location",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Product chunks built in parallel",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Products per chunk",
+        )
+
+    def handle(self, *args, **options):
+        every = timedelta(hours=options["every"])
+        settled = datetime.utcnow() - SETTLE_TIME
+        if options["as_of"]:
+            as_of = parse_time(options["as_of"])
+            if as_of > settled:
+                raise CommandError(
+                    f"--as-of must be at least {SETTLE_TIME} in the past"
+                )
+        else:
+            as_of = datetime.min + (settled - datetime.min) // every * every
+
+        times = [as_of]
+        if options["start"]:
+            start = parse_time(options["start"])
+            if start > as_of:
+                raise CommandError("--from must be before --as-of")
+            times = []
+            while start <= as_of:
+                times.append(start)
+                start += every
+
+        chunks = self.product_chunks(options["chunk_size"])
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            # Each snapshot builds on the previous one, so times run in order
+            for time in times:
+                built = sum(
+                    pool.map(
+                        lambda chunk: StockSnapshot.build(
+                            time, chunk, locations=options["locations"]
+                        ),
+                        chunks,
+                    )
+                )
+                self.stdout.write(f"{time.isoformat()}: snapshotted {built} products")
+        self.stdout.write(self.style.SUCCESS("Snapshots are up to date"))
+
+    @staticmethod
+    def product_chunks(size):
+        """Split every product ID into chunks of ``size``"""
+        chunks, chunk = [], []
+        for product in Product.collection.find({}, {"_id": 1}).sort("_id", 1):
+            chunk.append(product["_id"])
+            if len(chunk) >= size:
+                chunks.append(chunk)
+                chunk = []
+        if chunk:
+            chunks.append(chunk)
+        return chunks
@@ -0,0 +1,86 @@
+from django.core.management.base import BaseCommand, CommandError
+from inventory_db.indexes import (
+    UNINDEXED_STAGES,
+    ensure_indexes,
+    explain_queries,
+    index_drift,
+    registered_models,
+)
+
+
+class Command(BaseCommand):
+    help = "Create the MongoDB indexes declared by each model and report drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report drift, do not create missing indexes",
+        )
+        parser.add_argument(
+            "--explain",
+            action="store_true",
+            help="Explain the queries each view issues and flag collection scans "
+            "and in-memory sorts",
+        )
+
+    def handle(self, *args, **options):
+        failed = False
+        for model in registered_models():
+            name = model.collection.name
+            if not options["check"] and hasattr(model, "ensure_collection"):
+                try:
+                    message = model.ensure_collection()
+                except ValueError as exc:
+                    failed = True
+                    self.stderr.write(f"{name}: {exc}")
+                else:
+                    if message:
+                        self.stdout.write(f"{name}: {message}")
+
+            if not options["check"]:
+                created, errors = ensure_indexes(model)
+                for index in created:
+                    self.stdout.write(f"{name}: created {index}")
+                for index, error in errors.items():
+                    failed = True
+                    self.stderr.write(f"{name}: failed to create {index}: {error}")
+
+            if not options["check"] and hasattr(model, "backfill"):
+                updated = model.backfill()
+                if updated:
+                    self.stdout.write(f"{name}: backfilled {updated} documents")
+
+            drift = index_drift(model)
+            if drift["missing"] or drift["different"]:
+                failed = True
+            for index in drift["missing"]:
+                self.stdout.write(self.style.WARNING(f"{name}: missing {index}"))
+            for index in drift["different"]:
+                self.stdout.write(
+                    self.style.WARNING(f"{name}: {index} differs from its declaration")
+                )
+            for index in drift["extra"]:
+                self.stdout.write(f"{name}: undeclared index {index}")
+
+            if options["explain"]:
+                for description, stages in explain_queries(model):
+                    unindexed = [
+                        UNINDEXED_STAGES[stage]
+                        for stage in stages
+                        if stage in UNINDEXED_STAGES
+                    ]
+                    if unindexed:
+                        failed = True
+                        self.stdout.write(
+                            self.style.ERROR(
+                                f"{name}: {', '.join(unindexed)} for {description}"
+                            )
+                        )
+                    else:
+                        plan = " <- ".join(stages)
+                        self.stdout.write(f"{name}: {description}: {plan}")
+
+        if failed:
+            raise CommandError("Index check found problems")
+        self.stdout.write(self.style.SUCCESS("Indexes are up to date"))
@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from inventory_db.exporting import (
+    EXPORTS,
+    FORMATS,
+    InvalidExport,
+    export_chunks,
+    parse_since,
+)
+from inventory_db.projection import FIELD_NAME
+from inventory_db.streaming import stream_batch_size
+
+
+class Command(BaseCommand):
+    help = "Stream a collection to NDJSON or CSV in constant memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument("collection", choices=list(EXPORTS))
+        parser.add_argument(
+            "--output",
+            "-o",
+            help="File to write (default: standard output)",
+        )
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="Output format (default: from --output's extension, else ndjson)",
+        )
+        parser.add_argument(
+            "--gzip",
+            action="store_true",
+            help="Compress the output (implied by an --output ending in .gz)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=stream_batch_size(),
+            help="Documents fetched per cursor batch",
+        )
+        parser.add_argument(
+            "--updated-since",
+            help="Only export documents updated at or after this ISO 8601 time",
+        )
+        parser.add_argument(
+            "--fields",
+            help="Comma-separated fields to export (default: all)",
+        )
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        compress = options["gzip"] or bool(output and output.endswith(".gz"))
+        format = options["format"]
+        if not format and output:
+            name = output[:-3] if output.endswith(".gz") else output
+            format = os.path.splitext(name)[1].lstrip(".").lower()
+        if format not in FORMATS:
+            format = "ndjson"
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        try:
+            updated_since = (
+                parse_since(options["updated_since"])
+                if options["updated_since"]
+                else None
+            )
+        except InvalidExport as exc:
+            raise CommandError(str(exc))
+        fields = None
+        if options["fields"]:
+            fields = [field.strip() for field in options["fields"].split(",")]
+            invalid = [field for field in fields if not FIELD_NAME.match(field)]
+            if invalid:
+                raise CommandError(f"Invalid fields: {', '.join(invalid)}")
+
+        count = 0
+
+        def counted(documents):
+            nonlocal count
+            for document in documents:
+                count += 1
+                yield document
+
+        model = EXPORTS[options["collection"]]
+        documents = counted(
+            model.iter_export(updated_since, options["batch_size"], fields)
+        )
+        started = time.perf_counter()
+        stream = open(output, "wb") if output else sys.stdout.buffer
+        try:
+            for chunk in export_chunks(documents, format, fields, compress):
+                stream.write(chunk)
+        finally:
+            if output:
+                stream.close()
+            else:
+                stream.flush()
+
+        elapsed = time.perf_counter() - started
+        rate = round(count / elapsed, 1) if elapsed else count
+        self.stderr.write(
+            f"Exported {count} {options['collection']} in {elapsed:.1f}s "
+            f"({rate} rows/sec)",
+            style_func=self.style.SUCCESS,
+        )
@@ -0,0 +1,92 @@
+import json
+import os
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from inventory_db.importing import FORMATS, InvalidImport, read_rows
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Stream a CSV or NDJSON product catalog into products, upserting by SKU"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, or - for standard input")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="Input format (default: from the file extension)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            help="Rows per bulk_write batch (default: MONGO_BULK_BATCH_SIZE)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Batches written in parallel",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="File recording the last row imported, updated as batches complete",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Skip the rows recorded in --checkpoint by an earlier run",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        format = options["format"] or os.path.splitext(path)[1].lstrip(".").lower()
+        if format not in FORMATS:
+            raise CommandError("Cannot tell the format from the path; pass --format")
+        if options["resume"] and not options["checkpoint"]:
+            raise CommandError("--resume needs --checkpoint")
+
+        skip = 0
+        if options["resume"] and os.path.exists(options["checkpoint"]):
+            with open(options["checkpoint"]) as file:
+                skip = json.load(file)["row"]
+            self.stdout.write(f"Resuming after row {skip}")
+
+        def checkpoint(row):
+            # Written to a temporary file and renamed, so an interrupted run
+            # never leaves a truncated checkpoint behind
+            temporary = f"{options['checkpoint']}.tmp"
+            with open(temporary, "w") as file:
+                json.dump({"path": path, "row": row}, file)
+            os.replace(temporary, options["checkpoint"])
+            if options["verbosity"] > 1:
+                self.stdout.write(f"Imported up to row {row}")
+
+        stream = sys.stdin.buffer if path == "-" else open(path, "rb")
+        try:
+            report = Product.import_rows(
+                read_rows(stream, format),
+                batch_size=options["batch_size"],
+                workers=options["workers"],
+                skip=skip,
+                checkpoint=checkpoint if options["checkpoint"] else None,
+            )
+        except InvalidImport as exc:
+            raise CommandError(str(exc))
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
+
+        for reject in report["rejects"]:
+            self.stderr.write(f"Row {reject['row']}: {reject['message']}")
+        if report["rejected"] > len(report["rejects"]):
+            self.stderr.write(
+                f"... and {report['rejected'] - len(report['rejects'])} more rejects"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {report['rows']} rows in {report['elapsed_sec']}s "
+                f"({report['rows_per_sec']} rows/sec): {report['inserted']} inserted, "
+                f"{report['updated']} updated, {report['rejected']} rejected; "
+                f"checkpoint at row {report['checkpoint']}"
+            )
+        )
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from transcations.models import InventoryTransaction
+
+
+class Command(BaseCommand):
+    help = "Post inventory transactions left unposted by an interrupted write"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=60,
+            help="Only post transactions created at least this many seconds ago",
+        )
+
+    def handle(self, *args, **options):
+        posted, unresolved = InventoryTransaction.post_pending(options["older_than"])
+        self.stdout.write(f"Posted {posted} transactions")
+        if unresolved:
+            raise CommandError(
+                f"{unresolved} transactions could not be confirmed as applied or "
+                "unapplied; review their products' stock before posting them"
+            )
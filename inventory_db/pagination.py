@@ -0,0 +1,70 @@
+import base64
+import binascii
+from datetime import datetime
+import bson
+from bson import Decimal128, ObjectId
+
+
+class InvalidCursor(ValueError):
+    """Raised when a continuation token cannot be decoded"""
+
+
+# Sort values a cursor may carry. Anything else, such as a document that
+# would be read as query operators, is not a value the keyset filter can use
+_SORT_VALUE_TYPES = (str, int, float, datetime, ObjectId, Decimal128)
+
+
+def encode_cursor(value, last_id, sort_by, order):
+    """Encode the last (sort value, _id) pair of a page as an opaque token,
+    tied to the sort it was issued for"""
+    raw = bson.encode({"v": value, "id": last_id, "s": sort_by, "o": order})
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token, sort_by, order):
+    """Decode a continuation token back into its (sort value, _id) pair.
+
+    Raises InvalidCursor unless the token was issued for the same
+    ``sort_by`` and ``order``, whose pages would otherwise silently start
+    at the wrong place, and carries a plain sort value.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        data = bson.decode(raw)
+    except (binascii.Error, bson.errors.BSONError, ValueError) as exc:
+        raise InvalidCursor("Invalid cursor") from exc
+    value = data.get("v")
+    if not isinstance(data.get("id"), ObjectId) or not (
+        value is None or isinstance(value, _SORT_VALUE_TYPES)
+    ):
+        raise InvalidCursor("Invalid cursor")
+    if data.get("s") != sort_by or data.get("o") != order:
+        raise InvalidCursor("Cursor was issued for a different sort order")
+    return value, data["id"]
+
+
+def keyset_filter(field, value, last_id, order=1):
+    """Build the filter selecting documents after (value, last_id) in the
+    (field, _id) sort order, so the next page is an index range scan rather
+    than a skip over every earlier document"""
+    after = "$gt" if order == 1 else "$lt"
+
+    # Comparison operators are type-bracketed, so {"$gt": None} matches
+    # nothing; missing/null values sort first and need explicit handling.
+    if value is None:
+        if order == 1:
+            return {
+                "$or": [
+                    {field: {"$ne": None}},
+                    {field: None, "_id": {after: last_id}},
+                ]
+            }
+        return {field: None, "_id": {after: last_id}}
+
+    clauses = [
+        {field: {after: value}},
+        {field: value, "_id": {after: last_id}},
+    ]
+    if order == -1:
+        clauses.append({field: None})
+    return {"$or": clauses}
@@ -0,0 +1,198 @@
+import codecs
+import json
+import re
+from django.conf import settings
+
+# Content types whose bodies are read as one JSON document per line
+NDJSON_CONTENT_TYPES = ["application/x-ndjson", "application/jsonl"]
+
+_decoder = json.JSONDecoder()
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+_DELIMITERS = tuple(" \t\n\r,]")
+
+_SEPARATOR = re.compile(r"[ \t\n\r]*,[ \t\n\r]*")
+
+
+class InvalidBody(ValueError):
+    """Raised when a request body is not valid JSON"""
+
+
+def body_chunk_size():
+    """Number of bytes read from the request body at a time"""
+    return getattr(settings, "BULK_BODY_CHUNK_SIZE", 64 * 1024)
+
+
+def max_item_size():
+    """Largest single array element or NDJSON line accepted, in characters"""
+    return getattr(settings, "BULK_MAX_ITEM_SIZE", 1024 * 1024)
+
+
+class BulkBody:
+    """The items of a bulk request body, parsed as they are read.
+
+    Iterating reads the body in chunks and yields one element of a JSON
+    array (or one NDJSON line) at a time, so only the current chunk and
+    item are held in memory however large the body is. Iteration stops at
+    the first syntax error, which is kept in ``error`` with ``count`` the
+    number of items read before it; NDJSON lines are independent, so a bad
+    line is yielded as an InvalidBody for the caller to reject and reading
+    carries on.
+    """
+
+    def __init__(self, stream, ndjson=False):
+        self.stream = stream
+        self.text = ""
+        # Start of the part of ``text`` not parsed yet. Items are decoded in
+        # place from there; the parsed part is dropped once per read
+        self.pos = 0
+        self.ndjson = ndjson
+        self.count = 0
+        self.error = None
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def read(self):
+        """Replace the parsed part of ``text`` with the next chunk of the
+        body; False at the end"""
+        chunk = self.stream.read(body_chunk_size())
+        try:
+            decoded = self.decoder.decode(chunk, final=not chunk)
+        except UnicodeDecodeError as exc:
+            raise InvalidBody(f"Invalid UTF-8: {exc}")
+        self.text = self.text[self.pos :] + decoded
+        self.pos = 0
+        return bool(chunk)
+
+    def pending(self):
+        """Number of characters read but not parsed yet"""
+        return len(self.text) - self.pos
+
+    def __iter__(self):
+        items = self.lines() if self.ndjson else self.elements()
+        try:
+            for item in items:
+                self.count += 1
+                yield item
+        except InvalidBody as exc:
+            self.error = str(exc)
+
+    def lines(self):
+        more = True
+        while more or self.pending():
+            newline = self.text.find("\n", self.pos)
+            if newline == -1 and more:
+                if self.pending() > max_item_size():
+                    raise InvalidBody(f"Line {self.count + 1} is too long")
+                more = self.read()
+                continue
+            if newline == -1:
+                line, self.pos = self.text[self.pos :], len(self.text)
+            else:
+                line, self.pos = self.text[self.pos : newline], newline + 1
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as exc:
+                yield InvalidBody(f"Invalid JSON: {exc}")
+
+    def skip_whitespace(self):
+        """Move past whitespace, reading on until there is something else;
+        False when the body ends first"""
+        while True:
+            self.pos = _WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return True
+            if not self.read():
+                return False
+
+    def next_char(self):
+        """Consume and return the character at ``pos``"""
+        self.pos += 1
+        return self.text[self.pos - 1]
+
+    def elements(self):
+        if not self.skip_whitespace() or self.next_char() != "[":
+            raise InvalidBody("Expected a JSON array")
+        if not self.skip_whitespace():
+            raise InvalidBody("Unexpected end of body")
+        if self.text[self.pos] == "]":
+            self.pos += 1
+            return self.end()
+
+        while True:
+            yield self.element()
+            # Most items are followed by a comma and the next item within
+            # the same chunk
+            separator = _SEPARATOR.match(self.text, self.pos)
+            if separator and separator.end() < len(self.text):
+                self.pos = separator.end()
+                continue
+            if not self.skip_whitespace():
+                raise InvalidBody("Unexpected end of body")
+            separator = self.next_char()
+            if separator == "]":
+                return self.end()
+            if separator != ",":
+                raise InvalidBody(f"Expected , or ] after item {self.count + 1}")
+            if not self.skip_whitespace():
+                raise InvalidBody("Unexpected end of body")
+
+    def element(self):
+        """Decode the array element at ``pos``, reading more of the body
+        while it is incomplete"""
+        more = True
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+                # A number may continue in the next chunk, so the value only
+                # counts once the delimiter after it has been read
+                if not more or self.text[end : end + 1] in _DELIMITERS:
+                    self.pos = end
+                    return value
+            except ValueError as exc:
+                if not more:
+                    raise InvalidBody(f"Invalid JSON in item {self.count + 1}: {exc}")
+            if self.pending() > max_item_size():
+                raise InvalidBody(f"Item {self.count + 1} is too large")
+            more = self.read()
+
+    def end(self):
+        if self.skip_whitespace():
+            raise InvalidBody("Unexpected data after the array")
+
+
+def read_body(request):
+    """Parse a create request's body incrementally.
+
+    Returns a BulkBody for a JSON array or an NDJSON body (by content type)
+    to be iterated once, or the decoded value of any other JSON body, which
+    is read whole within DATA_UPLOAD_MAX_MEMORY_SIZE like ``request.body``.
+    Raises InvalidBody for malformed JSON other than within the items of a
+    bulk body.
+    """
+    if request.content_type in NDJSON_CONTENT_TYPES:
+        return BulkBody(request, ndjson=True)
+
+    body = BulkBody(request)
+    if body.skip_whitespace() and body.text[body.pos] == "[":
+        return body
+    limit = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+    while body.read():
+        if limit is not None and len(body.text) > limit:
+            raise InvalidBody("Request body too large")
+    try:
+        return json.loads(body.text[body.pos :])
+    except ValueError as exc:
+        raise InvalidBody(f"Invalid JSON: {exc}")
+
+
+def update_error(data):
+    """Why a decoded single-document update body cannot be applied; None
+    when it can"""
+    if not isinstance(data, dict):
+        return "Expected a JSON object"
+    if "_id" in data:
+        return "_id cannot be changed"
+    return None
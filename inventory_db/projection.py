@@ -0,0 +1,38 @@
+import re
+
+FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+
+
+class InvalidFields(ValueError):
+    """Raised when the fields parameter names an invalid field"""
+
+
+def parse_fields(request):
+    """Parse the ``fields=a,b,c`` query parameter into a list of field names.
+
+    Returns None when the parameter is absent, meaning whole documents.
+    """
+    raw = request.GET.get("fields")
+    if raw is None:
+        return None
+
+    fields = [field.strip() for field in raw.split(",") if field.strip()]
+    invalid = [field for field in fields if not FIELD_NAME.match(field)]
+    if not fields or invalid:
+        raise InvalidFields(f"Invalid fields: {', '.join(invalid) or raw}")
+    return fields
+
+
+def build_projection(fields, required=()):
+    """Turn requested field names into a Mongo inclusion projection.
+
+    ``id`` is always returned (``_id`` is included by default); ``required``
+    lists extra fields the caller needs to post-process the results. An
+    empty projection would return whole documents, so asking for ``id``
+    alone projects ``_id`` explicitly.
+    """
+    if not fields:
+        return None
+    projection = {field: 1 for field in fields if field != "id"}
+    projection.update({field: 1 for field in required})
+    return projection or {"_id": 1}
@@ -0,0 +1,469 @@
+from contextlib import contextmanager
+from datetime import datetime
+from asgiref.sync import sync_to_async
+from bson import ObjectId
+from pymongo import DeleteOne, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from db_connection import get_async_db
+from inventory_db.bulk import (
+    ainsert_batches,
+    bulk_batch_size,
+    insert_batches,
+    write_in_batches,
+)
+from inventory_db.cache import ReadThroughCache, aread_through, read_through
+from inventory_db.conditional import bump_version
+from inventory_db.projection import build_projection
+from inventory_db.serialization import RAW_CODEC_OPTIONS, to_api
+
+
+def utcnow():
+    """The current UTC time at the millisecond precision BSON stores, so that
+    a document answered from memory matches what a later read returns"""
+    now = datetime.utcnow()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+class WriteRefused(ValueError):
+    """Raised when the server refuses a single-document write, with the HTTP
+    ``status`` to answer it with: 409 for a duplicate unique key, 400 for
+    anything else the write cannot do (such as changing ``_id``)"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+@contextmanager
+def refused_writes():
+    """Re-raise the server refusing a write as WriteRefused"""
+    try:
+        yield
+    except DuplicateKeyError as exc:
+        fields = ", ".join((exc.details or {}).get("keyValue") or ())
+        raise WriteRefused(
+            f"Duplicate value for {fields}" if fields else "Duplicate key", 409
+        ) from exc
+    except OperationFailure as exc:
+        raise WriteRefused((exc.details or {}).get("errmsg") or str(exc)) from exc
+
+
+class Repository:
+    """Base for the collection models: CRUD, projections, bulk inserts,
+    the read-through cache and collection versions in one place.
+
+    Subclasses set ``collection`` and, as needed, ``PROJECTION`` (stored
+    fields left out of the API) and override the hooks: ``prepare`` shapes a
+    new document, ``prepare_update`` an update's ``$set``, ``created`` runs
+    after inserts and ``written`` after updates and deletes. A ``cache`` is
+    created per collection unless the subclass declares one.
+
+    Methods prefixed with ``a`` are the async counterparts used by the async
+    views. They read and write on the async client and run the same hooks in
+    a worker thread, so both flavours share one implementation and raise the
+    same errors.
+    """
+
+    collection = None
+
+    PROJECTION = None
+
+    # Public fields left out of exports
+    EXPORT_HIDDEN = ()
+
+    indexes = []
+
+    # Query shapes issued by the views, checked by
+    # `manage.py ensure_indexes --explain`
+    explain_queries = [
+        ("lookup by id", {"_id": ObjectId()}, None),
+    ]
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.collection is not None and "cache" not in cls.__dict__:
+            cls.cache = ReadThroughCache(cls.collection.name)
+
+    @classmethod
+    def projection(cls, fields=None):
+        """Projection for reads returning only ``fields`` (all public fields
+        when None)"""
+        return build_projection(fields) if fields else cls.PROJECTION
+
+    @classmethod
+    def serialize(cls, document):
+        """Convert a stored document into its API representation"""
+        return to_api(document, hidden=cls.PROJECTION or ())
+
+    @classmethod
+    def id_filter(cls, object_id):
+        """Filter matching a document by ID"""
+        return {"_id": ObjectId(object_id)}
+
+    @classmethod
+    def ids_filter(cls, object_ids):
+        """Filter matching several documents by ID"""
+        return {"_id": {"$in": list(object_ids)}}
+
+    @classmethod
+    def update_operation(cls, object_id, update):
+        """bulk_write operation applying ``update`` to one document"""
+        return UpdateOne(cls.id_filter(object_id), update)
+
+    @classmethod
+    def delete_operation(cls, object_id):
+        """bulk_write operation deleting one document"""
+        return DeleteOne(cls.id_filter(object_id))
+
+    @classmethod
+    def prepare(cls, document):
+        """Turn a payload into the document stored for it"""
+        document["created_at"] = document["updated_at"] = utcnow()
+        return document
+
+    @classmethod
+    def prepare_update(cls, update_data):
+        """Turn an update payload into the $set stored for it"""
+        update_data["updated_at"] = utcnow()
+        return update_data
+
+    @classmethod
+    def created(cls, documents):
+        """Run after ``documents`` were inserted"""
+        bump_version(cls.collection.name)
+
+    @classmethod
+    def written(cls, *object_ids):
+        """Run after the documents with ``object_ids`` were updated or deleted"""
+        cls.cache.invalidate(*object_ids)
+        bump_version(cls.collection.name)
+
+    @classmethod
+    def bulk_written(cls, previous, current):
+        """Run after bulk updates or deletes. ``previous`` holds the written
+        documents as they were read before the write and ``current`` the
+        updated ones (empty for deletes)."""
+        cls.written(*(document["_id"] for document in previous))
+
+    @classmethod
+    def reject(cls, document, changes=None):
+        """Why a bulk update with ``changes`` (or a bulk delete, when None)
+        of ``document`` is refused; None to allow it"""
+        return None
+
+    @classmethod
+    def insert(cls, document):
+        """Insert a new document from a payload, returning it serialized"""
+        document = cls.prepare(document)
+        cls.collection.insert_one(document)
+        cls.created([document])
+        return cls.serialize(document)
+
+    @classmethod
+    @read_through
+    def get_by_id(cls, object_id, fields=None):
+        """Get a single document by ID"""
+        if not ObjectId.is_valid(object_id):
+            return None
+        document = cls.collection.find_one(
+            cls.id_filter(object_id), cls.projection(fields)
+        )
+        return cls.serialize(document) if document else None
+
+    @classmethod
+    def iter_all(cls, batch_size=1000, fields=None):
+        """Iterate over all documents without loading them into memory"""
+        cursor = cls.collection.find({}, cls.projection(fields), batch_size=batch_size)
+        for document in cursor:
+            yield cls.serialize(document)
+
+    @classmethod
+    def iter_raw(cls, criteria=None, sort=None, batch_size=1000, fields=None):
+        """Iterate over stored documents as RawBSONDocuments, undecoded, for
+        passing through to the response with dumps_raw"""
+        collection = cls.collection.with_options(codec_options=RAW_CODEC_OPTIONS)
+        cursor = collection.find(
+            criteria or {}, cls.projection(fields), batch_size=batch_size
+        )
+        return cursor.sort(sort) if sort else cursor
+
+    @classmethod
+    def iter_export(cls, updated_since=None, batch_size=1000, fields=None):
+        """Iterate over documents for an export, straight off a server-side
+        cursor, optionally only those updated since a time"""
+        criteria = {"updated_at": {"$gte": updated_since}} if updated_since else {}
+        cursor = cls.collection.find(
+            criteria, cls.projection(fields), batch_size=batch_size
+        )
+        for document in cursor:
+            document = cls.serialize(document)
+            for field in cls.EXPORT_HIDDEN:
+                document.pop(field, None)
+            yield document
+
+    @classmethod
+    def get_all(cls, fields=None):
+        """Get all documents"""
+        return list(cls.iter_all(fields=fields))
+
+    @classmethod
+    def update(cls, object_id, update_data):
+        """Update a document, returning the updated document. Raises
+        WriteRefused when the server refuses the update."""
+        if not ObjectId.is_valid(object_id):
+            return None
+        update_data = cls.prepare_update(update_data)
+        with refused_writes():
+            document = cls.collection.find_one_and_update(
+                cls.id_filter(object_id),
+                {"$set": update_data},
+                projection=cls.PROJECTION,
+                return_document=ReturnDocument.AFTER,
+            )
+        cls.written(object_id)
+        return cls.serialize(document) if document else None
+
+    @classmethod
+    def delete(cls, object_id):
+        """Delete a document"""
+        if not ObjectId.is_valid(object_id):
+            return False
+        result = cls.collection.delete_one(cls.id_filter(object_id))
+        cls.written(object_id)
+        return result.deleted_count > 0
+
+    @classmethod
+    def iter_bulk_create(cls, rows):
+        """Bulk create documents in unordered batches as ``rows`` are read,
+        yielding the created documents and per-row errors of each batch"""
+        for created, errors in insert_batches(cls.collection, rows, cls.prepare):
+            if created:
+                cls.created(created)
+            yield [cls.serialize(document) for document in created], errors
+
+    @classmethod
+    def bulk_create(cls, rows):
+        """Bulk create documents in unordered batches.
+
+        Returns the created documents and a list of per-row errors.
+        """
+        created, errors = [], []
+        for batch_created, batch_errors in cls.iter_bulk_create(rows):
+            created.extend(batch_created)
+            errors.extend(batch_errors)
+        return created, errors
+
+    @classmethod
+    def bulk_update(cls, items):
+        """Update many documents from ``[{"id", "changes"}, ...]`` in
+        unordered bulk_write batches.
+
+        Returns one outcome per item, in order: ``{"index", "id", "status"}``
+        where status is ``updated``, ``not_found`` or ``error`` (with a
+        ``message``).
+        """
+        rows, outcomes = [], []
+        for index, item in enumerate(items):
+            try:
+                rows.append((index, ObjectId(item["id"]), dict(item["changes"])))
+            except Exception as exc:
+                item_id = item.get("id") if isinstance(item, dict) else None
+                outcomes.append(cls._outcome(index, item_id, f"Invalid item: {exc}"))
+        return cls._bulk_write(rows, outcomes, "updated")
+
+    @classmethod
+    def bulk_delete(cls, object_ids):
+        """Delete many documents by ID in unordered bulk_write batches.
+
+        Returns one outcome per ID, in order, as for bulk_update with status
+        ``deleted`` on success.
+        """
+        rows, outcomes = [], []
+        for index, object_id in enumerate(object_ids):
+            if isinstance(object_id, str) and ObjectId.is_valid(object_id):
+                rows.append((index, ObjectId(object_id), None))
+            else:
+                outcomes.append(cls._outcome(index, object_id, "Invalid ID"))
+        return cls._bulk_write(rows, outcomes, "deleted")
+
+    @staticmethod
+    def _outcome(index, object_id, message=None, status="error"):
+        outcome = {"index": index, "id": object_id, "status": status}
+        if message:
+            outcome["message"] = message
+        return outcome
+
+    @classmethod
+    def _bulk_write(cls, rows, outcomes, success):
+        """Write ``(index, object_id, changes)`` rows, updating with
+        ``changes`` or deleting when None. Documents are read first so that
+        missing ones are reported, ``reject`` can refuse them and the hooks
+        get their previous state."""
+        batch_size = bulk_batch_size()
+        # Each document is written once per request, so its previous state
+        # stays accurate for the hooks
+        seen, unique = set(), []
+        for row in rows:
+            if row[1] in seen:
+                outcomes.append(cls._outcome(row[0], str(row[1]), "Duplicate ID"))
+                continue
+            seen.add(row[1])
+            unique.append(row)
+        rows = unique
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start : start + batch_size]
+            existing = {
+                document["_id"]: document
+                for document in cls.collection.find(
+                    cls.ids_filter(object_id for _, object_id, _ in batch),
+                    cls.PROJECTION,
+                )
+            }
+
+            operations, pending = [], []
+            for index, object_id, changes in batch:
+                document = existing.get(object_id)
+                if document is None:
+                    outcomes.append(
+                        cls._outcome(index, str(object_id), status="not_found")
+                    )
+                    continue
+                reason = cls.reject(document, changes)
+                if reason:
+                    outcomes.append(cls._outcome(index, str(object_id), reason))
+                    continue
+                if changes is None:
+                    operation = cls.delete_operation(object_id)
+                else:
+                    try:
+                        changes = cls.prepare_update(changes)
+                    except Exception as exc:
+                        outcomes.append(
+                            cls._outcome(
+                                index, str(object_id), f"Invalid changes: {exc}"
+                            )
+                        )
+                        continue
+                    operation = cls.update_operation(object_id, {"$set": changes})
+                operations.append((index, operation))
+                pending.append((index, document, changes))
+
+            errors = write_in_batches(cls.collection, operations, batch_size)
+            previous, current = [], []
+            for index, document, changes in pending:
+                object_id = str(document["_id"])
+                if index in errors:
+                    outcomes.append(cls._outcome(index, object_id, errors[index]))
+                    continue
+                outcomes.append(cls._outcome(index, object_id, status=success))
+                previous.append(document)
+                if changes is not None:
+                    current.append({**document, **changes})
+            if previous:
+                cls.bulk_written(previous, current)
+
+        outcomes.sort(key=lambda outcome: outcome["index"])
+        return outcomes
+
+    @classmethod
+    def acollection(cls):
+        """The collection on the event loop's async client"""
+        return get_async_db()[cls.collection.name]
+
+    @classmethod
+    async def acreated(cls, documents):
+        """Run the ``created`` hook in a worker thread"""
+        await sync_to_async(cls.created, thread_sensitive=False)(documents)
+
+    @classmethod
+    async def awritten(cls, *object_ids):
+        """Run the ``written`` hook in a worker thread"""
+        await sync_to_async(cls.written, thread_sensitive=False)(*object_ids)
+
+    @classmethod
+    async def ainsert(cls, document):
+        """Async counterpart of insert"""
+        document = cls.prepare(document)
+        await cls.acollection().insert_one(document)
+        await cls.acreated([document])
+        return cls.serialize(document)
+
+    @classmethod
+    @aread_through
+    async def aget_by_id(cls, object_id, fields=None):
+        """Async counterpart of get_by_id"""
+        if not ObjectId.is_valid(object_id):
+            return None
+        document = await cls.acollection().find_one(
+            cls.id_filter(object_id), cls.projection(fields)
+        )
+        return cls.serialize(document) if document else None
+
+    @classmethod
+    async def aiter_all(cls, batch_size=1000, fields=None):
+        """Async counterpart of iter_all"""
+        cursor = cls.acollection().find(
+            {}, cls.projection(fields), batch_size=batch_size
+        )
+        async for document in cursor:
+            yield cls.serialize(document)
+
+    @classmethod
+    async def aget_all(cls, fields=None):
+        """Async counterpart of get_all"""
+        return [document async for document in cls.aiter_all(fields=fields)]
+
+    @classmethod
+    def aiter_raw(cls, criteria=None, sort=None, batch_size=1000, fields=None):
+        """Async counterpart of iter_raw, returning an async cursor"""
+        collection = cls.acollection().with_options(codec_options=RAW_CODEC_OPTIONS)
+        cursor = collection.find(
+            criteria or {}, cls.projection(fields), batch_size=batch_size
+        )
+        return cursor.sort(sort) if sort else cursor
+
+    @classmethod
+    async def aupdate(cls, object_id, update_data):
+        """Async counterpart of update"""
+        if not ObjectId.is_valid(object_id):
+            return None
+        update_data = cls.prepare_update(update_data)
+        with refused_writes():
+            document = await cls.acollection().find_one_and_update(
+                cls.id_filter(object_id),
+                {"$set": update_data},
+                projection=cls.PROJECTION,
+                return_document=ReturnDocument.AFTER,
+            )
+        await cls.awritten(object_id)
+        return cls.serialize(document) if document else None
+
+    @classmethod
+    async def adelete(cls, object_id):
+        """Async counterpart of delete"""
+        if not ObjectId.is_valid(object_id):
+            return False
+        result = await cls.acollection().delete_one(cls.id_filter(object_id))
+        await cls.awritten(object_id)
+        return result.deleted_count > 0
+
+    @classmethod
+    async def aiter_bulk_create(cls, rows):
+        """Async counterpart of iter_bulk_create"""
+        async for created, errors in ainsert_batches(
+            cls.acollection(), rows, cls.prepare
+        ):
+            if created:
+                await cls.acreated(created)
+            yield [cls.serialize(document) for document in created], errors
+
+    @classmethod
+    async def abulk_update(cls, items):
+        """bulk_update in a worker thread; its batches read each document
+        before writing it, which gains nothing from the async client"""
+        return await sync_to_async(cls.bulk_update, thread_sensitive=False)(items)
+
+    @classmethod
+    async def abulk_delete(cls, object_ids):
+        """bulk_delete in a worker thread"""
+        return await sync_to_async(cls.bulk_delete, thread_sensitive=False)(object_ids)
@@ -0,0 +1,94 @@
+from datetime import datetime
+from bson import Decimal128, ObjectId
+from bson.raw_bson import DEFAULT_RAW_BSON_OPTIONS
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:  # optional C encoder; fall back to the stdlib one
+    orjson = None
+
+try:
+    import bsonjs
+except ImportError:  # BSON to JSON transcoder, required by dumps_raw
+    bsonjs = None
+
+# Reads decoded lazily: documents stay BSON bytes until they are encoded
+RAW_CODEC_OPTIONS = DEFAULT_RAW_BSON_OPTIONS
+
+
+class BSONEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder that also encodes ObjectId and Decimal128, so
+    documents can be encoded straight from the driver. Datetimes keep their
+    full precision, matching orjson's output."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("separators", (",", ":"))
+        super().__init__(**kwargs)
+
+    def default(self, o):
+        if isinstance(o, ObjectId):
+            return str(o)
+        if isinstance(o, datetime):
+            return o.isoformat()
+        if isinstance(o, Decimal128):
+            return str(o.to_decimal())
+        return super().default(o)
+
+
+_encoder = BSONEncoder()
+
+if orjson:
+    # orjson encodes datetimes itself; only the types it does not know
+    # reach the encoder's default
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def _default(o):
+        if type(o) is ObjectId:
+            return str(o)
+        return _encoder.default(o)
+
+    def dumps(value):
+        """Encode ``value`` as JSON bytes"""
+        return orjson.dumps(value, default=_default, option=_OPTIONS)
+
+else:
+
+    def dumps(value):
+        """Encode ``value`` as JSON bytes"""
+        return _encoder.encode(value).encode()
+
+
+def dumps_raw(document):
+    """Encode a RawBSONDocument as Relaxed Extended JSON bytes, transcoded
+    from BSON to JSON by bsonjs without building Python objects.
+
+    Decoding the document in Python instead costs more than the regular
+    list path, so there is no fallback; wants_raw refuses raw reads when
+    bsonjs is missing.
+    """
+    return bsonjs.dumps(document.raw, mode=bsonjs.RELAXED).encode()
+
+
+def to_api(document, hidden=()):
+    """Turn a stored document into its API representation in place: ``_id``
+    becomes ``id`` and ``hidden`` fields are dropped. ObjectId values are
+    left as they are and encoded by dumps."""
+    document["id"] = document.pop("_id")
+    for field in hidden:
+        document.pop(field, None)
+    return document
+
+
+class JsonResponse(HttpResponse):
+    """django.http.JsonResponse encoded with dumps"""
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError(
+                "In order to allow non-dict objects to be serialized set the "
+                "safe parameter to False."
+            )
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(content=dumps(data), **kwargs)
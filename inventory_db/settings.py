@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -37,6 +38,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "inventory_db",
     "products.apps.ProductsConfig",
     "suppliers.apps.SuppliersConfig",
     "transcations.apps.TranscationsConfig",
@@ -126,3 +128,104 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# Caching
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+# CACHE_URL selects the backend: redis://host:port/db (or any Redis-protocol
+# server), file:///path/to/dir, or unset for a per-process LRU memory cache
+_cache_url = os.environ.get("CACHE_URL", "")
+if _cache_url.startswith("redis://"):
+    _cache_backend = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": _cache_url,
+    }
+elif _cache_url.startswith("file://"):
+    _cache_backend = {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": _cache_url[len("file://") :],
+    }
+else:
+    _cache_backend = {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "inventory",
+    }
+
+CACHES = {
+    "default": {
+        **_cache_backend,
+        "TIMEOUT": 60,
+        "OPTIONS": {"MAX_ENTRIES": int(os.environ.get("CACHE_MAX_ENTRIES", 10000))},
+    }
+}
+
+# Read-through cache over the models' get_by_id (inventory_db.cache): the
+# cache alias, entry TTL, how long a loader holds a key's stampede lock, and
+# how long a write blocks re-caching of the key, all in seconds
+ENTITY_CACHE = {
+    "ALIAS": "default",
+    "TIMEOUT": int(os.environ.get("ENTITY_CACHE_TIMEOUT", 60)),
+    "LOCK_TIMEOUT": 5,
+    "INVALIDATION_GRACE": 5,
+}
+
+
+# MongoDB
+
+# Connection settings for db_connection; every option can be overridden from
+# the environment. Options left as None fall back to the driver's default.
+MONGO = {
+    "URL": os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+    "NAME": os.environ.get("MONGO_DB_NAME", "inventory"),
+    "OPTIONS": {
+        "maxPoolSize": int(os.environ.get("MONGO_MAX_POOL_SIZE", 100)),
+        "minPoolSize": int(os.environ.get("MONGO_MIN_POOL_SIZE", 0)),
+        "waitQueueTimeoutMS": int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000)),
+        "connectTimeoutMS": int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", 5000)),
+        "socketTimeoutMS": int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", 30000)),
+        "serverSelectionTimeoutMS": int(
+            os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000)
+        ),
+        # Comma-separated wire compressors in order of preference, e.g.
+        # "zstd,snappy,zlib" (zstd and snappy need their optional packages)
+        "compressors": os.environ.get("MONGO_COMPRESSORS") or None,
+        "readPreference": os.environ.get("MONGO_READ_PREFERENCE", "primary"),
+        "readConcernLevel": os.environ.get("MONGO_READ_CONCERN") or None,
+        # "majority" or a number of nodes
+        "w": (
+            int(os.environ["MONGO_WRITE_CONCERN"])
+            if os.environ.get("MONGO_WRITE_CONCERN", "").isdigit()
+            else os.environ.get("MONGO_WRITE_CONCERN") or None
+        ),
+        "wTimeoutMS": (
+            int(os.environ["MONGO_WRITE_TIMEOUT_MS"])
+            if os.environ.get("MONGO_WRITE_TIMEOUT_MS")
+            else None
+        ),
+    },
+    # Open minPoolSize connections when a worker starts (see wsgi.py/asgi.py)
+    "WARM_POOL": os.environ.get("MONGO_WARM_POOL", "1") == "1",
+}
+
+# Documents fetched per cursor batch when list endpoints stream (?stream=1)
+MONGO_STREAM_BATCH_SIZE = 1000
+
+# Documents sent per insert_many batch by the bulk create endpoints
+MONGO_BULK_BATCH_SIZE = 1000
+
+# Results of a product search by q or prefix when the request sets no limit,
+# and the largest limit it may set
+PRODUCT_SEARCH_DEFAULT_LIMIT = 20
+PRODUCT_SEARCH_MAX_LIMIT = 100
+
+# Store inventory_transactions as a time-series collection bucketed by
+# product_id and created_at (needs MongoDB 7.0+). `manage.py ensure_indexes`
+# creates it; an existing regular collection is not converted.
+INVENTORY_TRANSACTIONS_TIMESERIES = (
+    os.environ.get("INVENTORY_TRANSACTIONS_TIMESERIES") == "1"
+)
+
+# Serve the product and category endpoints from their async views, backed by
+# the async Mongo client; only worthwhile when running under ASGI
+ASYNC_VIEWS = os.environ.get("INVENTORY_ASYNC_VIEWS") == "1"
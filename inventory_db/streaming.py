@@ -0,0 +1,200 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import StreamingHttpResponse
+from inventory_db.serialization import JsonResponse, bsonjs, dumps
+
+
+def wants_stream(request):
+    """Check if the client asked for a streamed list response"""
+    return request.GET.get("stream", "").lower() in ("1", "true", "yes")
+
+
+def wants_raw(request):
+    """Check if the client asked for stored documents as Extended JSON.
+    Raw reads need python-bsonjs (see dumps_raw)."""
+    if request.GET.get("raw", "").lower() not in ("1", "true", "yes"):
+        return False
+    if bsonjs is None:
+        raise ImproperlyConfigured("?raw=1 needs the python-bsonjs package")
+    return True
+
+
+def stream_batch_size():
+    """Number of documents fetched per cursor batch when streaming"""
+    return getattr(settings, "MONGO_STREAM_BATCH_SIZE", 1000)
+
+
+def _encode_envelope(documents, message, extra, encode, trailer=None):
+    """Yield the JSON envelope piece by piece while consuming documents"""
+    head = dumps(extra)[:-1]
+    yield (head + b"," if extra else b"{") + b'"data":['
+
+    count = 0
+    chunk = []
+    for document in documents:
+        chunk.append(encode(document))
+        count += 1
+        if len(chunk) >= 100:
+            yield (b"" if count == len(chunk) else b",") + b",".join(chunk)
+            chunk = []
+    if chunk:
+        yield (b"" if count == len(chunk) else b",") + b",".join(chunk)
+
+    tail = {"count": count, "message": message.format(count=count)}
+    if trailer:
+        tail.update(trailer())
+    yield b"]," + dumps(tail)[1:]
+
+
+async def _aencode_envelope(documents, message, extra, encode, trailer=None):
+    """Async counterpart of _encode_envelope for async iterables"""
+    head = dumps(extra)[:-1]
+    yield (head + b"," if extra else b"{") + b'"data":['
+
+    count = 0
+    chunk = []
+    async for document in documents:
+        chunk.append(encode(document))
+        count += 1
+        if len(chunk) >= 100:
+            yield (b"" if count == len(chunk) else b",") + b",".join(chunk)
+            chunk = []
+    if chunk:
+        yield (b"" if count == len(chunk) else b",") + b",".join(chunk)
+
+    tail = {"count": count, "message": message.format(count=count)}
+    if trailer:
+        tail.update(trailer())
+    yield b"]," + dumps(tail)[1:]
+
+
+def stream_list_response(documents, message, envelope=None, status=200, encode=dumps):
+    """Stream a list envelope without building the full list in memory.
+
+    ``documents`` is any iterable (typically a generator over a server-side
+    cursor). ``message`` may reference ``{count}``; since the count is only
+    known once the cursor is exhausted, ``count`` and ``message`` are written
+    after ``data``. Keys in ``envelope`` are written before ``data``.
+    ``encode`` turns one document into JSON bytes.
+    """
+    return StreamingHttpResponse(
+        _encode_envelope(documents, message, envelope or {}, encode),
+        status=status,
+        content_type="application/json",
+    )
+
+
+def astream_list_response(documents, message, envelope=None, status=200, encode=dumps):
+    """Like stream_list_response, for an async iterable of documents; served
+    without a thread under ASGI"""
+    return StreamingHttpResponse(
+        _aencode_envelope(documents, message, envelope or {}, encode),
+        status=status,
+        content_type="application/json",
+    )
+
+
+def _bulk_created_response(batches, errors, message, failure, envelope):
+    """Regular response to a bulk create that fit in the eager batches"""
+    created = [document for batch in batches for document in batch]
+    if not created:
+        return JsonResponse({**failure, "errors": errors}, status=400)
+    return JsonResponse(
+        {
+            **envelope,
+            "message": message.format(count=len(created)),
+            "data": created,
+            "errors": errors,
+        },
+        status=201,
+    )
+
+
+def bulk_create_response(body, batches, message, failure, envelope=None):
+    """Respond to a bulk create whose ``batches`` (created documents and
+    errors, as yielded by Repository.iter_bulk_create) are written as the
+    BulkBody ``body`` is read.
+
+    Batches are written eagerly until one creates documents, and one more to
+    tell whether the body has ended, so that small bodies get a regular 201
+    response, or 400 with the ``failure`` envelope when nothing was created.
+    Larger ones stream the created documents as the remaining batches are
+    written, with the errors, count and ``message`` (which may reference
+    ``{count}``) after them, so memory use stays bounded by the batch size.
+    """
+    envelope = envelope or {}
+    batches = iter(batches)
+    errors, pending = [], []
+    created_any = False
+
+    def body_error():
+        if body.error:
+            errors.append({"index": body.count, "message": body.error})
+
+    for created, batch_errors in batches:
+        errors.extend(batch_errors)
+        pending.append(created)
+        if created_any:
+            break
+        created_any = bool(created)
+    else:
+        body_error()
+        return _bulk_created_response(pending, errors, message, failure, envelope)
+
+    def documents():
+        for batch in pending:
+            yield from batch
+        pending.clear()
+        for created, batch_errors in batches:
+            errors.extend(batch_errors)
+            yield from created
+        body_error()
+
+    return StreamingHttpResponse(
+        _encode_envelope(
+            documents(), message, envelope, dumps, lambda: {"errors": errors}
+        ),
+        status=201,
+        content_type="application/json",
+    )
+
+
+async def abulk_create_response(body, batches, message, failure, envelope=None):
+    """Like bulk_create_response, for the async batches of
+    Repository.aiter_bulk_create"""
+    envelope = envelope or {}
+    errors, pending = [], []
+    created_any = False
+
+    def body_error():
+        if body.error:
+            errors.append({"index": body.count, "message": body.error})
+
+    async for created, batch_errors in batches:
+        errors.extend(batch_errors)
+        pending.append(created)
+        if created_any:
+            break
+        created_any = bool(created)
+    else:
+        body_error()
+        return _bulk_created_response(pending, errors, message, failure, envelope)
+
+    async def documents():
+        for batch in pending:
+            for document in batch:
+                yield document
+        pending.clear()
+        async for created, batch_errors in batches:
+            errors.extend(batch_errors)
+            for document in created:
+                yield document
+        body_error()
+
+    return StreamingHttpResponse(
+        _aencode_envelope(
+            documents(), message, envelope, dumps, lambda: {"errors": errors}
+        ),
+        status=201,
+        content_type="application/json",
+    )
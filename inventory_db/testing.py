@@ -0,0 +1,222 @@
+"""
+mongomock, an in-memory stand-in for MongoDB, for the test suite and for
+benchmarks run with MONGO_URL=mongomock:// and no mongod. mongomock is a
+development dependency (``pip install mongomock==4.3.0``), not a requirement
+of the application, which never imports this module.
+
+mongomock lacks server features such as text search and time-series
+collections, so not every endpoint works against it.
+"""
+
+import inspect
+import json
+import unittest
+import bson
+from bson.raw_bson import RawBSONDocument
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+from db_connection import use_client
+
+
+def accept_bulk_sort(builder):
+    """pymongo 4.11 passes UpdateOne's and ReplaceOne's ``sort`` to the bulk
+    builder, which mongomock (4.3.0 and earlier) does not accept, failing
+    every bulk_write. Let the builder take it when it is unset."""
+    for name in ("add_update", "add_replace"):
+        method = getattr(builder, name)
+        if "sort" in inspect.signature(method).parameters:
+            continue
+
+        def add(self, *args, method=method, sort=None, **kwargs):
+            if sort is not None:
+                raise NotImplementedError(
+                    "mongomock does not support sort in bulk writes"
+                )
+            return method(self, *args, **kwargs)
+
+        setattr(builder, name, add)
+
+
+class RawCursor:
+    """A mongomock cursor yielding RawBSONDocuments, as pymongo's does under
+    a RawBSONDocument codec"""
+
+    def __init__(self, cursor, codec_options):
+        self._cursor = cursor
+        self._codec_options = codec_options
+
+    def __getattr__(self, name):
+        method = getattr(self._cursor, name)
+
+        def chain(*args, **kwargs):
+            method(*args, **kwargs)
+            return self
+
+        return chain
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return RawBSONDocument(bson.encode(next(self._cursor)), self._codec_options)
+
+
+class RawCollection:
+    """A mongomock collection read with a RawBSONDocument codec"""
+
+    def __init__(self, collection, codec_options):
+        self._collection = collection
+        self._codec_options = codec_options
+
+    @property
+    def name(self):
+        return self._collection.name
+
+    def find(self, *args, **kwargs):
+        return RawCursor(self._collection.find(*args, **kwargs), self._codec_options)
+
+
+def accept_raw_reads(collection_class):
+    """mongomock refuses a RawBSONDocument document_class, which the raw
+    list reads (?raw=1) ask for. Encode the documents it finds instead."""
+    with_options = collection_class.with_options
+    if getattr(with_options, "raw_reads", False):
+        return
+
+    def accept(self, codec_options=None, **kwargs):
+        if codec_options and codec_options.document_class is RawBSONDocument:
+            return RawCollection(with_options(self, **kwargs), codec_options)
+        return with_options(self, codec_options, **kwargs)
+
+    accept.raw_reads = True
+    collection_class.with_options = accept
+
+
+def mongomock_client():
+    """A new, empty in-memory client"""
+    try:
+        import mongomock
+        from mongomock.collection import BulkOperationBuilder, Collection
+    except ImportError:
+        raise ImproperlyConfigured("mongomock is not installed")
+    accept_bulk_sort(BulkOperationBuilder)
+    accept_raw_reads(Collection)
+    return mongomock.MongoClient()
+
+
+class AsyncCursor:
+    """A mongomock cursor behind the async iteration of AsyncMongoClient's"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        method = getattr(self._cursor, name)
+
+        def chain(*args, **kwargs):
+            method(*args, **kwargs)
+            return self
+
+        return chain
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._cursor)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self, length=None):
+        return [document async for document in self][:length]
+
+
+class AsyncCollection:
+    """A mongomock collection behind AsyncMongoClient's collection API"""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    @property
+    def name(self):
+        return self._collection.name
+
+    def find(self, *args, **kwargs):
+        return AsyncCursor(self._collection.find(*args, **kwargs))
+
+    async def aggregate(self, *args, **kwargs):
+        return AsyncCursor(self._collection.aggregate(*args, **kwargs))
+
+    def with_options(self, **kwargs):
+        return AsyncCollection(self._collection.with_options(**kwargs))
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+
+        return call
+
+
+class AsyncClient:
+    """Async views' stand-in for AsyncMongoClient, sharing the data of a
+    mongomock client"""
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getitem__(self, name):
+        return AsyncDatabase(self._client[name])
+
+
+class AsyncDatabase:
+    def __init__(self, database):
+        self._database = database
+
+    def __getitem__(self, name):
+        return AsyncCollection(self._database[name])
+
+
+def use_mongomock():
+    """Serve this process, async views included, from a new in-memory
+    client"""
+    client = mongomock_client()
+    use_client(client, AsyncClient(client))
+    return client
+
+
+def response_json(response):
+    """Decode the JSON body of a plain or streaming response"""
+    if response.streaming:
+        return json.loads(b"".join(response.streaming_content))
+    return json.loads(response.content)
+
+
+async def aresponse_json(response):
+    """Decode the JSON body of a response from an async view"""
+    if response.streaming:
+        return json.loads(b"".join([chunk async for chunk in response]))
+    return json.loads(response.content)
+
+
+class MongomockTestCase(SimpleTestCase):
+    """Runs each test against an empty in-memory database and empty caches.
+    Skipped when mongomock is not installed."""
+
+    @classmethod
+    def setUpClass(cls):
+        try:
+            mongomock_client()
+        except ImproperlyConfigured as exc:
+            raise unittest.SkipTest(str(exc))
+        super().setUpClass()
+
+    def setUp(self):
+        super().setUp()
+        self.mongo = use_mongomock()
+        self.addCleanup(use_client, None)
+        for cache in caches.all():
+            cache.clear()
@@ -0,0 +1,613 @@
+import base64
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import uuid
+from datetime import datetime
+from unittest import mock
+import bson
+from bson import Decimal128, ObjectId
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+import db_connection
+from db_connection import use_client
+from inventory_db import benchmarks
+from inventory_db.cache import ReadThroughCache, stats
+from inventory_db.indexes import ensure_indexes, index_drift
+from inventory_db.pagination import InvalidCursor, decode_cursor, encode_cursor
+from inventory_db.parsing import BulkBody, InvalidBody, read_body
+from inventory_db.projection import build_projection
+from inventory_db.serialization import BSONEncoder, JsonResponse, dumps, to_api
+from inventory_db.testing import MongomockTestCase, mongomock_client
+from products.models import Product
+from users.models import User
+
+
+def parse(body, ndjson=False, chunk_size=64 * 1024):
+    """Items and error of a bulk body read ``chunk_size`` bytes at a time"""
+    with override_settings(BULK_BODY_CHUNK_SIZE=chunk_size):
+        bulk = BulkBody(io.BytesIO(body.encode()), ndjson=ndjson)
+        items = list(bulk)
+    return items, bulk
+
+
+class BulkBodyArrayTests(SimpleTestCase):
+    def assertParsesAtEveryChunkSize(self, body):
+        expected = json.loads(body)
+        for chunk_size in range(1, len(body.encode()) + 1):
+            with self.subTest(chunk_size=chunk_size):
+                items, bulk = parse(body, chunk_size=chunk_size)
+                self.assertEqual(items, expected)
+                self.assertIsNone(bulk.error)
+                self.assertEqual(bulk.count, len(expected))
+
+    def test_numbers_across_chunk_boundaries(self):
+        self.assertParsesAtEveryChunkSize("[12345, -6.5e10,7 ,0.125,\n99]")
+
+    def test_strings_across_chunk_boundaries(self):
+        self.assertParsesAtEveryChunkSize(
+            '[{"name": "a \\"quoted\\" ,] name"}, "café ☃", "\\u00e9"]'
+        )
+
+    def test_nested_items(self):
+        self.assertParsesAtEveryChunkSize(
+            '[{"a": [1, {"b": null}], "c": true}, [], {}]'
+        )
+
+    def test_empty_array(self):
+        items, bulk = parse("  [ ] \n")
+        self.assertEqual(items, [])
+        self.assertIsNone(bulk.error)
+
+    def test_trailing_data(self):
+        for chunk_size in (1, 4, 1024):
+            with self.subTest(chunk_size=chunk_size):
+                items, bulk = parse("[1, 2] 3", chunk_size=chunk_size)
+                self.assertEqual(items, [1, 2])
+                self.assertEqual(bulk.error, "Unexpected data after the array")
+
+    def test_missing_separator(self):
+        items, bulk = parse('[{"a": 1} {"a": 2}]', chunk_size=3)
+        self.assertEqual(items, [{"a": 1}])
+        self.assertEqual(bulk.error, "Expected , or ] after item 2")
+
+    def test_invalid_item(self):
+        items, bulk = parse('[1, {"a": }]', chunk_size=2)
+        self.assertEqual(items, [1])
+        self.assertTrue(bulk.error.startswith("Invalid JSON in item 2"))
+
+    def test_unterminated_array(self):
+        items, bulk = parse("[1, 2", chunk_size=2)
+        self.assertEqual(items, [1, 2])
+        self.assertEqual(bulk.error, "Unexpected end of body")
+
+    def test_not_an_array(self):
+        items, bulk = parse('{"a": 1}')
+        self.assertEqual(items, [])
+        self.assertEqual(bulk.error, "Expected a JSON array")
+
+    @override_settings(BULK_MAX_ITEM_SIZE=10)
+    def test_item_too_large(self):
+        items, bulk = parse('[1, "%s"]' % ("x" * 20), chunk_size=4)
+        self.assertEqual(items, [1])
+        self.assertEqual(bulk.error, "Item 2 is too large")
+
+    def test_invalid_utf8(self):
+        bulk = BulkBody(io.BytesIO(b'["\xff"]'))
+        self.assertEqual(list(bulk), [])
+        self.assertTrue(bulk.error.startswith("Invalid UTF-8"))
+
+
+class BulkBodyNDJSONTests(SimpleTestCase):
+    def test_lines_across_chunk_boundaries(self):
+        body = '{"a": 1}\n\n{"b": "café"}\r\n  \n[2]'
+        for chunk_size in range(1, len(body.encode()) + 1):
+            with self.subTest(chunk_size=chunk_size):
+                items, bulk = parse(body, ndjson=True, chunk_size=chunk_size)
+                self.assertEqual(items, [{"a": 1}, {"b": "café"}, [2]])
+                self.assertIsNone(bulk.error)
+
+    def test_bad_lines_are_yielded_and_reading_carries_on(self):
+        items, bulk = parse('{"a": 1}\n{"a": \n{"a": 3}\n', ndjson=True, chunk_size=5)
+        self.assertEqual(items[0], {"a": 1})
+        self.assertIsInstance(items[1], InvalidBody)
+        self.assertEqual(items[2], {"a": 3})
+        self.assertEqual(bulk.count, 3)
+        self.assertIsNone(bulk.error)
+
+    def test_trailing_data_after_a_line(self):
+        items, bulk = parse('{"a": 1} 2\n', ndjson=True)
+        self.assertEqual(len(items), 1)
+        self.assertIsInstance(items[0], InvalidBody)
+
+    @override_settings(BULK_MAX_ITEM_SIZE=10)
+    def test_line_too_long(self):
+        items, bulk = parse('{"a": 1}\n"%s"\n' % ("x" * 20), ndjson=True, chunk_size=4)
+        self.assertEqual(items, [{"a": 1}])
+        self.assertEqual(bulk.error, "Line 2 is too long")
+
+
+class ReadBodyTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def read(self, body, content_type="application/json"):
+        return read_body(self.factory.post("/", body, content_type=content_type))
+
+    @override_settings(BULK_BODY_CHUNK_SIZE=2)
+    def test_array_is_read_incrementally(self):
+        body = self.read('  [{"a": 1}, {"a": 2}]')
+        self.assertIsInstance(body, BulkBody)
+        self.assertEqual(list(body), [{"a": 1}, {"a": 2}])
+
+    def test_ndjson_by_content_type(self):
+        body = self.read('{"a": 1}\n', content_type="application/x-ndjson")
+        self.assertIsInstance(body, BulkBody)
+        self.assertEqual(list(body), [{"a": 1}])
+
+    @override_settings(BULK_BODY_CHUNK_SIZE=2)
+    def test_other_json_is_decoded_whole(self):
+        self.assertEqual(self.read(' \n{"a": [1, 2]}'), {"a": [1, 2]})
+
+    def test_trailing_data_after_an_object(self):
+        with self.assertRaises(InvalidBody):
+            self.read('{"a": 1} {"a": 2}')
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=10, BULK_BODY_CHUNK_SIZE=4)
+    def test_other_json_is_limited(self):
+        with self.assertRaisesMessage(InvalidBody, "Request body too large"):
+            self.read('{"a": "%s"}' % ("x" * 20))
+
+
+class CursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        last_id = ObjectId()
+        for value in (None, 9.5, 3, "name", datetime(2025, 1, 2, 3, 4, 5)):
+            with self.subTest(value=value):
+                token = encode_cursor(value, last_id, "price", -1)
+                self.assertEqual(decode_cursor(token, "price", -1), (value, last_id))
+
+    def test_other_sort(self):
+        token = encode_cursor(9.5, ObjectId(), "price", 1)
+        for sort_by, order in (("quantity", 1), ("price", -1)):
+            with self.subTest(sort_by=sort_by, order=order):
+                with self.assertRaisesMessage(InvalidCursor, "different sort order"):
+                    decode_cursor(token, sort_by, order)
+
+    def test_operator_value(self):
+        raw = bson.encode({"v": {"$ne": None}, "id": ObjectId(), "s": "price", "o": 1})
+        token = base64.urlsafe_b64encode(raw).decode()
+        with self.assertRaisesMessage(InvalidCursor, "Invalid cursor"):
+            decode_cursor(token, "price", 1)
+
+    def test_garbage(self):
+        for token in ("", "not-a-cursor", base64.urlsafe_b64encode(b"{}").decode()):
+            with self.subTest(token=token):
+                with self.assertRaises(InvalidCursor):
+                    decode_cursor(token, "price", 1)
+
+
+class BuildProjectionTests(SimpleTestCase):
+    def test_fields_and_required(self):
+        self.assertEqual(
+            build_projection(["id", "name"], required=["category_id"]),
+            {"name": 1, "category_id": 1},
+        )
+
+    def test_id_only(self):
+        self.assertEqual(build_projection(["id"]), {"_id": 1})
+
+    def test_no_fields(self):
+        self.assertIsNone(build_projection(None))
+
+
+class EnsureIndexesTests(MongomockTestCase):
+    def test_creates_missing_indexes_once(self):
+        created, errors = ensure_indexes(User)
+        self.assertEqual(created, [index.document["name"] for index in User.indexes])
+        self.assertEqual(errors, {})
+        self.assertEqual(ensure_indexes(User), ([], {}))
+        self.assertEqual(
+            index_drift(User), {"missing": [], "different": [], "extra": []}
+        )
+
+    def test_unique_index_over_duplicates(self):
+        User.collection.insert_many(
+            [{"username": "a", "email": "a@x.io"}, {"username": "b", "email": "a@x.io"}]
+        )
+        created, errors = ensure_indexes(User)
+        self.assertIn("email_1", errors)
+        self.assertNotIn("email_1", created)
+        self.assertEqual(index_drift(User)["missing"], ["email_1"])
+
+    def test_drift(self):
+        User.collection.create_index("email", name="email_1")
+        User.collection.create_index("phone")
+        drift = index_drift(User)
+        self.assertEqual(drift["different"], ["email_1"])
+        self.assertEqual(drift["extra"], ["phone_1"])
+
+    def test_check_does_not_create(self):
+        with self.assertRaisesMessage(CommandError, "Index check found problems"):
+            call_command("ensure_indexes", "--check", stdout=io.StringIO())
+        self.assertNotIn("username_1", User.collection.index_information())
+
+
+MONGO = {
+    "URL": "mongodb://localhost:1",
+    "NAME": "inventory_test",
+    "OPTIONS": {
+        "maxPoolSize": 7,
+        "minPoolSize": 2,
+        "serverSelectionTimeoutMS": 50,
+        "compressors": "zlib",
+        "readPreference": "secondaryPreferred",
+        "w": None,
+    },
+}
+
+
+@override_settings(MONGO=MONGO)
+class ConnectionTests(SimpleTestCase):
+    def setUp(self):
+        use_client(None)
+        self.addCleanup(use_client, None)
+
+    def test_client_is_configured_from_settings(self):
+        options = db_connection.client_options()
+        self.assertNotIn("w", options)
+        self.assertEqual(options["compressors"], "zlib")
+        client = db_connection.get_client()
+        self.addCleanup(client.close)
+        self.assertIs(db_connection.get_client(), client)
+        self.assertEqual(client.options.pool_options.max_pool_size, 7)
+        self.assertEqual(client.options.pool_options.min_pool_size, 2)
+        self.assertEqual(
+            client.options.read_preference.mongos_mode, "secondaryPreferred"
+        )
+
+    def test_forked_process_gets_its_own_client(self):
+        client = db_connection.get_client()
+        self.addCleanup(client.close)
+        with mock.patch("os.getpid", return_value=os.getpid() + 1):
+            child = db_connection.get_client()
+            self.addCleanup(child.close)
+            self.assertIsNot(child, client)
+            self.assertIs(db_connection.get_client(), child)
+
+    def test_lazy_collections_follow_the_client(self):
+        collection = db_connection.db["things"]
+        for _ in range(2):
+            client = mongomock_client()
+            use_client(client)
+            collection.insert_one({"a": 1})
+            self.assertEqual(client["inventory_test"]["things"].count_documents({}), 1)
+
+    def test_invalid_option(self):
+        options = {**MONGO["OPTIONS"], "readPreference": "fastest"}
+        with override_settings(MONGO={**MONGO, "OPTIONS": options}):
+            with self.assertRaises(ValueError):
+                db_connection.get_client()
+
+    @mock.patch.object(db_connection, "_warmed_pid", None)
+    def test_warm_pool_survives_a_server_that_is_down(self):
+        client = db_connection.get_client()
+        self.addCleanup(client.close)
+        with self.assertLogs("db_connection", "WARNING") as logs:
+            db_connection.warm_pool()
+        self.assertIn("Could not warm", logs.output[0])
+        with mock.patch.object(client.admin, "command") as ping:
+            db_connection.warm_pool()
+        ping.assert_not_called()
+
+
+class ReadThroughCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = ReadThroughCache(f"test-{uuid.uuid4().hex}")
+        self.loads = []
+
+    def load(self, document="document"):
+        def load():
+            self.loads.append(document)
+            return document
+
+        return load
+
+    def counts(self):
+        return stats().get(self.cache.prefix, {"hits": 0, "misses": 0})
+
+    def test_hits_after_a_miss(self):
+        self.assertEqual(self.cache.get("a", self.load()), "document")
+        self.assertEqual(self.cache.get("a", self.load("other")), "document")
+        self.assertEqual(self.loads, ["document"])
+        self.assertEqual(self.counts(), {"hits": 1, "misses": 1})
+
+    def test_missing_documents_are_not_cached(self):
+        self.assertIsNone(self.cache.get("a", self.load(None)))
+        self.assertIsNone(self.cache.get("a", self.load(None)))
+        self.assertEqual(self.loads, [None, None])
+
+    def test_invalidated_entries_are_not_recached(self):
+        self.cache.get("a", self.load())
+        self.cache.invalidate("a")
+        # A read racing the write loads, but cannot cache until the marker
+        # expires
+        self.assertEqual(self.cache.get("a", self.load("new")), "new")
+        self.assertEqual(self.cache.get("a", self.load("newer")), "newer")
+        self.cache.discard("a")
+        self.cache.get("a", self.load("newest"))
+        self.assertEqual(self.cache.get("a", self.load("stale")), "newest")
+
+    def test_concurrent_misses_wait_for_one_load(self):
+        self.cache.backend.add(f"{self.cache.key('a')}:lock", "other caller")
+        threading.Timer(
+            0.05, self.cache.backend.set, (self.cache.key("a"), "loaded")
+        ).start()
+        self.assertEqual(self.cache.get("a", self.load()), "loaded")
+        self.assertEqual(self.loads, [])
+
+    @override_settings(ENTITY_CACHE={"LOCK_TIMEOUT": 0.05})
+    def test_abandoned_lock(self):
+        self.cache.backend.add(f"{self.cache.key('a')}:lock", "other caller")
+        self.assertEqual(self.cache.get("a", self.load()), "document")
+        self.assertEqual(self.loads, ["document"])
+
+    def test_get_many(self):
+        self.cache.get("a", self.load("A"))
+        self.cache.invalidate("b")
+
+        def load_many(object_ids):
+            self.loads.append(sorted(object_ids))
+            return {object_id: object_id.upper() for object_id in object_ids}
+
+        documents = self.cache.get_many(["a", "b", "c", "a"], load_many)
+        self.assertEqual(documents, {"a": "A", "b": "B", "c": "C"})
+        self.assertEqual(self.loads, ["A", ["b", "c"]])
+        self.assertEqual(
+            self.cache.get_many(["b", "c"], load_many), {"b": "B", "c": "C"}
+        )
+        self.assertEqual(self.loads, ["A", ["b", "c"], ["b"]])
+
+
+class SerializationTests(SimpleTestCase):
+    def setUp(self):
+        self.id = ObjectId()
+        self.document = {
+            "_id": self.id,
+            "supplier_id": ObjectId(),
+            "price": Decimal128("9.50"),
+            "created_at": datetime(2024, 5, 1, 12, 30, 0, 123456),
+            "tags": [{"product_id": self.id}],
+            "password": "secret",
+        }
+
+    def test_to_api(self):
+        document = to_api(self.document, hidden=("password",))
+        self.assertEqual(document["id"], self.id)
+        self.assertNotIn("_id", document)
+        self.assertNotIn("password", document)
+
+    def test_bson_types_are_encoded(self):
+        expected = {
+            "id": str(self.id),
+            "supplier_id": str(self.document["supplier_id"]),
+            "price": "9.50",
+            "created_at": "2024-05-01T12:30:00.123456",
+            "tags": [{"product_id": str(self.id)}],
+        }
+        document = to_api(self.document, hidden=("password",))
+        # dumps uses orjson when it is installed; both encoders agree
+        self.assertEqual(json.loads(dumps(document)), expected)
+        self.assertEqual(json.loads(BSONEncoder().encode(document)), expected)
+
+    def test_unknown_types_are_rejected(self):
+        for encode in (dumps, BSONEncoder().encode):
+            with self.subTest(encode=encode):
+                with self.assertRaises(TypeError):
+                    encode({"value": object()})
+
+    def test_json_response(self):
+        response = JsonResponse({"data": [self.id]})
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(json.loads(response.content), {"data": [str(self.id)]})
+        self.assertEqual(json.loads(JsonResponse([1], safe=False).content), [1])
+        with self.assertRaises(TypeError):
+            JsonResponse([1])
+
+
+class ApiSerializationTests(MongomockTestCase):
+    def test_documents_are_encoded_from_the_driver(self):
+        response = self.client.post(
+            "/users/users/",
+            {"username": "ada", "email": "ada@example.com", "password": "x"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        created = response.json()["data"]
+        self.assertNotIn("_id", created)
+        stored = User.collection.find_one({"_id": ObjectId(created["id"])})
+        self.assertEqual(created["created_at"], stored["created_at"].isoformat())
+
+        for path in ("/users/users/", f"/users/users/{created['id']}/"):
+            with self.subTest(path=path):
+                data = self.client.get(path).json()["data"]
+                self.assertEqual(data if isinstance(data, dict) else data[0], created)
+
+
+class ExportTests(MongomockTestCase):
+    def setUp(self):
+        super().setUp()
+        for username in ("ada", "grace"):
+            response = self.client.post(
+                "/users/users/",
+                {"username": username, "email": f"{username}@x.io", "password": "x"},
+                content_type="application/json",
+            )
+            self.assertEqual(response.status_code, 201)
+        self.users = self.client.get("/users/users/").json()["data"]
+
+    def export(self, query=""):
+        response = self.client.get(f"/export/users/?{query}")
+        self.assertEqual(response.status_code, 200)
+        return response, b"".join(response.streaming_content)
+
+    def test_ndjson(self):
+        response, body = self.export("batch_size=1")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in body.splitlines()]
+        expected = [
+            {key: value for key, value in user.items() if key != "password"}
+            for user in self.users
+        ]
+        self.assertEqual(rows, expected)
+
+    def test_csv(self):
+        response, body = self.export("format=csv&fields=username,email&gzip=1")
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertEqual(
+            response["Content-Disposition"], 'attachment; filename="users.csv.gz"'
+        )
+        self.assertEqual(
+            gzip.decompress(body).decode().splitlines(),
+            ["id,username,email"]
+            + [
+                f"{user['id']},{user['username']},{user['email']}"
+                for user in self.users
+            ],
+        )
+
+    def test_updated_since(self):
+        User.collection.update_one(
+            {"username": "ada"}, {"$set": {"updated_at": datetime(2020, 1, 1)}}
+        )
+        for since, expected in [
+            ("2021-01-01T00:00:00%2B00:00", ["grace"]),
+            ("2019-12-31", ["ada", "grace"]),
+        ]:
+            with self.subTest(since=since):
+                _, body = self.export(f"updated_since={since}&fields=username")
+                rows = [json.loads(line)["username"] for line in body.splitlines()]
+                self.assertEqual(sorted(rows), expected)
+
+    def test_rejected_requests(self):
+        for path, status in [
+            ("/export/widgets/", 404),
+            ("/export/users/?format=xml", 400),
+            ("/export/users/?batch_size=0", 400),
+            ("/export/users/?updated_since=yesterday", 400),
+            ("/export/users/?fields=a-b", 400),
+        ]:
+            with self.subTest(path=path):
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, status)
+                self.assertIsNone(response.json()["data"])
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "users.csv.gz")
+            stderr = io.StringIO()
+            call_command(
+                "export",
+                "users",
+                f"--output={output}",
+                "--fields=username",
+                stderr=stderr,
+            )
+            self.assertIn("Exported 2 users", stderr.getvalue())
+            with gzip.open(output, "rt") as file:
+                self.assertEqual(
+                    file.read().splitlines(),
+                    ["id,username"]
+                    + [f"{user['id']},{user['username']}" for user in self.users],
+                )
+
+            for option, message in [
+                ("--updated-since=yesterday", "Invalid updated_since"),
+                ("--batch-size=0", "--batch-size must be at least 1"),
+                ("--fields=a-b", "Invalid fields: a-b"),
+            ]:
+                with self.subTest(option=option):
+                    with self.assertRaisesMessage(CommandError, message):
+                        call_command("export", "users", f"--output={output}", option)
+
+
+class BenchmarkTests(MongomockTestCase):
+    def test_parse_size(self):
+        for value, size in [("2500", 2500), ("10k", 10000), (" 1M ", 1000000)]:
+            with self.subTest(value=value):
+                self.assertEqual(benchmarks.parse_size(value), size)
+        for value in ("", "1g", "k", "-1"):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    benchmarks.parse_size(value)
+
+    def test_check_payload(self):
+        check = benchmarks.check_payload
+        self.assertTrue(check("/", JsonResponse({"data": [1]}), b'{"data":[1]}'))
+        self.assertFalse(check("/", JsonResponse({"data": []}), b'{"data":[]}'))
+        csv = HttpResponse(content_type="text/csv")
+        self.assertTrue(check("/", csv, b"id\n1\n"))
+        for body in (b'{"status":"error","message":"x"}', b'{"error":"x"}'):
+            with self.subTest(body=body):
+                with self.assertRaisesMessage(RuntimeError, "returned an error"):
+                    check("/", JsonResponse({}), body)
+
+    def test_seed(self):
+        seeded = benchmarks.seed(50)
+        self.assertEqual(seeded["documents"]["products"], 50)
+        self.assertEqual(
+            User.collection.estimated_document_count(), seeded["documents"]["users"]
+        )
+        with self.assertRaisesMessage(RuntimeError, "pass --reset"):
+            benchmarks.seed(50)
+        self.assertEqual(benchmarks.seed(20, reset=True)["documents"]["products"], 20)
+
+    def test_run_paths(self):
+        benchmarks.seed(20)
+        product = Product.collection.find_one()
+        paths = [f"/products/products/{product['_id']}/", "/products/products/"]
+        results = benchmarks.run_paths(paths, 4, 2, validate=True)
+        self.assertEqual(results["requests"], 4)
+        self.assertLessEqual(results["p50_ms"], results["p99_ms"])
+
+        for paths, message in [
+            ([f"/products/products/{ObjectId()}/"], "returned 404"),
+            (["/products/products/search/?prefix=zzz"], "returned no data"),
+        ]:
+            with self.subTest(paths=paths):
+                with self.assertRaisesMessage(RuntimeError, message):
+                    benchmarks.run_paths(paths, 1, 1, validate=True)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "results.json")
+            call_command(
+                "benchmark",
+                "endpoints",
+                "--seed=30",
+                "--requests=4",
+                "--concurrency=2",
+                "--list-requests=1",
+                f"--output={output}",
+                stdout=io.StringIO(),
+                stderr=io.StringIO(),
+            )
+            with open(output) as file:
+                results = json.load(file)["endpoints"]
+        self.assertEqual(results["backend"], "mongomock")
+        self.assertEqual(results["dataset"]["products"], 30)
+        self.assertEqual(results["results"]["product_detail"]["requests"], 4)
+        # mongomock has no text search; the endpoint is reported, not timed
+        self.assertIn("error", results["results"]["product_search_text"])
+
+        for args, message in [
+            (["nope"], "Unknown scenarios: nope"),
+            (["endpoints", "--seed=lots"], "Invalid size"),
+        ]:
+            with self.subTest(args=args):
+                with self.assertRaisesMessage(CommandError, message):
+                    call_command("benchmark", *args, stdout=io.StringIO())
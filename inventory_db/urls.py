@@ -17,6 +17,7 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import path, include
+from inventory_db.views import ExportView
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -25,4 +26,5 @@ urlpatterns = [
     path("transactions/", include("transcations.urls")),
     path("locations/", include("locations.urls")),
     path("users/", include("users.urls")),
+    path("export/<str:collection>/", ExportView.as_view(), name="export"),
 ]
@@ -0,0 +1,72 @@
+from django.http import StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.utils.decorators import method_decorator
+from django.views import View
+from inventory_db.exporting import (
+    CONTENT_TYPES,
+    EXPORTS,
+    FORMATS,
+    InvalidExport,
+    export_chunks,
+    parse_since,
+)
+from inventory_db.projection import InvalidFields, parse_fields
+from inventory_db.serialization import JsonResponse
+from inventory_db.streaming import stream_batch_size
+
+
+def parse_export_params(query_params):
+    """Validate export parameters, returning (format, compress, batch_size,
+    updated_since)"""
+    format = query_params.get("format", "ndjson")
+    if format not in FORMATS:
+        raise InvalidExport("Format must be ndjson or csv")
+
+    compress = query_params.get("gzip", "").lower() in ("1", "true", "yes")
+
+    try:
+        batch_size = int(query_params.get("batch_size", stream_batch_size()))
+        if batch_size < 1:
+            raise ValueError
+    except ValueError:
+        raise InvalidExport("Invalid batch_size value")
+
+    updated_since = None
+    if query_params.get("updated_since"):
+        updated_since = parse_since(query_params["updated_since"])
+
+    return format, compress, batch_size, updated_since
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class ExportView(View):
+    def get(self, request, collection):
+        """Stream every document of a collection as NDJSON or CSV"""
+        model = EXPORTS.get(collection)
+        if model is None:
+            return JsonResponse(
+                {
+                    "message": f"Unknown collection. Valid collections: {', '.join(EXPORTS)}",
+                    "data": None,
+                },
+                status=404,
+            )
+
+        try:
+            fields = parse_fields(request)
+            format, compress, batch_size, updated_since = parse_export_params(
+                request.GET
+            )
+        except (InvalidExport, InvalidFields) as exc:
+            return JsonResponse({"message": str(exc), "data": None}, status=400)
+
+        documents = model.iter_export(updated_since, batch_size, fields)
+        filename = f"{collection}.{format}"
+        if compress:
+            filename += ".gz"
+        response = StreamingHttpResponse(
+            export_chunks(documents, format, fields, compress),
+            content_type="application/gzip" if compress else CONTENT_TYPES[format],
+        )
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
@@ -1,70 +1,205 @@
 from bson import ObjectId
 from datetime import datetime
+from pymongo import IndexModel, UpdateOne
+from pymongo.errors import BulkWriteError
 from db_connection import db
+from inventory_db.conditional import bump_version
+from inventory_db.repository import Repository
+from inventory_db.serialization import to_api
 
 
-class Location:
+class Location(Repository):
     collection = db["locations"]
 
+    indexes = [IndexModel([("name", 1)])]
+
     @classmethod
     def create(cls, name, address, city, state, country, postal_code):
         """Create a new location"""
-        location_data = {
-            "name": name,
-            "address": address,
-            "city": city,
-            "state": state,
-            "country": country,
-            "postal_code": postal_code,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow(),
-        }
-        result = cls.collection.insert_one(location_data)
-        return str(result.inserted_id)
+        return cls.insert(
+            {
+                "name": name,
+                "address": address,
+                "city": city,
+                "state": state,
+                "country": country,
+                "postal_code": postal_code,
+            }
+        )
+
+
+class StockLevel:
+    """On-hand quantity of a product at a location.
+
+    One document per ``(product_id, location_id)``, moved by location-aware
+    inventory transactions when they are posted.
+    """
+
+    collection = db["stock_levels"]
+
+    # The unique key serves point reads and per-product ranges; the reverse
+    # order serves per-location ranges
+    indexes = [
+        IndexModel(
+            [("product_id", 1), ("location_id", 1)],
+            unique=True,
+            name="product_location",
+        ),
+        IndexModel([("location_id", 1), ("product_id", 1)], name="location_product"),
+    ]
+
+    # Query shapes issued by the stock views, checked by
+    # `manage.py ensure_indexes --explain`
+    explain_queries = [
+        (
+            "stock of a product at a location",
+            {"product_id": ObjectId(), "location_id": ObjectId()},
+            None,
+        ),
+        ("stock by location", {"location_id": ObjectId()}, [("product_id", 1)]),
+        ("stock by product", {"product_id": ObjectId()}, [("location_id", 1)]),
+    ]
+
+    # Posting IDs kept on a stock level to recognise a retried posting
+    POSTED_MARKER_LIMIT = 1000
+
+    PROJECTION = {"posted_transactions": 0}
 
     @classmethod
-    def get_all(cls):
-        """Get all locations with _id converted to string"""
-        locations = []
-        for location in cls.collection.find():
-            location["id"] = str(location["_id"])
-            del location["_id"]
-            locations.append(location)
-        return locations
+    def serialize(cls, level):
+        """Convert a stored stock level into its API representation"""
+        return to_api(level, hidden=cls.PROJECTION)
 
     @classmethod
-    def get_by_id(cls, location_id):
-        """Get single location by ID"""
+    def apply_stock_deltas(cls, postings):
+        """Apply posted transactions' signed quantities to per-location stock.
+
+        ``postings`` is a list of ``(product_id, location_id, posting_id,
+        delta)``. Missing stock levels are created first with an upsert on the
+        unique key alone, then each level gets one ``$inc`` that carries an
+        apply-marker like Product.apply_stock_deltas, so a repeated posting
+        changes nothing. Returns the number of stock levels updated.
+        """
+        groups = {}
+        for product_id, location_id, posting_id, delta in postings:
+            group = groups.setdefault(
+                (product_id, location_id), {"ids": [], "delta": 0}
+            )
+            group["ids"].append(posting_id)
+            group["delta"] += delta
+        if not groups:
+            return 0
+
+        now = datetime.utcnow()
         try:
-            location = cls.collection.find_one({"_id": ObjectId(location_id)})
-            if location:
-                location["id"] = str(location["_id"])
-                del location["_id"]
-                return location
-            return None
-        except:
-            return None
+            cls.collection.bulk_write(
+                [
+                    UpdateOne(
+                        {"product_id": product_id, "location_id": location_id},
+                        {
+                            "$setOnInsert": {
+                                "quantity": 0,
+                                "posted_transactions": [],
+                                "created_at": now,
+                                "updated_at": now,
+                            }
+                        },
+                        upsert=True,
+                    )
+                    for product_id, location_id in groups
+                ],
+                ordered=False,
+            )
+        except BulkWriteError as exc:
+            # A concurrent posting created the same level first
+            if any(error["code"] != 11000 for error in exc.details["writeErrors"]):
+                raise
+
+        result = cls.collection.bulk_write(
+            [
+                UpdateOne(
+                    {
+                        "product_id": product_id,
+                        "location_id": location_id,
+                        "posted_transactions": {"$nin": group["ids"]},
+                    },
+                    {
+                        "$inc": {"quantity": group["delta"]},
+                        "$push": {
+                            "posted_transactions": {
+                                "$each": group["ids"],
+                                "$slice": -cls.POSTED_MARKER_LIMIT,
+                            }
+                        },
+                        "$set": {"updated_at": now},
+                    },
+                )
+                for (product_id, location_id), group in groups.items()
+            ],
+            ordered=False,
+        )
+        bump_version(cls.collection.name)
+        return result.modified_count
 
     @classmethod
-    def update(cls, location_id, update_data):
-        """Update location information"""
-        update_data["updated_at"] = datetime.utcnow()
-        result = cls.collection.update_one(
-            {"_id": ObjectId(location_id)}, {"$set": update_data}
+    def get(cls, product_id, location_id):
+        """Get the stock level of a product at a location"""
+        level = cls.collection.find_one(
+            {"product_id": ObjectId(product_id), "location_id": ObjectId(location_id)},
+            cls.PROJECTION,
         )
-        return result.modified_count > 0
+        return cls.serialize(level) if level else None
 
     @classmethod
-    def delete(cls, location_id):
-        """Delete a location"""
-        result = cls.collection.delete_one({"_id": ObjectId(location_id)})
-        return result.deleted_count > 0
+    def iter_by_location(cls, location_id, batch_size=1000):
+        """Iterate over the stock levels at a location, ordered by product"""
+        cursor = cls.collection.find(
+            {"location_id": ObjectId(location_id)},
+            cls.PROJECTION,
+            batch_size=batch_size,
+        ).sort("product_id", 1)
+        for level in cursor:
+            yield cls.serialize(level)
 
     @classmethod
-    def bulk_create(cls, locations):
-        """Bulk create locations"""
-        for location in locations:
-            location["created_at"] = datetime.utcnow()
-            location["updated_at"] = datetime.utcnow()
-        result = cls.collection.insert_many(locations)
-        return [str(inserted_id) for inserted_id in result.inserted_ids]
+    def get_by_location(cls, location_id):
+        """Get the stock levels at a location"""
+        return list(cls.iter_by_location(location_id))
+
+    @classmethod
+    def get_by_product(cls, product_id):
+        """Get a product's stock levels across locations"""
+        cursor = cls.collection.find(
+            {"product_id": ObjectId(product_id)}, cls.PROJECTION
+        ).sort("location_id", 1)
+        return [cls.serialize(level) for level in cursor]
+
+    @classmethod
+    def totals(cls, product_id=None, location_id=None):
+        """Total on-hand quantity for a product, a location, or both"""
+        criteria = {}
+        if product_id:
+            criteria["product_id"] = ObjectId(product_id)
+        if location_id:
+            criteria["location_id"] = ObjectId(location_id)
+        result = list(
+            cls.collection.aggregate(
+                [
+                    {"$match": criteria},
+                    {
+                        "$group": {
+                            "_id": None,
+                            "total_quantity": {"$sum": "$quantity"},
+                            "stock_levels": {"$sum": 1},
+                        }
+                    },
+                    {"$project": {"_id": 0}},
+                ]
+            )
+        )
+        totals = result[0] if result else {"total_quantity": 0, "stock_levels": 0}
+        if product_id:
+            totals["product_id"] = product_id
+        if location_id:
+            totals["location_id"] = location_id
+        return totals
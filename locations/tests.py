@@ -1,3 +1,153 @@
-from django.test import TestCase
+from bson import ObjectId
+from inventory_db.testing import MongomockTestCase, response_json
+from products.tests import product_payload
+from transcations.models import InventoryTransaction
 
-# Create your tests here.
+
+def location_payload(**fields):
+    """Body of a valid location create request"""
+    return {
+        "name": "Main warehouse",
+        "address": "1 Dock Road",
+        "city": "Leeds",
+        "state": "West Yorkshire",
+        "country": "UK",
+        "postal_code": "LS1 1AA",
+        **fields,
+    }
+
+
+class LocationTestCase(MongomockTestCase):
+    def create(self, path, payload):
+        response = self.client.post(path, payload, content_type="application/json")
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()["data"]
+
+    def create_location(self, **fields):
+        return self.create("/locations/locations/", location_payload(**fields))
+
+    def create_product(self, **fields):
+        return self.create("/products/products/", product_payload(**fields))
+
+    def move(self, product, location, quantity, transaction_type="purchase"):
+        return self.create(
+            "/transactions/transactions/",
+            {
+                "product_id": product["id"],
+                "location_id": location["id"],
+                "quantity": quantity,
+                "transaction_type": transaction_type,
+            },
+        )
+
+    def get(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+
+class StockLevelTests(LocationTestCase):
+    def setUp(self):
+        super().setUp()
+        self.leeds = self.create_location()
+        self.york = self.create_location(name="York depot")
+        self.bolt = self.create_product(sku="BOLT")
+        self.nut = self.create_product(sku="NUT")
+        self.move(self.bolt, self.leeds, 10)
+        self.move(self.bolt, self.leeds, 3, "sale")
+        self.move(self.bolt, self.york, 4)
+        self.move(self.nut, self.leeds, 6)
+
+    def test_stock_of_a_product(self):
+        body = self.get(f"/locations/stock/products/{self.bolt['id']}/")
+        self.assertEqual(
+            {level["location_id"]: level["quantity"] for level in body["data"]},
+            {self.leeds["id"]: 7, self.york["id"]: 4},
+        )
+        self.assertEqual(body["total_quantity"], 11)
+
+        level = self.get(
+            f"/locations/stock/products/{self.bolt['id']}/"
+            f"?location_id={self.york['id']}"
+        )["data"]
+        self.assertEqual(level["quantity"], 4)
+
+    def test_stock_at_a_location(self):
+        path = f"/locations/locations/{self.leeds['id']}/stock/"
+        body = self.get(path)
+        self.assertEqual(
+            {level["product_id"]: level["quantity"] for level in body["data"]},
+            {self.bolt["id"]: 7, self.nut["id"]: 6},
+        )
+        streamed = response_json(self.client.get(f"{path}?stream=1"))
+        self.assertEqual(streamed["data"], body["data"])
+
+    def test_totals(self):
+        for query, expected in [
+            (f"product_id={self.bolt['id']}", (11, 2)),
+            (f"location_id={self.leeds['id']}", (13, 2)),
+            (f"product_id={self.nut['id']}&location_id={self.york['id']}", (0, 0)),
+        ]:
+            with self.subTest(query=query):
+                totals = self.get(f"/locations/stock/totals/?{query}")["data"]
+                self.assertEqual(
+                    (totals["total_quantity"], totals["stock_levels"]), expected
+                )
+
+    def test_reposting_moves_stock_once(self):
+        InventoryTransaction.post_locations(
+            list(
+                InventoryTransaction.collection.find({"location_id": {"$exists": True}})
+            )
+        )
+        totals = self.get(f"/locations/stock/totals/?product_id={self.bolt['id']}")
+        self.assertEqual(totals["data"]["total_quantity"], 11)
+
+    def test_rejected_requests(self):
+        missing = str(ObjectId())
+        for path, status in [
+            ("/locations/locations/nope/stock/", 400),
+            ("/locations/stock/products/nope/", 400),
+            (f"/locations/stock/products/{self.bolt['id']}/?location_id=nope", 400),
+            (
+                f"/locations/stock/products/{self.bolt['id']}/?location_id={missing}",
+                404,
+            ),
+            ("/locations/stock/totals/", 400),
+            ("/locations/stock/totals/?location_id=nope", 400),
+        ]:
+            with self.subTest(path=path):
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, status)
+                self.assertIsNone(response.json()["data"])
+
+    def test_invalid_location_on_a_transaction(self):
+        response = self.client.post(
+            "/transactions/transactions/",
+            {
+                "product_id": self.bolt["id"],
+                "location_id": "nope",
+                "quantity": 1,
+                "transaction_type": "purchase",
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class UpdateTests(LocationTestCase):
+    def test_update(self):
+        location = self.create_location()
+        path = f"/locations/locations/{location['id']}/"
+        response = self.client.put(
+            path, {"city": "York"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get(path)["data"]["city"], "York")
+
+        for data in ([{"city": "Hull"}], {"_id": str(ObjectId())}):
+            with self.subTest(data=data):
+                response = self.client.put(path, data, content_type="application/json")
+                self.assertEqual(response.status_code, 400)
+                self.assertIsNone(response.json()["data"])
+        self.assertEqual(self.get(path)["data"]["city"], "York")
@@ -1,5 +1,11 @@
 from django.urls import path
-from .views import LocationView, LocationDetailView
+from .views import (
+    LocationView,
+    LocationDetailView,
+    LocationStockView,
+    ProductStockView,
+    StockTotalsView,
+)
 
 urlpatterns = [
     path("locations/", LocationView.as_view(), name="location_view"),
@@ -8,4 +14,15 @@ urlpatterns = [
         LocationDetailView.as_view(),
         name="location_detail_view",
     ),
+    path(
+        "locations/<str:location_id>/stock/",
+        LocationStockView.as_view(),
+        name="location_stock_view",
+    ),
+    path("stock/totals/", StockTotalsView.as_view(), name="stock_totals_view"),
+    path(
+        "stock/products/<str:product_id>/",
+        ProductStockView.as_view(),
+        name="product_stock_view",
+    ),
 ]
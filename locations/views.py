@@ -1,10 +1,20 @@
 import json
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from django.http import JsonResponse
 from django.views import View
 from bson import ObjectId
-from .models import Location
+from inventory_db.bulk import outcome_counts
+from inventory_db.conditional import detail_condition, list_condition
+from inventory_db.parsing import BulkBody, InvalidBody, read_body, update_error
+from inventory_db.projection import InvalidFields, parse_fields
+from inventory_db.serialization import JsonResponse
+from inventory_db.streaming import (
+    bulk_create_response,
+    stream_batch_size,
+    stream_list_response,
+    wants_stream,
+)
+from .models import Location, StockLevel
 
 
 def validate_object_id(value):
@@ -13,24 +23,23 @@ def validate_object_id(value):
 
 
 @method_decorator(csrf_exempt, name="dispatch")
+@method_decorator(list_condition("locations"), name="get")
 class LocationView(View):
     def post(self, request):
         """Create a new location or bulk create locations"""
         try:
-            data = json.loads(request.body)
-        except json.JSONDecodeError:
+            data = read_body(request)
+        except InvalidBody:
             return JsonResponse(
                 {"message": "Invalid JSON format", "data": None}, status=400
             )
 
-        if isinstance(data, list):
-            location_ids = Location.bulk_create(data)
-            new_locations = [
-                Location.get_by_id(location_id) for location_id in location_ids
-            ]
-            return JsonResponse(
-                {"message": "Locations created successfully", "data": new_locations},
-                status=201,
+        if isinstance(data, BulkBody):
+            return bulk_create_response(
+                data,
+                Location.iter_bulk_create(data),
+                "Locations created successfully",
+                {"message": "Failed to create locations", "data": None},
             )
 
         required_fields = ["name", "address", "city", "state", "country", "postal_code"]
@@ -39,8 +48,7 @@ class LocationView(View):
                 {"message": "Missing required fields", "data": None}, status=400
             )
 
-        location_id = Location.create(**data)
-        new_location = Location.get_by_id(location_id)
+        new_location = Location.create(**data)
         return JsonResponse(
             {"message": "Location created successfully", "data": new_location},
             status=201,
@@ -48,7 +56,18 @@ class LocationView(View):
 
     def get(self, request):
         """Get all locations"""
-        locations = Location.get_all()
+        try:
+            fields = parse_fields(request)
+        except InvalidFields as exc:
+            return JsonResponse({"message": str(exc), "data": None}, status=400)
+
+        if wants_stream(request):
+            return stream_list_response(
+                Location.iter_all(batch_size=stream_batch_size(), fields=fields),
+                "Locations retrieved successfully",
+            )
+
+        locations = Location.get_all(fields=fields)
         return JsonResponse(
             {
                 "message": "Locations retrieved successfully",
@@ -59,17 +78,74 @@ class LocationView(View):
             safe=False,
         )
 
+    def patch(self, request):
+        """Bulk update locations from a list of {id, changes}"""
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse(
+                {"message": "Invalid JSON format", "data": None}, status=400
+            )
+        if not isinstance(data, list):
+            return JsonResponse(
+                {"message": "Expected a list of {id, changes} objects", "data": None},
+                status=400,
+            )
+
+        outcomes = Location.bulk_update(data)
+        summary = outcome_counts(outcomes)
+        return JsonResponse(
+            {
+                "message": f"Updated {summary.get('updated', 0)} of {len(outcomes)} locations",
+                "data": outcomes,
+                "count": len(outcomes),
+                "summary": summary,
+            },
+            status=200,
+        )
+
+    def delete(self, request):
+        """Bulk delete locations from a list of IDs"""
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse(
+                {"message": "Invalid JSON format", "data": None}, status=400
+            )
+        if not isinstance(data, list):
+            return JsonResponse(
+                {"message": "Expected a list of IDs", "data": None}, status=400
+            )
+
+        outcomes = Location.bulk_delete(data)
+        summary = outcome_counts(outcomes)
+        return JsonResponse(
+            {
+                "message": f"Deleted {summary.get('deleted', 0)} of {len(outcomes)} locations",
+                "data": outcomes,
+                "count": len(outcomes),
+                "summary": summary,
+            },
+            status=200,
+        )
+
 
 @method_decorator(csrf_exempt, name="dispatch")
+@method_decorator(detail_condition(Location, "location_id"), name="get")
 class LocationDetailView(View):
     def get(self, request, location_id):
         """Get a specific location by ID"""
+        try:
+            fields = parse_fields(request)
+        except InvalidFields as exc:
+            return JsonResponse({"message": str(exc), "data": None}, status=400)
+
         if not validate_object_id(location_id):
             return JsonResponse(
                 {"message": "Invalid location ID format", "data": None}, status=400
             )
 
-        location = Location.get_by_id(location_id)
+        location = Location.get_by_id(location_id, fields=fields)
         if not location:
             return JsonResponse(
                 {"message": "Location not found", "data": None}, status=404
@@ -93,9 +169,18 @@ class LocationDetailView(View):
                 {"message": "Invalid JSON format", "data": None}, status=400
             )
 
-        success = Location.update(location_id, data)
-        if success:
-            updated_location = Location.get_by_id(location_id)
+        reason = update_error(data)
+        if reason:
+            return JsonResponse({"message": reason, "data": None}, status=400)
+
+        try:
+            updated_location = Location.update(location_id, data)
+        except ValueError as exc:
+            return JsonResponse(
+                {"message": str(exc), "data": None},
+                status=getattr(exc, "status", 400),
+            )
+        if updated_location:
             return JsonResponse(
                 {"message": "Location updated successfully", "data": updated_location},
                 status=200,
@@ -120,3 +205,98 @@ class LocationDetailView(View):
             },
             status=200 if success else 500,
         )
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+@method_decorator(list_condition("stock_levels"), name="get")
+class LocationStockView(View):
+    def get(self, request, location_id):
+        """Get the on-hand stock of every product at a location"""
+        if not validate_object_id(location_id):
+            return JsonResponse(
+                {"message": "Invalid location ID format", "data": None}, status=400
+            )
+
+        if wants_stream(request):
+            return stream_list_response(
+                StockLevel.iter_by_location(
+                    location_id, batch_size=stream_batch_size()
+                ),
+                "Stock levels retrieved successfully",
+            )
+
+        levels = StockLevel.get_by_location(location_id)
+        return JsonResponse(
+            {
+                "message": "Stock levels retrieved successfully",
+                "data": levels,
+                "count": len(levels),
+            },
+            status=200,
+        )
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+@method_decorator(list_condition("stock_levels"), name="get")
+class ProductStockView(View):
+    def get(self, request, product_id):
+        """Get a product's on-hand stock across locations, or at the location
+        given by ``location_id``"""
+        location_id = request.GET.get("location_id")
+        if not validate_object_id(product_id):
+            return JsonResponse(
+                {"message": "Invalid product ID format", "data": None}, status=400
+            )
+        if location_id is not None and not validate_object_id(location_id):
+            return JsonResponse(
+                {"message": "Invalid location ID format", "data": None}, status=400
+            )
+
+        if location_id:
+            level = StockLevel.get(product_id, location_id)
+            if not level:
+                return JsonResponse(
+                    {"message": "Stock level not found", "data": None}, status=404
+                )
+            return JsonResponse(
+                {"message": "Stock level retrieved successfully", "data": level},
+                status=200,
+            )
+
+        levels = StockLevel.get_by_product(product_id)
+        return JsonResponse(
+            {
+                "message": "Stock levels retrieved successfully",
+                "data": levels,
+                "count": len(levels),
+                "total_quantity": sum(level["quantity"] for level in levels),
+            },
+            status=200,
+        )
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+@method_decorator(list_condition("stock_levels"), name="get")
+class StockTotalsView(View):
+    def get(self, request):
+        """Get the total on-hand quantity for a ``product_id``, a
+        ``location_id``, or both"""
+        product_id = request.GET.get("product_id")
+        location_id = request.GET.get("location_id")
+        if not product_id and not location_id:
+            return JsonResponse(
+                {"message": "product_id or location_id is required", "data": None},
+                status=400,
+            )
+        for name, value in (("product", product_id), ("location", location_id)):
+            if value and not validate_object_id(value):
+                return JsonResponse(
+                    {"message": f"Invalid {name} ID format", "data": None},
+                    status=400,
+                )
+
+        totals = StockLevel.totals(product_id=product_id, location_id=location_id)
+        return JsonResponse(
+            {"message": "Stock totals retrieved successfully", "data": totals},
+            status=200,
+        )
@@ -0,0 +1,314 @@
+from asgiref.sync import markcoroutinefunction
+from django.views.decorators.csrf import csrf_exempt
+from django.utils.decorators import method_decorator
+from django.views import View
+from inventory_db.conditional import detail_condition, list_condition
+from inventory_db.parsing import BulkBody
+from inventory_db.projection import InvalidFields, parse_fields
+from inventory_db.serialization import dumps_raw
+from inventory_db.streaming import (
+    abulk_create_response,
+    astream_list_response,
+    stream_batch_size,
+    wants_raw,
+    wants_stream,
+)
+from .models import Category, Product
+from .views import (
+    InvalidQuery,
+    created_response,
+    deleted_response,
+    list_response,
+    metrics_response,
+    outcomes_response,
+    parse_bulk_write_body,
+    parse_category_body,
+    parse_category_update,
+    parse_metrics_params,
+    parse_object_id,
+    parse_product_body,
+    parse_product_update,
+    parse_search_params,
+    parse_sort_params,
+    rejected_response,
+    retrieved_response,
+    sorted_response,
+    updated_response,
+    wants_fresh,
+)
+
+# Async versions of the product and category views, backed by the models'
+# async methods on the async Mongo client. Under ASGI they run on the event
+# loop instead of taking a thread per request; products/urls.py routes to them
+# when settings.ASYNC_VIEWS is set. Requests are parsed and responses built by
+# the same functions as the sync views, so only the I/O differs.
+
+
+def async_method_decorator(decorator, name):
+    """method_decorator() for an async handler. Django 5.1 wraps methods in a
+    sync function, which would make the view mix sync and async handlers."""
+
+    def wrap(cls):
+        cls = method_decorator(decorator, name=name)(cls)
+        markcoroutinefunction(getattr(cls, name))
+        return cls
+
+    return wrap
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+@async_method_decorator(list_condition("products", "categories"), name="get")
+class AsyncProductView(View):
+    async def post(self, request):
+        """Create a new product or bulk create products"""
+        # The ASGI handler has already spooled the body, so only its parsing
+        # is incremental here
+        try:
+            data = parse_product_body(request)
+        except InvalidQuery as exc:
+            return rejected_response(exc)
+
+        if isinstance(data, BulkBody):
+            return await abulk_create_response(
+                data,
+                Product.aiter_bulk_create(data),
+                "Created {count} products",
+                {"status": "error", "message": "Failed to create products"},
+                envelope={"status": "success"},
+            )
+
+        try:
+            product = await Product.acreate(**data)
+        except ValueError as exc:
+            return rejected_response(exc)
+        return created_response(product, "Product")
+
+    async def get(self, request):
+        """Get all products"""
+        try:
+            fields = parse_fields(request)
+        except InvalidFields as exc:
+            return rejected_response(exc)
+
+        if wants_raw(request):
+            # Stored documents as Extended JSON, without category details
+            return astream_list_response(
+                Product.aiter_raw(batch_size=stream_batch_size(), fields=fields),
+                "Found {count} products",
+                envelope={"status": "success"},
+                encode=dumps_raw,
+            )
+
+        if wants_stream(request):
+            return astream_list_response(
+                Product.aiter_all(batch_size=stream_batch_size(), fields=fields),
+                "Found {count} products",
+                envelope={"status": "success"},
+            )
+
+        products = await Product.aget_all(fields=fields)
+        return list_response(products, "Found {count} products")
+
+    async def patch(self, request):
+        """Bulk update products from a list of {id, changes}"""
+        try:
+            data = parse_bulk_write_body(
+                request, "Expected a list of {id, changes} objects"
+            )
+        except InvalidQuery as exc:
+            return rejected_response(exc)
+
+        outcomes = await Product.abulk_update(data)
+        return outcomes_response(outcomes, "updated", "products")
+
+    async def delete(self, request):
+        """Bulk delete products from a list of IDs"""
+        try:
+            data = parse_bulk_write_body(request, "Expected a list of IDs")
+        except InvalidQuery as exc:
+            return rejected_response(exc)
+
+        outcomes = await Product.abulk_delete(data)
+        return outcomes_response(outcomes, "deleted", "products")
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+@async_method_decorator(detail_condition(Product, "product_id"), name="get")
+class AsyncProductDetailView(View):
+    async def get(self, request, product_id):
+        """Get a specific product"""
+        try:
+            fields = parse_fields(request)
+            parse_object_id(product_id, "Product")
+        except ValueError as exc:
+            return rejected_response(exc)
+
+        product = await Product.aget_by_id(product_id, fields=fields)
+        return retrieved_response(product, "Product")
+
+    async def put(self, request, product_id):
+        """Update a product"""
+        try:
+            data = parse_product_update(request, product_id)
+            product = await Product.aupdate(product_id, data)
+        except ValueError as exc:
+            return rejected_response(exc)
+        return updated_response(product, "Product")
+
+    async def delete(self, request, product_id):
+        """Delete a product"""
+        try:
+            parse_object_id(product_id, "Product")
+        except InvalidQuery as exc:
+            return rejected_response(exc)
+
+        return deleted_response(await Product.adelete(product_id), "Product")
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+@async_method_decorator(list_condition("products", "categories"), name="get")
+class AsyncProductSearchView(View):
+    async def get(self, request):
+        """Search products with filters"""
+        try:
+            fields = parse_fields(request)
+            search = parse_search_params(request.GET)
+        except ValueError as exc:
+            return rejected_response(exc)
+
+        products = await Product.asearch(**search, fields=fields)
+        return list_response(products, "Found {count} matching products")
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+@async_method_decorator(list_condition("products", unless=wants_fresh), name="get")
+class AsyncProductMetricsView(View):
+    async def get(self, request):
+        """Get product metrics"""
+        try:
+            fresh, breakdown = parse_metrics_params(request)
+        except InvalidQuery as exc:
+            return rejected_response(exc)
+
+        metrics = await Product.acalculate_metrics(fresh=fresh, breakdown=breakdown)
+        return metrics_response(metrics)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+@async_method_decorator(list_condition("products", "categories"), name="get")
+class AsyncProductSortView(View):
+    async def get(self, request):
+        """Get sorted and paginated products"""
+        try:
+            fields = parse_fields(request)
+            sort_by, order, limit, skip, after = parse_sort_params(request.GET)
+        except ValueError as exc:
+            return rejected_response(exc)
+
+        if skip:
+            products = await Product.aget_sorted_products(
+                sort_by, order, limit, skip, fields
+            )
+            next_cursor = None
+        else:
+            products, next_cursor = await Product.aget_sorted_page(
+                sort_by, order, limit, after, fields
+            )
+        return sorted_response(products, next_cursor)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+@async_method_decorator(list_condition("categories"), name="get")
+class AsyncCategoryView(View):
+    async def post(self, request):
+        """Create a new category or bulk create categories"""
+        try:
+            data = parse_category_body(request)
+        except InvalidQuery as exc:
+            return rejected_response(exc)
+
+        if isinstance(data, BulkBody):
+            return await abulk_create_response(
+                data,
+                Category.aiter_bulk_create(data),
+                "Created {count} categories",
+                {"status": "error", "message": "Failed to create categories"},
+                envelope={"status": "success"},
+            )
+
+        category = await Category.acreate(
+            name=data["name"], description=data.get("description")
+        )
+        return created_response(category, "Category")
+
+    async def get(self, request):
+        """Get all categories"""
+        try:
+            fields = parse_fields(request)
+        except InvalidFields as exc:
+            return rejected_response(exc)
+
+        if wants_stream(request):
+            return astream_list_response(
+                Category.aiter_all(batch_size=stream_batch_size(), fields=fields),
+                "Found {count} categories",
+                envelope={"status": "success"},
+            )
+
+        categories = await Category.aget_all(fields=fields)
+        return list_response(categories, "Found {count} categories")
+
+    async def patch(self, request):
+        """Bulk update categories from a list of {id, changes}"""
+        try:
+            data = parse_bulk_write_body(
+                request, "Expected a list of {id, changes} objects"
+            )
+        except InvalidQuery as exc:
+            return rejected_response(exc)
+
+        outcomes = await Category.abulk_update(data)
+        return outcomes_response(outcomes, "updated", "categories")
+
+    async def delete(self, request):
+        """Bulk delete categories from a list of IDs"""
+        try:
+            data = parse_bulk_write_body(request, "Expected a list of IDs")
+        except InvalidQuery as exc:
+            return rejected_response(exc)
+
+        outcomes = await Category.abulk_delete(data)
+        return outcomes_response(outcomes, "deleted", "categories")
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+@async_method_decorator(detail_condition(Category, "category_id"), name="get")
+class AsyncCategoryDetailView(View):
+    async def get(self, request, category_id):
+        """Get a specific category"""
+        try:
+            fields = parse_fields(request)
+            parse_object_id(category_id, "Category")
+        except ValueError as exc:
+            return rejected_response(exc)
+
+        category = await Category.aget_by_id(category_id, fields=fields)
+        return retrieved_response(category, "Category")
+
+    async def put(self, request, category_id):
+        """Update a category"""
+        try:
+            data = parse_category_update(request, category_id)
+            category = await Category.aupdate(category_id, data)
+        except ValueError as exc:
+            return rejected_response(exc)
+        return updated_response(category, "Category")
+
+    async def delete(self, request, category_id):
+        """Delete a category"""
+        try:
+            parse_object_id(category_id, "Category")
+        except InvalidQuery as exc:
+            return rejected_response(exc)
+
+        return deleted_response(await Category.adelete(category_id), "Category")
@@ -1,195 +1,590 @@
+import math
+import re
+from asgiref.sync import sync_to_async
 from bson import ObjectId
 from datetime import datetime
-from db_connection import db
+from pymongo import (
+    TEXT,
+    DeleteMany,
+    IndexModel,
+    ReplaceOne,
+    ReturnDocument,
+    UpdateOne,
+)
+from db_connection import db, get_async_db
+from inventory_db.conditional import bump_version
+from inventory_db.importing import import_rows, write_batch
+from inventory_db.pagination import encode_cursor, keyset_filter
+from inventory_db.projection import build_projection
+from inventory_db.repository import Repository, refused_writes
 
 
-class Category:
+class Category(Repository):
     collection = db["categories"]
 
+    indexes = [IndexModel([("name", 1)])]
+
     @classmethod
     def create(cls, name, description=None):
         """Create a new category"""
-        category_data = {
-            "name": name,
-            "description": description,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow(),
-        }
-        result = cls.collection.insert_one(category_data)
-        return str(result.inserted_id)
+        return cls.insert({"name": name, "description": description})
 
     @classmethod
-    def get_by_id(cls, category_id):
-        """Get a single category by ID"""
-        try:
-            if not ObjectId.is_valid(category_id):
-                return None
-
-            category = cls.collection.find_one({"_id": ObjectId(category_id)})
-            if category:
-                category["id"] = str(category["_id"])
-                del category["_id"]
-                return category
-            return None
-        except Exception:
-            return None
+    async def acreate(cls, name, description=None):
+        """Async counterpart of create"""
+        return await cls.ainsert({"name": name, "description": description})
 
     @classmethod
-    def get_all(cls):
-        """Get all categories"""
-        categories = []
-        for category in cls.collection.find():
-            category["id"] = str(category["_id"])
-            del category["_id"]
-            categories.append(category)
-        return categories
+    def get_many(cls, category_ids):
+        """Get categories for several IDs at once, keyed by string ID, through
+        the read-through cache get_by_id uses"""
+        return cls.cache.get_many(
+            [str(category_id) for category_id in category_ids], cls.load_many
+        )
 
     @classmethod
-    def update(cls, category_id, update_data):
-        """Update a category"""
-        try:
-            if not ObjectId.is_valid(category_id):
-                return False
+    def load_many(cls, category_ids):
+        """Read categories by string ID, skipping invalid IDs"""
+        object_ids = [ObjectId(id) for id in category_ids if ObjectId.is_valid(id)]
+        return {
+            str(category["_id"]): cls.serialize(category)
+            for category in cls.collection.find({"_id": {"$in": object_ids}})
+        }
 
-            update_data["updated_at"] = datetime.utcnow()
-            result = cls.collection.update_one(
-                {"_id": ObjectId(category_id)}, {"$set": update_data}
-            )
-            return result.modified_count > 0
-        except Exception:
-            return False
+    @classmethod
+    async def aget_many(cls, category_ids):
+        """Async counterpart of get_many"""
+        return await cls.cache.aget_many(
+            [str(category_id) for category_id in category_ids], cls.aload_many
+        )
 
     @classmethod
-    def delete(cls, category_id):
-        """Delete a category"""
-        try:
-            if not ObjectId.is_valid(category_id):
-                return False
+    async def aload_many(cls, category_ids):
+        """Async counterpart of load_many"""
+        object_ids = [ObjectId(id) for id in category_ids if ObjectId.is_valid(id)]
+        return {
+            str(category["_id"]): cls.serialize(category)
+            async for category in cls.acollection().find({"_id": {"$in": object_ids}})
+        }
 
-            result = cls.collection.delete_one({"_id": ObjectId(category_id)})
-            return result.deleted_count > 0
-        except Exception:
-            return False
 
-    @classmethod
-    def bulk_create(cls, categories):
-        """Bulk create categories"""
-        try:
-            for category in categories:
-                category["created_at"] = datetime.utcnow()
-                category["updated_at"] = datetime.utcnow()
+class Product(Repository):
+    collection = db["products"]
 
-            result = cls.collection.insert_many(categories)
-            return [str(id) for id in result.inserted_ids]
-        except Exception:
-            return []
+    SORT_FIELDS = ["name", "price", "quantity", "created_at"]
 
+    # Each sortable field is paired with _id so keyset pages are a range scan
+    # over a single index in either direction; the price one also serves the
+    # price range filter of product search.
+    indexes = [
+        IndexModel([("sku", 1)], unique=True),
+        IndexModel([("category_id", 1)]),
+        IndexModel([("supplier_id", 1)]),
+        IndexModel([("name_lower", 1)]),
+        IndexModel(
+            [("name", TEXT), ("description", TEXT), ("sku", TEXT)],
+            weights={"name": 10, "sku": 10, "description": 1},
+            name="product_text",
+        ),
+    ] + [IndexModel([(field, 1), ("_id", 1)]) for field in SORT_FIELDS]
 
-class Product:
-    collection = db["products"]
+    # Query shapes issued by the product views, checked by
+    # `manage.py ensure_indexes --explain`
+    explain_queries = [
+        ("lookup by id", {"_id": ObjectId()}, None),
+        ("search by price", {"price": {"$gte": 0, "$lte": 1}}, None),
+        ("search by category", {"category_id": ObjectId()}, None),
+        ("search by supplier", {"supplier_id": ObjectId()}, None),
+        ("name prefix search", {"name_lower": {"$regex": "^a"}}, None),
+        ("sku prefix search", {"sku": {"$regex": "^A"}}, None),
+        ("text search", {"$text": {"$search": "a"}}, None),
+    ] + [(f"sort by {field}", {}, [(field, 1), ("_id", 1)]) for field in SORT_FIELDS]
+
+    # Derived fields maintained for indexing or posting that are not part of
+    # the API
+    PROJECTION = {"name_lower": 0, "posted_transactions": 0}
+
+    # Derived fields maintained by the model itself; posting relies on the
+    # markers to apply each transaction once, so no payload may set them
+    SYSTEM_FIELDS = ["name_lower", "posted_transactions"]
+
+    # Number of most recent posting IDs kept on a product so that a retried
+    # posting is recognised and skipped (see apply_stock_deltas)
+    POSTED_MARKER_LIMIT = 1000
 
     @classmethod
     def create(cls, name, description, price, quantity, category_id, supplier_id, sku):
         """Create a new product"""
-        product_data = {
+        return cls.insert(
+            cls.build(name, description, price, quantity, category_id, supplier_id, sku)
+        )
+
+    @classmethod
+    async def acreate(
+        cls, name, description, price, quantity, category_id, supplier_id, sku
+    ):
+        """Async counterpart of create"""
+        return await cls.ainsert(
+            cls.build(name, description, price, quantity, category_id, supplier_id, sku)
+        )
+
+    @staticmethod
+    def build(name, description, price, quantity, category_id, supplier_id, sku):
+        """Build the payload for a new product"""
+        return {
             "name": name,
             "description": description,
-            "price": float(price),
-            "quantity": int(quantity),
-            "category_id": ObjectId(category_id),
-            "supplier_id": ObjectId(supplier_id),
+            "price": price,
+            "quantity": quantity,
+            "category_id": category_id,
+            "supplier_id": supplier_id,
             "sku": sku,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow(),
         }
-        result = cls.collection.insert_one(product_data)
-        return str(result.inserted_id)
 
     @classmethod
-    def get_by_id(cls, product_id):
-        """Get a single product by ID"""
-        try:
-            if not ObjectId.is_valid(product_id):
-                return None
-
-            product = cls.collection.find_one({"_id": ObjectId(product_id)})
-            if product:
-                product["id"] = str(product["_id"])
-                product["category_id"] = str(product["category_id"])
-                product["supplier_id"] = str(product["supplier_id"])
-                del product["_id"]
-                return product
-            return None
-        except Exception:
-            return None
+    def prepare(cls, product):
+        """Convert a payload into the document stored for it. Raises
+        ValueError when it sets a field the model maintains."""
+        cls.refuse_system_fields(product)
+        product["category_id"] = ObjectId(product["category_id"])
+        product["supplier_id"] = ObjectId(product["supplier_id"])
+        product["name_lower"] = cls.lower_name(product["name"])
+        cls.coerce_numbers(product)
+        return super().prepare(product)
 
     @classmethod
-    def get_all(cls):
-        """Get all products with category details"""
-        products = []
-        for product in cls.collection.find():
-            product["id"] = str(product["_id"])
-            product["category_id"] = str(product["category_id"])
-            product["supplier_id"] = str(product.get("supplier_id", ""))
-            del product["_id"]
-
-            # Add category details
-            category = Category.get_by_id(product["category_id"])
+    def refuse_system_fields(cls, payload):
+        """Raise ValueError when ``payload`` sets a field the model maintains"""
+        if any(field in payload for field in cls.SYSTEM_FIELDS):
+            raise ValueError("Products cannot set " + ", ".join(cls.SYSTEM_FIELDS))
+
+    @staticmethod
+    def lower_name(name):
+        """The lowercased name stored for prefix search, raising ValueError
+        for a name that is not a non-empty string"""
+        if not isinstance(name, str) or not name.strip():
+            raise ValueError(f"Invalid name: {name!r}")
+        return name.lower()
+
+    @staticmethod
+    def coerce_numbers(product):
+        """Convert price and quantity to a float and an int in place, raising
+        ValueError for values that are not finite numbers, so that nothing
+        the metrics store cannot add up is written; None is left unset"""
+        for field, convert in (("price", float), ("quantity", int)):
+            if product.get(field) is None:
+                continue
+            value = product[field]
+            try:
+                if isinstance(value, bool):
+                    raise TypeError
+                value = convert(value)
+                if not math.isfinite(value):
+                    raise ValueError
+            except (TypeError, ValueError, OverflowError):
+                raise ValueError(f"Invalid {field}: {product[field]!r}")
+            product[field] = value
+
+    @classmethod
+    def created(cls, products):
+        """Also add the products to the metrics store and record their
+        opening stock in the ledger"""
+        super().created(products)
+        ProductMetrics.apply(added=products)
+        ledger = cls.ledger()
+        ledger.record_stock_changes(
+            [
+                (product["_id"], product.get("quantity") or 0, product["created_at"])
+                for product in products
+            ],
+            ledger.OPENING_BALANCE,
+        )
+
+    @staticmethod
+    def ledger():
+        """The transaction model, which records stock set on products outside
+        the ledger; imported here since it builds on this module"""
+        from transcations.models import InventoryTransaction
+
+        return InventoryTransaction
+
+    @classmethod
+    def record_stock_set(cls, previous, current):
+        """Record the quantity changes between the ``previous`` and
+        ``current`` states of updated products in the ledger"""
+        ledger = cls.ledger()
+        ledger.record_stock_changes(
+            [
+                (
+                    after["_id"],
+                    (after.get("quantity") or 0) - (before.get("quantity") or 0),
+                    after["updated_at"],
+                )
+                for before, after in zip(previous, current)
+                if "quantity" in after
+            ],
+            ledger.STOCK_SET,
+        )
+
+    @classmethod
+    def projection(cls, fields=None, required=()):
+        """Projection for reads returning only ``fields`` (all public fields
+        when None); ``category`` needs category_id to be looked up"""
+        if not fields:
+            return cls.PROJECTION
+        if "category" in fields:
+            required = (*required, "category_id")
+        return build_projection(fields, required)
+
+    @classmethod
+    def with_categories(cls, products, fields=None):
+        """Attach category details to products using a single batched lookup"""
+        if fields and "category" not in fields:
+            return products
+
+        categories = Category.get_many(
+            product["category_id"] for product in products if "category_id" in product
+        )
+        for product in products:
+            category = categories.get(str(product.get("category_id")))
             if category:
-                product["category"] = category
+                product["category"] = dict(category)
+        return products
 
-            products.append(product)
+    @classmethod
+    def iter_all(cls, batch_size=1000, fields=None):
+        """Iterate over all products with category details, one batch at a time"""
+        products = []
+        cursor = cls.collection.find({}, cls.projection(fields), batch_size=batch_size)
+        for product in cursor:
+            products.append(cls.serialize(product))
+
+            if len(products) >= batch_size:
+                yield from cls.with_categories(products, fields)
+                products = []
+        yield from cls.with_categories(products, fields)
+
+    @classmethod
+    def get_all(cls, fields=None):
+        """Get all products with category details"""
+        return list(cls.iter_all(fields=fields))
+
+    @classmethod
+    async def awith_categories(cls, products, fields=None):
+        """Async counterpart of with_categories"""
+        if fields and "category" not in fields:
+            return products
+
+        categories = await Category.aget_many(
+            product["category_id"] for product in products if "category_id" in product
+        )
+        for product in products:
+            category = categories.get(str(product.get("category_id")))
+            if category:
+                product["category"] = dict(category)
         return products
 
+    @classmethod
+    async def aiter_all(cls, batch_size=1000, fields=None):
+        """Async counterpart of iter_all"""
+        products = []
+        cursor = cls.acollection().find(
+            {}, cls.projection(fields), batch_size=batch_size
+        )
+        async for product in cursor:
+            products.append(cls.serialize(product))
+
+            if len(products) >= batch_size:
+                for product in await cls.awith_categories(products, fields):
+                    yield product
+                products = []
+        for product in await cls.awith_categories(products, fields):
+            yield product
+
     @classmethod
     def update(cls, product_id, update_data):
-        """Update a product"""
-        try:
-            if not ObjectId.is_valid(product_id):
-                return False
+        """Update a product, returning the updated product. Raises ValueError
+        for an invalid price or quantity, and WriteRefused for a duplicate
+        SKU."""
+        if not ObjectId.is_valid(product_id):
+            return None
+
+        update_data = cls.prepare_update(update_data)
+        with refused_writes():
+            previous = cls.collection.find_one_and_update(
+                {"_id": ObjectId(product_id)},
+                {"$set": update_data},
+                projection=cls.PROJECTION,
+                return_document=ReturnDocument.BEFORE,
+            )
+        cls.written(product_id)
+        if not previous:
+            return None
 
-            if "category_id" in update_data:
-                update_data["category_id"] = ObjectId(update_data["category_id"])
-            if "supplier_id" in update_data:
-                update_data["supplier_id"] = ObjectId(update_data["supplier_id"])
+        # The pre-image feeds the metrics store; the updated product is
+        # the pre-image with the $set applied.
+        product = {**previous, **update_data}
+        cls.updated(previous, product)
+        return cls.serialize(product)
 
-            update_data["updated_at"] = datetime.utcnow()
-            result = cls.collection.update_one(
-                {"_id": ObjectId(product_id)}, {"$set": update_data}
+    @classmethod
+    async def aupdate(cls, product_id, update_data):
+        """Async counterpart of update"""
+        if not ObjectId.is_valid(product_id):
+            return None
+
+        update_data = cls.prepare_update(update_data)
+        with refused_writes():
+            previous = await cls.acollection().find_one_and_update(
+                {"_id": ObjectId(product_id)},
+                {"$set": update_data},
+                projection=cls.PROJECTION,
+                return_document=ReturnDocument.BEFORE,
             )
-            return result.modified_count > 0
-        except Exception:
-            return False
+        await cls.awritten(product_id)
+        if not previous:
+            return None
+
+        product = {**previous, **update_data}
+        await sync_to_async(cls.updated, thread_sensitive=False)(previous, product)
+        return cls.serialize(product)
+
+    @classmethod
+    def updated(cls, previous, product):
+        """Move an updated product between the metrics scopes and record a
+        quantity change in the ledger"""
+        ProductMetrics.apply(added=[product], removed=[previous])
+        cls.record_stock_set([previous], [product])
+
+    @classmethod
+    def prepare_update(cls, update_data):
+        """Convert an update payload into the $set stored for it. Raises
+        ValueError when it sets a field the model maintains."""
+        cls.refuse_system_fields(update_data)
+        if "category_id" in update_data:
+            update_data["category_id"] = ObjectId(update_data["category_id"])
+        if "supplier_id" in update_data:
+            update_data["supplier_id"] = ObjectId(update_data["supplier_id"])
+        if "name" in update_data:
+            update_data["name_lower"] = cls.lower_name(update_data["name"])
+        cls.coerce_numbers(update_data)
+        return super().prepare_update(update_data)
 
     @classmethod
     def delete(cls, product_id):
         """Delete a product"""
-        try:
-            if not ObjectId.is_valid(product_id):
-                return False
+        if not ObjectId.is_valid(product_id):
+            return False
 
-            result = cls.collection.delete_one({"_id": ObjectId(product_id)})
-            return result.deleted_count > 0
-        except Exception:
+        product = cls.collection.find_one_and_delete({"_id": ObjectId(product_id)})
+        cls.written(product_id)
+        if not product:
             return False
+        ProductMetrics.apply(removed=[product])
+        return True
 
     @classmethod
-    def bulk_create(cls, products):
-        """Bulk create products"""
-        try:
-            for product in products:
-                product["category_id"] = ObjectId(product["category_id"])
-                product["supplier_id"] = ObjectId(product["supplier_id"])
-                product["created_at"] = datetime.utcnow()
-                product["updated_at"] = datetime.utcnow()
+    async def adelete(cls, product_id):
+        """Async counterpart of delete"""
+        if not ObjectId.is_valid(product_id):
+            return False
 
-            result = cls.collection.insert_many(products)
-            return [str(id) for id in result.inserted_ids]
-        except Exception:
-            return []
+        product = await cls.acollection().find_one_and_delete(
+            {"_id": ObjectId(product_id)}
+        )
+        await cls.awritten(product_id)
+        if not product:
+            return False
+        await sync_to_async(ProductMetrics.apply, thread_sensitive=False)(
+            removed=[product]
+        )
+        return True
+
+    @classmethod
+    def bulk_written(cls, previous, current):
+        """Also move the written products between the metrics scopes and
+        record quantity changes in the ledger"""
+        super().bulk_written(previous, current)
+        ProductMetrics.apply(added=current, removed=previous)
+        if current:
+            cls.record_stock_set(previous, current)
 
     @classmethod
-    def get_by_criteria(cls, criteria):
+    def apply_stock_deltas(cls, postings):
+        """Apply posted transactions' signed quantities to product stock.
+
+        ``postings`` is a list of ``(product_id, posting_id, delta)``. Each
+        product gets one update that ``$inc``s its quantity by the sum of its
+        deltas and records the posting IDs in ``posted_transactions``; the
+        update only matches while none of those IDs are recorded, so applying
+        the same postings again changes nothing. All products are updated in
+        a single unordered bulk_write. Returns the number of products updated.
+        """
+        groups = {}
+        for product_id, posting_id, delta in postings:
+            group = groups.setdefault(product_id, {"ids": [], "delta": 0})
+            group["ids"].append(posting_id)
+            group["delta"] += delta
+        if not groups:
+            return 0
+
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {"_id": product_id, "posted_transactions": {"$nin": group["ids"]}},
+                {
+                    "$inc": {"quantity": group["delta"]},
+                    "$push": {
+                        "posted_transactions": {
+                            "$each": group["ids"],
+                            "$slice": -cls.POSTED_MARKER_LIMIT,
+                        }
+                    },
+                    "$set": {"updated_at": now},
+                },
+            )
+            for product_id, group in groups.items()
+        ]
+        result = cls.collection.bulk_write(operations, ordered=False)
+        cls.written(*groups)
+
+        products = list(
+            cls.collection.find(
+                {"_id": {"$in": list(groups)}}, {"category_id": 1, "supplier_id": 1}
+            )
+        )
+        ProductMetrics.adjust_quantities(
+            products,
+            {product_id: group["delta"] for product_id, group in groups.items()},
+            applied=result.modified_count == len(operations),
+        )
+        return result.modified_count
+
+    # Fields read from each imported row; extra columns are ignored
+    IMPORT_FIELDS = [
+        "name",
+        "description",
+        "price",
+        "quantity",
+        "category_id",
+        "supplier_id",
+        "sku",
+    ]
+
+    @classmethod
+    def prepare_import(cls, row):
+        """Validate an imported row into the document stored for it"""
+        missing = [
+            field
+            for field in cls.IMPORT_FIELDS
+            if field != "description" and row.get(field) in (None, "")
+        ]
+        if missing:
+            raise ValueError(f"Missing required fields: {', '.join(missing)}")
+        product = cls.build(**{field: row.get(field) for field in cls.IMPORT_FIELDS})
+        product["sku"] = str(product["sku"])
+        return cls.prepare(product)
+
+    @classmethod
+    def import_batch(cls, products):
+        """Upsert a batch of prepared products by SKU.
+
+        New SKUs are inserted; existing products get the catalog fields
+        updated but keep their ``quantity``, which the transaction ledger
+        maintains after the initial stock, recorded for new products as
+        their opening balance.
+        """
+        existing = [
+            product["_id"]
+            for product in cls.collection.find(
+                {"sku": {"$in": [product["sku"] for product in products]}}, {"_id": 1}
+            )
+        ]
+        operations = []
+        for product in products:
+            on_insert = {
+                "created_at": product.pop("created_at"),
+                "quantity": product.pop("quantity"),
+            }
+            operations.append(
+                UpdateOne(
+                    {"sku": product["sku"]},
+                    {"$set": product, "$setOnInsert": on_insert},
+                    upsert=True,
+                )
+            )
+        result = write_batch(cls.collection, operations)
+        cls.cache.invalidate(*existing)
+
+        ledger = cls.ledger()
+        ledger.record_stock_changes(
+            [
+                (product["_id"], product.get("quantity") or 0, product["created_at"])
+                for product in cls.collection.find(
+                    {
+                        "sku": {"$in": [product["sku"] for product in products]},
+                        "_id": {"$nin": existing},
+                    },
+                    {"quantity": 1, "created_at": 1},
+                )
+            ],
+            ledger.OPENING_BALANCE,
+        )
+        return result
+
+    @classmethod
+    def import_rows(cls, records, **options):
+        """Upsert products streamed from read_rows (see
+        inventory_db.importing.import_rows for the options), then rebuild the
+        metrics store, which per-row bookkeeping would only slow down"""
+        report = import_rows(records, cls.prepare_import, cls.import_batch, **options)
+        if report["inserted"] or report["updated"]:
+            bump_version(cls.collection.name)
+            ProductMetrics.recompute()
+        return report
+
+    @classmethod
+    def backfill(cls):
+        """Populate derived search fields on products written before they existed"""
+        result = cls.collection.update_many(
+            {"name_lower": {"$exists": False}, "name": {"$type": "string"}},
+            [{"$set": {"name_lower": {"$toLower": "$name"}}}],
+        )
+        return result.modified_count
+
+    @classmethod
+    def search(cls, criteria, text=None, prefix=None, limit=0, fields=None):
+        """Search products through the text and prefix indexes.
+
+        ``text`` runs a full-text search over name, description and sku with
+        results ranked by relevance; ``prefix`` matches the start of the name
+        (case-insensitively) or of the SKU for type-ahead. Both combine with
+        the filters already in ``criteria``.
+        """
+        criteria, projection, sort = cls.search_query(criteria, text, prefix)
+        return cls.get_by_criteria(criteria, projection, sort, limit, fields)
+
+    @staticmethod
+    def search_query(criteria, text=None, prefix=None):
+        """Build the (criteria, projection, sort) of a text or prefix search"""
+        criteria = dict(criteria)
+        projection = None
+        sort = None
+        if text:
+            criteria["$text"] = {"$search": text}
+            projection = {"score": {"$meta": "textScore"}}
+            sort = [("score", {"$meta": "textScore"})]
+        if prefix:
+            criteria["$or"] = [
+                {"name_lower": {"$regex": "^" + re.escape(prefix.lower())}},
+                {"sku": {"$regex": "^" + re.escape(prefix)}},
+            ]
+        return criteria, projection, sort
+
+    @classmethod
+    def get_by_criteria(
+        cls, criteria, projection=None, sort=None, limit=0, fields=None
+    ):
         """Get products by search criteria"""
         try:
             # Convert string IDs to ObjectIds if present
@@ -198,50 +593,390 @@ class Product:
             if "supplier_id" in criteria:
                 criteria["supplier_id"] = ObjectId(criteria["supplier_id"])
 
+            projection = {**cls.projection(fields), **(projection or {})}
+            cursor = cls.collection.find(criteria, projection, limit=limit)
+            if sort:
+                cursor = cursor.sort(sort)
+
             products = []
-            for product in cls.collection.find(criteria):
-                product["id"] = str(product["_id"])
-                product["category_id"] = str(product["category_id"])
-                product["supplier_id"] = str(product["supplier_id"])
-                del product["_id"]
-                products.append(product)
-            return products
+            for product in cursor:
+                products.append(cls.serialize(product))
+            return cls.with_categories(products, fields)
         except Exception:
             return []
 
     @classmethod
-    def calculate_metrics(cls):
-        """Calculate product metrics"""
+    def calculate_metrics(cls, fresh=False, breakdown=None):
+        """Get product metrics from the incrementally maintained store.
+
+        ``fresh`` forces a full recompute that reconciles any drift;
+        ``breakdown`` ("category" or "supplier") returns per-scope metrics.
+        """
         try:
-            pipeline = [
-                {
-                    "$group": {
-                        "_id": None,
-                        "total_products": {"$sum": 1},
-                        "total_quantity": {"$sum": "$quantity"},
-                        "average_price": {"$avg": "$price"},
-                        "min_price": {"$min": "$price"},
-                        "max_price": {"$max": "$price"},
-                    }
-                }
-            ]
-            result = list(cls.collection.aggregate(pipeline))
-            return result[0] if result else {}
+            return ProductMetrics.get(fresh=fresh, breakdown=breakdown)
+        except Exception:
+            return [] if breakdown else {}
+
+    @classmethod
+    def get_sorted_page(
+        cls, sort_by="price", order=1, limit=10, after=None, fields=None
+    ):
+        """Get one page of sorted products using keyset pagination.
+
+        ``after`` is the decoded (sort value, _id) pair of the last product on
+        the previous page. Returns the products and the continuation token for
+        the next page, or None when there are no more products.
+        """
+        try:
+            criteria = keyset_filter(sort_by, *after, order) if after else {}
+            cursor = (
+                cls.collection.find(criteria, cls.projection(fields, (sort_by,)))
+                .sort([(sort_by, order), ("_id", order)])
+                .limit(limit + 1)
+            )
+            products, next_cursor = cls.page(
+                list(cursor), sort_by, order, limit, fields
+            )
+            return cls.with_categories(products, fields), next_cursor
         except Exception:
-            return {}
+            return [], None
 
     @classmethod
-    def get_sorted_products(cls, sort_by="price", order=1, limit=10, skip=0):
+    def page(cls, documents, sort_by, order, limit, fields=None):
+        """Serialize the first ``limit`` of ``limit + 1`` sorted documents,
+        returning them and the continuation token for the next page, or None
+        when there are no more. The sort field is read for the token and
+        dropped again unless ``fields`` asked for it."""
+        next_cursor = None
+        if len(documents) > limit:
+            documents = documents[:limit]
+            last = documents[-1]
+            next_cursor = encode_cursor(last.get(sort_by), last["_id"], sort_by, order)
+
+        products = [cls.serialize(document) for document in documents]
+        if fields and sort_by not in fields:
+            for product in products:
+                product.pop(sort_by, None)
+        return products, next_cursor
+
+    @classmethod
+    def get_sorted_products(
+        cls, sort_by="price", order=1, limit=10, skip=0, fields=None
+    ):
         """Get sorted products with pagination"""
         try:
             products = []
-            cursor = cls.collection.find().sort(sort_by, order).skip(skip).limit(limit)
+            cursor = (
+                cls.collection.find({}, cls.projection(fields))
+                .sort([(sort_by, order), ("_id", order)])
+                .skip(skip)
+                .limit(limit)
+            )
             for product in cursor:
-                product["id"] = str(product["_id"])
-                product["category_id"] = str(product["category_id"])
-                product["supplier_id"] = str(product["supplier_id"])
-                del product["_id"]
-                products.append(product)
-            return products
+                products.append(cls.serialize(product))
+            return cls.with_categories(products, fields)
+        except Exception:
+            return []
+
+    @classmethod
+    async def asearch(cls, criteria, text=None, prefix=None, limit=0, fields=None):
+        """Async counterpart of search"""
+        criteria, projection, sort = cls.search_query(criteria, text, prefix)
+        return await cls.aget_by_criteria(criteria, projection, sort, limit, fields)
+
+    @classmethod
+    async def aget_by_criteria(
+        cls, criteria, projection=None, sort=None, limit=0, fields=None
+    ):
+        """Async counterpart of get_by_criteria"""
+        try:
+            if "category_id" in criteria:
+                criteria["category_id"] = ObjectId(criteria["category_id"])
+            if "supplier_id" in criteria:
+                criteria["supplier_id"] = ObjectId(criteria["supplier_id"])
+
+            projection = {**cls.projection(fields), **(projection or {})}
+            cursor = cls.acollection().find(criteria, projection, limit=limit)
+            if sort:
+                cursor = cursor.sort(sort)
+
+            products = [cls.serialize(product) async for product in cursor]
+            return await cls.awith_categories(products, fields)
+        except Exception:
+            return []
+
+    @classmethod
+    async def acalculate_metrics(cls, fresh=False, breakdown=None):
+        """Async counterpart of calculate_metrics. The common case is a
+        single read of the overall scope; breakdowns and recomputes are rare
+        and run through ProductMetrics in a worker thread."""
+        try:
+            if not fresh and not breakdown:
+                overall = await get_async_db()[ProductMetrics.collection.name].find_one(
+                    {"_id": "all"}
+                )
+                if overall and overall.get("complete") and not overall.get("stale"):
+                    return ProductMetrics._format(overall)
+            return await sync_to_async(ProductMetrics.get, thread_sensitive=False)(
+                fresh, breakdown
+            )
+        except Exception:
+            return [] if breakdown else {}
+
+    @classmethod
+    async def aget_sorted_page(
+        cls, sort_by="price", order=1, limit=10, after=None, fields=None
+    ):
+        """Async counterpart of get_sorted_page"""
+        try:
+            criteria = keyset_filter(sort_by, *after, order) if after else {}
+            cursor = (
+                cls.acollection()
+                .find(criteria, cls.projection(fields, (sort_by,)))
+                .sort([(sort_by, order), ("_id", order)])
+                .limit(limit + 1)
+            )
+            products, next_cursor = cls.page(
+                await cursor.to_list(), sort_by, order, limit, fields
+            )
+            return await cls.awith_categories(products, fields), next_cursor
+        except Exception:
+            return [], None
+
+    @classmethod
+    async def aget_sorted_products(
+        cls, sort_by="price", order=1, limit=10, skip=0, fields=None
+    ):
+        """Async counterpart of get_sorted_products"""
+        try:
+            cursor = (
+                cls.acollection()
+                .find({}, cls.projection(fields))
+                .sort([(sort_by, order), ("_id", order)])
+                .skip(skip)
+                .limit(limit)
+            )
+            products = [cls.serialize(product) async for product in cursor]
+            return await cls.awith_categories(products, fields)
         except Exception:
             return []
+
+
+class ProductMetrics:
+    """Product metrics kept current as products are written.
+
+    One document per scope (``all``, ``category:<id>``, ``supplier:<id>``)
+    holds counts and sums that are adjusted with ``$inc``; min/max prices only
+    ever widen incrementally, so removing a product priced at a scope's bound
+    marks the scope ``stale`` and it is recomputed on its next read. The store
+    is trusted only once a full recompute has marked it ``complete``.
+    """
+
+    collection = db["product_metrics"]
+
+    GROUP = {
+        "total_products": {"$sum": 1},
+        "total_quantity": {"$sum": "$quantity"},
+        "price_sum": {"$sum": "$price"},
+        "min_price": {"$min": "$price"},
+        "max_price": {"$max": "$price"},
+    }
+
+    @staticmethod
+    def scopes(product):
+        """Metric scopes a product contributes to"""
+        scopes = ["all"]
+        if product.get("category_id"):
+            scopes.append(f"category:{product['category_id']}")
+        if product.get("supplier_id"):
+            scopes.append(f"supplier:{product['supplier_id']}")
+        return scopes
+
+    @classmethod
+    def apply(cls, added=(), removed=()):
+        """Fold created, deleted or changed (removed + added) products into
+        the store"""
+        operations = cls.operations(added, removed)
+        if operations:
+            cls.collection.bulk_write(operations)
+
+    @classmethod
+    def operations(cls, added=(), removed=()):
+        """Build the store updates for created and removed products"""
+        deltas = {}
+        for sign, products in ((1, added), (-1, removed)):
+            for product in products:
+                price = product.get("price") or 0
+                for scope in cls.scopes(product):
+                    delta = deltas.setdefault(
+                        scope,
+                        {
+                            "count": 0,
+                            "quantity": 0,
+                            "price_sum": 0,
+                            "added": [],
+                            "removed": [],
+                        },
+                    )
+                    delta["count"] += sign
+                    delta["quantity"] += sign * (product.get("quantity") or 0)
+                    delta["price_sum"] += sign * price
+                    delta["added" if sign > 0 else "removed"].append(price)
+
+        operations = []
+        for scope, delta in deltas.items():
+            if delta["removed"]:
+                operations.append(
+                    UpdateOne(
+                        {
+                            "_id": scope,
+                            "$or": [
+                                {"min_price": {"$gte": min(delta["removed"])}},
+                                {"max_price": {"$lte": max(delta["removed"])}},
+                            ],
+                        },
+                        {"$set": {"stale": True}},
+                    )
+                )
+            update = {
+                "$inc": {
+                    "total_products": delta["count"],
+                    "total_quantity": delta["quantity"],
+                    "price_sum": delta["price_sum"],
+                }
+            }
+            if delta["added"]:
+                update["$min"] = {"min_price": min(delta["added"])}
+                update["$max"] = {"max_price": max(delta["added"])}
+            operations.append(UpdateOne({"_id": scope}, update, upsert=True))
+        return operations
+
+    @classmethod
+    def adjust_quantities(cls, products, deltas, applied=True):
+        """Fold stock movements into total_quantity.
+
+        ``deltas`` maps product _id to its quantity change and ``products``
+        supplies their scopes. When some movements were skipped (already
+        posted, or the product is gone) the per-scope totals are unknown, so
+        the scopes are marked stale and recomputed on their next read.
+        """
+        totals = {"all": 0}
+        for product in products:
+            for scope in cls.scopes(product):
+                totals[scope] = totals.get(scope, 0) + deltas.get(product["_id"], 0)
+
+        if applied:
+            operations = [
+                UpdateOne({"_id": scope}, {"$inc": {"total_quantity": total}})
+                for scope, total in totals.items()
+                if total
+            ]
+        else:
+            operations = [
+                UpdateOne({"_id": scope}, {"$set": {"stale": True}}) for scope in totals
+            ]
+        if operations:
+            cls.collection.bulk_write(operations)
+
+    @staticmethod
+    def _stored(group):
+        """The document stored for a $group result. Price bounds are left out
+        when there are none, as $min and $max would never move off a stored
+        0 or null."""
+        return {
+            key: value
+            for key, value in group.items()
+            if value is not None or key not in ("min_price", "max_price")
+        }
+
+    @staticmethod
+    def _format(metrics):
+        """Shape a stored metrics document like the $group output"""
+        count = metrics.get("total_products", 0)
+        return {
+            "total_products": count,
+            "total_quantity": metrics.get("total_quantity", 0),
+            "average_price": metrics.get("price_sum", 0) / count if count else None,
+            "min_price": metrics.get("min_price") if count else None,
+            "max_price": metrics.get("max_price") if count else None,
+        }
+
+    @classmethod
+    def recompute(cls):
+        """Rebuild every scope from the products collection in a single pass,
+        replacing whatever drift the store had accumulated"""
+        pipeline = [
+            {
+                "$facet": {
+                    "all": [{"$group": {"_id": "all", **cls.GROUP}}],
+                    "category": [{"$group": {"_id": "$category_id", **cls.GROUP}}],
+                    "supplier": [{"$group": {"_id": "$supplier_id", **cls.GROUP}}],
+                }
+            }
+        ]
+        result = list(Product.collection.aggregate(pipeline))[0]
+
+        documents = {"all": {"_id": "all", "total_products": 0, "total_quantity": 0}}
+        for kind in ("all", "category", "supplier"):
+            for group in result[kind]:
+                if group["_id"] is None:
+                    continue
+                scope = "all" if kind == "all" else f"{kind}:{group['_id']}"
+                documents[scope] = {**cls._stored(group), "_id": scope}
+
+        operations = [
+            ReplaceOne(
+                {"_id": scope},
+                {**document, "stale": False, "complete": True},
+                upsert=True,
+            )
+            for scope, document in documents.items()
+        ]
+        operations.append(DeleteMany({"_id": {"$nin": list(documents)}}))
+        cls.collection.bulk_write(operations)
+
+    @classmethod
+    def _recompute_scope(cls, scope):
+        """Rebuild a single stale scope"""
+        kind, _, scope_id = scope.partition(":")
+        match = {f"{kind}_id": ObjectId(scope_id)} if scope_id else {}
+        result = list(
+            Product.collection.aggregate(
+                [{"$match": match}, {"$group": {"_id": scope, **cls.GROUP}}]
+            )
+        )
+        document = cls._stored(result[0]) if result else {"_id": scope}
+        cls.collection.replace_one(
+            {"_id": scope},
+            {**document, "stale": False, "complete": True},
+            upsert=True,
+        )
+        return document
+
+    @classmethod
+    def get(cls, fresh=False, breakdown=None):
+        """Get overall metrics, or per-category/per-supplier metrics when
+        ``breakdown`` is ``"category"`` or ``"supplier"``"""
+        overall = cls.collection.find_one({"_id": "all"})
+        if fresh or not overall or not overall.get("complete"):
+            cls.recompute()
+            overall = cls.collection.find_one({"_id": "all"})
+
+        if not breakdown:
+            if overall.get("stale"):
+                overall = cls._recompute_scope("all")
+            return cls._format(overall)
+
+        metrics = []
+        prefix = f"{breakdown}:"
+        for document in cls.collection.find({"_id": {"$regex": f"^{prefix}"}}):
+            if document.get("stale"):
+                document = cls._recompute_scope(document["_id"])
+            if document.get("total_products"):
+                metrics.append(
+                    {
+                        f"{breakdown}_id": document["_id"][len(prefix) :],
+                        **cls._format(document),
+                    }
+                )
+        return metrics
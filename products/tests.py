@@ -1,3 +1,836 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+from asgiref.sync import async_to_sync
+from bson import ObjectId
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.test import AsyncRequestFactory, RequestFactory, override_settings
+from inventory_db.cache import stats
+from inventory_db.indexes import ensure_indexes
+from inventory_db.testing import MongomockTestCase, aresponse_json, response_json
+from . import async_views, views
+from .models import Category, Product, ProductMetrics
 
-# Create your tests here.
+
+def product_payload(**fields):
+    """Body of a valid product create request"""
+    return {
+        "name": "Widget",
+        "description": "A widget",
+        "price": 9.5,
+        "quantity": 3,
+        "category_id": str(ObjectId()),
+        "supplier_id": str(ObjectId()),
+        "sku": "W-1",
+        **fields,
+    }
+
+
+class ProductTestCase(MongomockTestCase):
+    def create_product(self, **fields):
+        response = self.client.post(
+            "/products/products/",
+            product_payload(**fields),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()["data"]
+
+    def create_category(self, name="Tools"):
+        response = self.client.post(
+            "/products/categories/", {"name": name}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()["data"]
+
+
+class CategoryEnrichmentTests(ProductTestCase):
+    def test_products_carry_their_category(self):
+        category = self.create_category()
+        self.create_product(category_id=category["id"], sku="A")
+        self.create_product(sku="B")
+
+        products = self.client.get("/products/products/").json()["data"]
+        by_sku = {product["sku"]: product for product in products}
+        self.assertEqual(by_sku["A"]["category"]["name"], "Tools")
+        self.assertNotIn("category", by_sku["B"])
+
+    def test_batched_lookups_are_cached(self):
+        category = self.create_category()
+        Category.get_many([category["id"]])
+        hits = stats()["categories"]["hits"]
+        categories = Category.get_many([category["id"]])
+        self.assertEqual(categories[category["id"]]["name"], "Tools")
+        self.assertEqual(stats()["categories"]["hits"], hits + 1)
+
+    def test_category_update_reaches_product_reads(self):
+        category = self.create_category()
+        product = self.create_product(category_id=category["id"])
+        Category.get_many([category["id"]])
+
+        self.client.put(
+            f"/products/categories/{category['id']}/",
+            {"name": "Hardware"},
+            content_type="application/json",
+        )
+        read = Product.with_categories([Product.get_by_id(product["id"])])
+        self.assertEqual(read[0]["category"]["name"], "Hardware")
+
+    def test_invalid_ids_are_skipped(self):
+        category = self.create_category()
+        self.assertEqual(
+            list(Category.get_many(["not-an-id", category["id"]])), [category["id"]]
+        )
+
+
+class StreamingListTests(ProductTestCase):
+    @override_settings(MONGO_STREAM_BATCH_SIZE=2)
+    def test_stream_matches_list(self):
+        for sku in "ABC":
+            self.create_product(sku=sku)
+
+        listed = self.client.get("/products/products/").json()
+        response = self.client.get("/products/products/?stream=1")
+        self.assertTrue(response.streaming)
+        streamed = response_json(response)
+        self.assertEqual(streamed["data"], listed["data"])
+        self.assertEqual(streamed["count"], 3)
+        self.assertEqual(streamed["message"], "Found 3 products")
+        self.assertEqual(streamed["status"], "success")
+
+    def test_empty_stream(self):
+        streamed = response_json(self.client.get("/products/categories/?stream=1"))
+        self.assertEqual(streamed["data"], [])
+        self.assertEqual(streamed["count"], 0)
+
+    def test_invalid_fields(self):
+        response = self.client.get("/products/products/?stream=1&fields=a-b")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.streaming)
+
+
+class KeysetPaginationTests(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        # Ties on price must not repeat or drop products between pages
+        for sku, price in [("A", 5), ("B", 3), ("C", 5), ("D", 1), ("E", 5)]:
+            self.create_product(sku=sku, price=price)
+
+    def pages(self, query):
+        skus, cursor = [], ""
+        while True:
+            response = self.client.get(
+                f"/products/products/sort/?{query}&limit=2&cursor={cursor}"
+            )
+            self.assertEqual(response.status_code, 200, response.content)
+            body = response.json()
+            skus.extend(product["sku"] for product in body["data"])
+            cursor = body["next_cursor"]
+            if not cursor:
+                return skus
+
+    def test_pages_cover_every_product_once(self):
+        for order in (1, -1):
+            with self.subTest(order=order):
+                skus = self.pages(f"sort_by=price&order={order}")
+                expected = sorted(
+                    Product.get_all(), key=lambda p: (p["price"], p["id"])
+                )
+                if order == -1:
+                    expected.reverse()
+                self.assertEqual(skus, [product["sku"] for product in expected])
+
+    def test_skip_pages_have_no_cursor(self):
+        body = self.client.get("/products/products/sort/?sort_by=price&skip=4").json()
+        self.assertEqual(body["count"], 1)
+        self.assertIsNone(body["next_cursor"])
+
+    def test_cursor_with_skip(self):
+        cursor = self.client.get("/products/products/sort/?limit=2").json()[
+            "next_cursor"
+        ]
+        response = self.client.get(
+            f"/products/products/sort/?limit=2&skip=2&cursor={cursor}"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["message"], "Use either skip or cursor")
+
+    def test_cursor_from_another_sort(self):
+        cursor = self.client.get(
+            "/products/products/sort/?sort_by=price&limit=2"
+        ).json()["next_cursor"]
+        response = self.client.get(
+            f"/products/products/sort/?sort_by=name&limit=2&cursor={cursor}"
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class SearchTests(ProductTestCase):
+    def search(self, query):
+        response = self.client.get(f"/products/products/search/?{query}")
+        self.assertEqual(response.status_code, 200, response.content)
+        return sorted(product["sku"] for product in response.json()["data"])
+
+    def test_prefix_matches_name_or_sku(self):
+        self.create_product(name="Hammer", sku="T-1")
+        self.create_product(name="hacksaw", sku="T-2")
+        self.create_product(name="Wrench", sku="HX-3")
+        self.create_product(name="Saw", sku="T-4")
+        self.assertEqual(self.search("prefix=HA"), ["T-1", "T-2"])
+        self.assertEqual(self.search("prefix=HX"), ["HX-3"])
+
+    def test_prefix_follows_renames(self):
+        product = self.create_product(name="Hammer")
+        self.client.put(
+            f"/products/products/{product['id']}/",
+            {"name": "Mallet"},
+            content_type="application/json",
+        )
+        self.assertEqual(self.search("prefix=ham"), [])
+        self.assertEqual(self.search("prefix=mal"), ["W-1"])
+
+    def test_prefix_combines_with_filters(self):
+        category = self.create_category()
+        self.create_product(name="Hammer", sku="A", category_id=category["id"])
+        self.create_product(name="Hammer", sku="B", price=100)
+        self.create_product(name="Hammer", sku="C", quantity=0)
+        self.assertEqual(self.search(f"prefix=ham&category_id={category['id']}"), ["A"])
+        self.assertEqual(self.search("prefix=ham&min_price=50"), ["B"])
+        self.assertEqual(self.search("prefix=ham&min_quantity=1"), ["A", "B"])
+
+    def test_name_is_matched_literally(self):
+        self.create_product(name="Bolt (M8)", sku="A")
+        self.create_product(name="Bolt M8", sku="B")
+        self.assertEqual(self.search("name=(m8"), ["A"])
+        self.assertEqual(self.search("name=.*"), [])
+
+    @override_settings(PRODUCT_SEARCH_MAX_LIMIT=5)
+    def test_rejected_searches(self):
+        for query, message in [
+            ("q=saw&prefix=sa", "Use either q or prefix, not both"),
+            ("prefix=sa&limit=6", "Limit must be between 1 and 5"),
+            ("prefix=sa&limit=0", "Limit must be between 1 and 5"),
+            ("min_price=cheap", "Invalid price value"),
+        ]:
+            with self.subTest(query=query):
+                response = self.client.get(f"/products/products/search/?{query}")
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()["message"], message)
+
+    def test_names_must_be_strings(self):
+        response = self.client.post(
+            "/products/products/",
+            product_payload(name=123),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+        product = self.create_product()
+        for changes in ({"name": None}, {"name": ""}, {"name_lower": "x"}):
+            with self.subTest(changes=changes):
+                response = self.client.put(
+                    f"/products/products/{product['id']}/",
+                    changes,
+                    content_type="application/json",
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()["status"], "error")
+
+
+class CreateResponseTests(ProductTestCase):
+    def post(self, body):
+        return self.client.post(
+            "/products/products/", body, content_type="application/json"
+        )
+
+    def test_single_create_is_not_read_back(self):
+        with mock.patch.object(Product, "get_by_id", side_effect=AssertionError):
+            created = self.create_product(price="9.5", quantity="3")
+        self.assertEqual(created["price"], 9.5)
+        self.assertEqual(created["quantity"], 3)
+        fetched = self.client.get(f"/products/products/{created['id']}/").json()
+        self.assertEqual(created, fetched["data"])
+
+    @override_settings(MONGO_BULK_BATCH_SIZE=2)
+    def test_bulk_create_reports_rows_it_rejects(self):
+        ensure_indexes(Product)
+        rows = [
+            product_payload(sku="A"),
+            product_payload(sku="B", price="cheap"),
+            product_payload(sku="A"),
+            product_payload(sku="C", name_lower="c"),
+            product_payload(sku="D"),
+        ]
+        with mock.patch.object(Product, "get_by_id", side_effect=AssertionError):
+            response = self.post(rows)
+        self.assertEqual(response.status_code, 201)
+        body = response_json(response)
+        self.assertEqual([product["sku"] for product in body["data"]], ["A", "D"])
+        self.assertEqual([error["index"] for error in body["errors"]], [1, 2, 3])
+        self.assertEqual(body["message"], "Created 2 products")
+        listed = self.client.get("/products/products/").json()["data"]
+        stored = {product["id"]: product for product in listed}
+        for product in body["data"]:
+            self.assertEqual(product, stored[product["id"]])
+
+    def test_bulk_create_with_no_valid_rows(self):
+        response = self.post([product_payload(price="cheap"), 7])
+        self.assertEqual(response.status_code, 400)
+        body = response.json()
+        self.assertEqual(body["message"], "Failed to create products")
+        self.assertEqual([error["index"] for error in body["errors"]], [0, 1])
+        self.assertEqual(Product.get_all(), [])
+
+    def test_update_returns_the_written_document(self):
+        product = self.create_product()
+        with mock.patch.object(Product, "get_by_id", side_effect=AssertionError):
+            response = self.client.put(
+                f"/products/products/{product['id']}/",
+                {"price": 12},
+                content_type="application/json",
+            )
+        updated = response.json()["data"]
+        self.assertEqual(updated["price"], 12.0)
+        fetched = self.client.get(f"/products/products/{product['id']}/").json()
+        self.assertEqual(updated, fetched["data"])
+
+
+class MetricsStoreTests(ProductTestCase):
+    def metrics(self, query=""):
+        response = self.client.get(f"/products/products/metrics/?{query}")
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["data"]
+
+    def assertMatchesFresh(self, query=""):
+        stored = self.metrics(query)
+        fresh = self.metrics(f"{query}&fresh=1")
+        key = lambda scope: sorted(scope.items())
+        if isinstance(stored, list):
+            stored, fresh = sorted(stored, key=key), sorted(fresh, key=key)
+        self.assertEqual(stored, fresh)
+        return stored
+
+    def test_store_follows_writes(self):
+        category = self.create_category()
+        self.metrics()  # the first read builds the store
+        cheap = self.create_product(sku="A", price=2, category_id=category["id"])
+        dear = self.create_product(sku="B", price=20, quantity=5)
+        self.create_product(sku="C", price=8, category_id=category["id"])
+        overall = self.assertMatchesFresh()
+        self.assertEqual(overall["total_products"], 3)
+        self.assertEqual(overall["total_quantity"], 11)
+        self.assertEqual((overall["min_price"], overall["max_price"]), (2, 20))
+
+        self.client.put(
+            f"/products/products/{cheap['id']}/",
+            {"price": 4, "quantity": 10},
+            content_type="application/json",
+        )
+        self.client.delete(f"/products/products/{dear['id']}/")
+        overall = self.assertMatchesFresh()
+        self.assertEqual((overall["min_price"], overall["max_price"]), (4, 8))
+        self.assertEqual(overall["total_quantity"], 13)
+
+        by_category = self.assertMatchesFresh("breakdown=category")
+        self.assertEqual(
+            [(scope["category_id"], scope["total_products"]) for scope in by_category],
+            [(category["id"], 2)],
+        )
+        self.assertMatchesFresh("breakdown=supplier")
+
+    def test_store_follows_bulk_writes(self):
+        self.metrics()
+        created = self.client.post(
+            "/products/products/",
+            [
+                product_payload(sku=sku, price=price)
+                for sku, price in (("A", 1), ("B", 9))
+            ],
+            content_type="application/json",
+        ).json()["data"]
+        self.client.patch(
+            "/products/products/",
+            [{"id": created[0]["id"], "changes": {"price": 5}}],
+            content_type="application/json",
+        )
+        self.client.delete(
+            "/products/products/", [created[1]["id"]], content_type="application/json"
+        )
+        overall = self.assertMatchesFresh()
+        self.assertEqual(overall["total_products"], 1)
+        self.assertEqual(overall["average_price"], 5)
+
+    def test_fresh_reconciles_drift(self):
+        self.create_product()
+        self.metrics()
+        ProductMetrics.collection.update_one(
+            {"_id": "all"}, {"$inc": {"total_products": 7}}
+        )
+        self.assertEqual(self.metrics()["total_products"], 8)
+        self.assertEqual(self.metrics("fresh=1")["total_products"], 1)
+        self.assertEqual(self.metrics()["total_products"], 1)
+
+    def test_empty_store(self):
+        self.assertEqual(
+            self.metrics(),
+            {
+                "total_products": 0,
+                "total_quantity": 0,
+                "average_price": None,
+                "min_price": None,
+                "max_price": None,
+            },
+        )
+
+    def test_invalid_breakdown(self):
+        response = self.client.get("/products/products/metrics/?breakdown=sku")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json()["message"], "Breakdown must be category or supplier"
+        )
+
+
+class FieldsTests(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        self.category = self.create_category()
+        self.product = self.create_product(category_id=self.category["id"])
+
+    def get(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["data"]
+
+    def test_only_requested_fields_are_returned(self):
+        for fields, expected in [
+            ("name,price", {"id", "name", "price"}),
+            ("id", {"id"}),
+            ("name,category_id", {"id", "name", "category_id"}),
+            ("name_lower,posted_transactions", {"id"}),
+        ]:
+            with self.subTest(fields=fields):
+                (listed,) = self.get(f"/products/products/?fields={fields}")
+                self.assertEqual(set(listed), expected)
+                detail = self.get(
+                    f"/products/products/{self.product['id']}/?fields={fields}"
+                )
+                self.assertEqual(set(detail), expected)
+
+    def test_category_details_with_fields(self):
+        (listed,) = self.get("/products/products/?fields=name,category")
+        self.assertEqual(set(listed), {"id", "name", "category_id", "category"})
+        self.assertEqual(listed["category"]["name"], "Tools")
+
+    def test_sort_pages_without_the_sort_field(self):
+        self.create_product(sku="B", price=1)
+        first = self.client.get(
+            "/products/products/sort/?sort_by=price&limit=1&fields=sku"
+        ).json()
+        self.assertEqual(first["data"], [{"id": first["data"][0]["id"], "sku": "B"}])
+        second = self.get(
+            f"/products/products/sort/?sort_by=price&limit=1&fields=sku"
+            f"&cursor={first['next_cursor']}"
+        )
+        self.assertEqual([product["sku"] for product in second], ["W-1"])
+
+    def test_invalid_fields(self):
+        paths = [
+            "/products/products/",
+            f"/products/products/{self.product['id']}/",
+            "/products/products/search/",
+            "/products/products/sort/",
+            "/products/categories/",
+        ]
+        for path in paths:
+            for fields in ("", "a-b", "$where", "name,.price"):
+                with self.subTest(path=path, fields=fields):
+                    response = self.client.get(f"{path}?fields={fields}")
+                    self.assertEqual(response.status_code, 400)
+                    self.assertTrue(
+                        response.json()["message"].startswith("Invalid fields")
+                    )
+
+
+class AsyncViewTests(ProductTestCase):
+    """The async views answer every request as the sync views do"""
+
+    def setUp(self):
+        super().setUp()
+        self.category = self.create_category()
+        self.product = self.create_product(category_id=self.category["id"])
+
+    def call(self, view, method, path, data=None, **kwargs):
+        """Status and decoded body of ``view``'s response to a request"""
+        arguments = {} if data is None else {"content_type": "application/json"}
+        if asyncio.iscoroutinefunction(getattr(view, method)):
+            request = getattr(AsyncRequestFactory(), method)(path, data, **arguments)
+
+            async def respond():
+                response = await view.as_view()(request, **kwargs)
+                return response.status_code, await aresponse_json(response)
+
+            return async_to_sync(respond)()
+        request = getattr(RequestFactory(), method)(path, data, **arguments)
+        response = view.as_view()(request, **kwargs)
+        return response.status_code, response_json(response)
+
+    def assertSameResponse(self, sync_view, async_view, *args, **kwargs):
+        expected = self.call(sync_view, *args, **kwargs)
+        self.assertEqual(self.call(async_view, *args, **kwargs), expected)
+        return expected
+
+    def test_reads(self):
+        product_id, category_id = self.product["id"], self.category["id"]
+        missing = str(ObjectId())
+        cases = [
+            ("ProductView", "/?fields=name,category", {}),
+            ("ProductView", "/?stream=1", {}),
+            ("ProductView", "/?fields=a-b", {}),
+            ("ProductDetailView", "/", {"product_id": product_id}),
+            ("ProductDetailView", "/?fields=sku", {"product_id": product_id}),
+            ("ProductDetailView", "/", {"product_id": missing}),
+            ("ProductDetailView", "/", {"product_id": "nope"}),
+            ("ProductSearchView", "/?prefix=wid&min_price=1", {}),
+            ("ProductSearchView", "/?q=a&prefix=b", {}),
+            ("ProductMetricsView", "/", {}),
+            ("ProductMetricsView", "/?breakdown=category", {}),
+            ("ProductMetricsView", "/?breakdown=sku", {}),
+            ("ProductSortView", "/?sort_by=name&limit=1", {}),
+            ("ProductSortView", "/?sort_by=colour", {}),
+            ("CategoryView", "/?stream=1", {}),
+            ("CategoryDetailView", "/", {"category_id": category_id}),
+            ("CategoryDetailView", "/", {"category_id": missing}),
+        ]
+        for name, path, kwargs in cases:
+            with self.subTest(view=name, path=path):
+                self.assertSameResponse(
+                    getattr(views, name),
+                    getattr(async_views, f"Async{name}"),
+                    "get",
+                    path,
+                    **kwargs,
+                )
+
+    def test_writes(self):
+        ensure_indexes(Product)
+        status, body = self.call(
+            async_views.AsyncProductView, "post", "/", product_payload(sku="A")
+        )
+        self.assertEqual(status, 201)
+        created = body["data"]
+        self.assertEqual(Product.get_by_id(created["id"])["sku"], "A")
+
+        detail = async_views.AsyncProductDetailView
+        product_id = created["id"]
+        for changes, expected in [
+            ({"price": 2}, 200),
+            ({"sku": self.product["sku"]}, 409),
+            ({"_id": str(ObjectId())}, 400),
+            ({"name": None}, 400),
+            ([1], 400),
+        ]:
+            with self.subTest(changes=changes):
+                status, body = self.call(
+                    detail, "put", "/", changes, product_id=product_id
+                )
+                self.assertEqual(status, expected, body)
+        self.assertEqual(Product.get_by_id(product_id)["price"], 2)
+
+        status, body = self.call(
+            async_views.AsyncProductView,
+            "patch",
+            "/",
+            [{"id": product_id, "changes": {"quantity": 9}}, {"id": "nope"}],
+        )
+        self.assertEqual(body["summary"], {"updated": 1, "error": 1})
+
+        self.assertEqual(
+            self.call(detail, "delete", "/", product_id=product_id)[0], 200
+        )
+        self.assertEqual(
+            self.call(detail, "delete", "/", product_id=product_id)[0], 404
+        )
+        self.assertIsNone(Product.get_by_id(product_id))
+
+    def test_bulk_create_and_category_writes(self):
+        status, body = self.call(
+            async_views.AsyncProductView,
+            "post",
+            "/",
+            [product_payload(sku="B"), product_payload(price="cheap")],
+        )
+        self.assertEqual(status, 201)
+        self.assertEqual([error["index"] for error in body["errors"]], [1])
+
+        category_id = self.category["id"]
+        detail = async_views.AsyncCategoryDetailView
+        status, body = self.call(
+            detail, "put", "/", {"name": "Hardware"}, category_id=category_id
+        )
+        self.assertEqual(body["data"]["name"], "Hardware")
+        status, body = self.call(
+            async_views.AsyncProductView, "get", "/?fields=category"
+        )
+        self.assertEqual(
+            {
+                product["category"]["name"]
+                for product in body["data"]
+                if "category" in product
+            },
+            {"Hardware"},
+        )
+        status, _ = self.call(detail, "put", "/", {"name": ""}, category_id=category_id)
+        self.assertEqual(status, 400)
+
+
+class ConditionalGetTests(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        # Last-Modified needs a write to each collection a list is built from
+        category = self.create_category()
+        self.product = self.create_product(category_id=category["id"])
+        self.detail = f"/products/products/{self.product['id']}/"
+
+    def assertNotModified(self, path, **headers):
+        response = self.client.get(path, headers=headers)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_lists(self):
+        response = self.client.get("/products/products/")
+        etag = response.headers["ETag"]
+        self.assertNotModified("/products/products/", if_none_match=etag)
+        self.assertNotModified(
+            "/products/products/", if_modified_since=response.headers["Last-Modified"]
+        )
+        # The query string is part of the representation
+        response = self.client.get(
+            "/products/products/?fields=name", headers={"if_none_match": etag}
+        )
+        self.assertEqual(response.status_code, 200)
+
+        for write in (
+            lambda: self.create_product(sku="B"),
+            lambda: self.create_category("Parts"),
+        ):
+            write()
+            response = self.client.get(
+                "/products/products/", headers={"if_none_match": etag}
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response.headers["ETag"], etag)
+            etag = response.headers["ETag"]
+
+    def test_details(self):
+        etag = self.client.get(self.detail).headers["ETag"]
+        # The second read is served from the cache, with the same validator
+        self.assertNotModified(self.detail, if_none_match=etag)
+        self.assertNotModified(self.detail, if_none_match=etag)
+
+        self.client.put(self.detail, {"price": 1}, content_type="application/json")
+        response = self.client.get(self.detail, headers={"if_none_match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["price"], 1)
+
+    def test_missing_and_invalid_details(self):
+        for path, status in [
+            (f"/products/products/{ObjectId()}/", 404),
+            ("/products/products/nope/", 400),
+        ]:
+            with self.subTest(path=path):
+                response = self.client.get(path, headers={"if_none_match": "*"})
+                self.assertEqual(response.status_code, status)
+                self.assertNotIn("ETag", response.headers)
+
+    def test_fresh_metrics_bypass_the_check(self):
+        path = "/products/products/metrics/"
+        self.assertNotModified(path, if_none_match="*")
+        response = self.client.get(f"{path}?fresh=1", headers={"if_none_match": "*"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["total_products"], 1)
+
+    def test_async_views(self):
+        cases = [
+            (async_views.AsyncProductView, "/products/products/", {}),
+            (
+                async_views.AsyncProductDetailView,
+                self.detail,
+                {"product_id": self.product["id"]},
+            ),
+        ]
+        for view, path, kwargs in cases:
+            with self.subTest(view=view.__name__):
+                etag = self.client.get(path).headers["ETag"]
+                request = AsyncRequestFactory().get(
+                    path, headers={"if-none-match": etag}
+                )
+                response = async_to_sync(view.as_view())(request, **kwargs)
+                self.assertEqual(response.status_code, 304)
+
+
+class RawReadTests(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = self.create_product()
+
+    def test_stored_documents_as_extended_json(self):
+        body = response_json(self.client.get("/products/products/?raw=1"))
+        self.assertEqual(body["count"], 1)
+        document = body["data"][0]
+        self.assertEqual(document["_id"], {"$oid": self.product["id"]})
+        self.assertEqual(document["supplier_id"], {"$oid": self.product["supplier_id"]})
+        self.assertIn("$date", document["created_at"])
+        self.assertEqual(document["price"], 9.5)
+
+        body = response_json(self.client.get("/products/products/?raw=1&fields=sku"))
+        self.assertEqual(
+            body["data"], [{"_id": {"$oid": self.product["id"]}, "sku": "W-1"}]
+        )
+
+    def test_async_view(self):
+        request = AsyncRequestFactory().get("/products/products/?raw=1&fields=sku")
+
+        async def respond():
+            response = await async_views.AsyncProductView.as_view()(request)
+            return await aresponse_json(response)
+
+        expected = response_json(
+            self.client.get("/products/products/?raw=1&fields=sku")
+        )
+        self.assertEqual(async_to_sync(respond)(), expected)
+
+    def test_rejected_requests(self):
+        response = self.client.get("/products/products/?raw=1&fields=a-b")
+        self.assertEqual(response.status_code, 400)
+        with mock.patch("inventory_db.streaming.bsonjs", None):
+            with self.assertRaisesMessage(ImproperlyConfigured, "python-bsonjs"):
+                self.client.get("/products/products/?raw=1")
+
+
+def catalog_csv(*rows):
+    """CSV import body with a header line and one line per (sku, price)"""
+    category, supplier = ObjectId(), ObjectId()
+    lines = ["sku,name,price,quantity,category_id,supplier_id"]
+    lines += [
+        f"{sku},Part {sku},{price},4,{category},{supplier}" for sku, price in rows
+    ]
+    return "\n".join(lines) + "\n"
+
+
+class ImportTests(ProductTestCase):
+    path = "/products/products/import/"
+
+    def upload(self, body, query="", content_type="text/csv"):
+        return self.client.post(f"{self.path}?{query}", body, content_type=content_type)
+
+    def report(self, body, query=""):
+        response = self.upload(body, query)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["data"]
+
+    def prices(self):
+        return {
+            product["sku"]: product["price"]
+            for product in Product.collection.find({}, {"sku": 1, "price": 1})
+        }
+
+    def test_upserts_by_sku(self):
+        report = self.report(catalog_csv(("A", 1), ("B", 2)), "workers=2")
+        self.assertEqual(
+            (report["rows"], report["inserted"], report["updated"]), (2, 2, 0)
+        )
+        self.assertEqual(report["checkpoint"], 2)
+
+        self.client.put(
+            f"/products/products/{Product.collection.find_one({'sku': 'A'})['_id']}/",
+            {"quantity": 9},
+            content_type="application/json",
+        )
+        report = self.report(catalog_csv(("A", 5), ("C", 3)))
+        self.assertEqual((report["inserted"], report["updated"]), (1, 1))
+        self.assertEqual(self.prices(), {"A": 5, "B": 2, "C": 3})
+        # Re-imports keep the ledger-maintained quantity
+        self.assertEqual(Product.collection.find_one({"sku": "A"})["quantity"], 9)
+        metrics = self.client.get("/products/products/metrics/").json()["data"]
+        self.assertEqual(metrics["total_products"], 3)
+
+    def test_ndjson_and_rejected_rows(self):
+        good = {
+            "sku": "A",
+            "name": "Part",
+            "price": 1,
+            "quantity": 1,
+            "category_id": str(ObjectId()),
+            "supplier_id": str(ObjectId()),
+        }
+        body = "\n".join(
+            [json.dumps(good), "{nope", "[]", json.dumps({**good, "sku": ""})]
+        )
+        report = self.report(body, "format=ndjson")
+        self.assertEqual((report["rows"], report["inserted"]), (4, 1))
+        self.assertEqual([reject["row"] for reject in report["rejects"]], [2, 3, 4])
+        self.assertEqual(report["checkpoint"], 4)
+
+    def test_resume_skips_rows(self):
+        report = self.report(catalog_csv(("A", 1), ("B", 2), ("C", 3)), "skip=2")
+        self.assertEqual((report["rows"], report["checkpoint"]), (1, 3))
+        self.assertEqual(self.prices(), {"C": 3})
+
+    def test_rejected_uploads(self):
+        body = catalog_csv(("A", 1))
+        for query, content in [
+            ("format=xml", body),
+            ("workers=0", body),
+            ("workers=99", body),
+            ("skip=-1", body),
+            ("skip=a", body),
+            ("", body.encode() + b"\xff\xfe\n"),
+        ]:
+            with self.subTest(query=query, content=content[-8:]):
+                response = self.upload(content, query)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()["status"], "error")
+        self.assertEqual(self.prices(), {})
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "catalog.csv")
+            checkpoint = os.path.join(directory, "catalog.json")
+            with open(path, "w") as file:
+                file.write(catalog_csv(("A", 1), ("B", 2), ("C", 3)))
+
+            stdout = io.StringIO()
+            call_command(
+                "import_products",
+                path,
+                "--batch-size=1",
+                f"--checkpoint={checkpoint}",
+                stdout=stdout,
+            )
+            self.assertIn("3 inserted", stdout.getvalue())
+            with open(checkpoint) as file:
+                self.assertEqual(json.load(file)["row"], 3)
+
+            stdout = io.StringIO()
+            call_command(
+                "import_products",
+                path,
+                f"--checkpoint={checkpoint}",
+                "--resume",
+                stdout=stdout,
+            )
+            self.assertIn("Resuming after row 3", stdout.getvalue())
+            self.assertIn("0 inserted, 0 updated", stdout.getvalue())
+
+            for args, message in [
+                ([os.path.join(directory, "catalog.txt")], "pass --format"),
+                ([path, "--resume"], "--resume needs --checkpoint"),
+            ]:
+                with self.subTest(args=args):
+                    with self.assertRaisesMessage(CommandError, message):
+                        call_command("import_products", *args, stdout=io.StringIO())
+        self.assertEqual(self.prices(), {"A": 1, "B": 2, "C": 3})
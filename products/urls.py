@@ -1,23 +1,38 @@
+from django.conf import settings
 from django.urls import path
-from .views import (
-    ProductView,
-    ProductDetailView,
-    ProductSearchView,
-    ProductMetricsView,
-    ProductSortView,
-    CategoryView,
-    CategoryDetailView,
-)
+from . import async_views, views
+
+if settings.ASYNC_VIEWS:
+    ProductView = async_views.AsyncProductView
+    ProductDetailView = async_views.AsyncProductDetailView
+    ProductSearchView = async_views.AsyncProductSearchView
+    ProductMetricsView = async_views.AsyncProductMetricsView
+    ProductSortView = async_views.AsyncProductSortView
+    CategoryView = async_views.AsyncCategoryView
+    CategoryDetailView = async_views.AsyncCategoryDetailView
+else:
+    ProductView = views.ProductView
+    ProductDetailView = views.ProductDetailView
+    ProductSearchView = views.ProductSearchView
+    ProductMetricsView = views.ProductMetricsView
+    ProductSortView = views.ProductSortView
+    CategoryView = views.CategoryView
+    CategoryDetailView = views.CategoryDetailView
 
 urlpatterns = [
     # Product endpoints
     path("products/", ProductView.as_view(), name="product-list"),
-    path(
-        "products/<str:product_id>/", ProductDetailView.as_view(), name="product-detail"
-    ),
     path("products/search/", ProductSearchView.as_view(), name="product-search"),
     path("products/metrics/", ProductMetricsView.as_view(), name="product-metrics"),
     path("products/sort/", ProductSortView.as_view(), name="product-sort"),
+    path(
+        "products/import/",
+        views.ProductImportView.as_view(),
+        name="product-import",
+    ),
+    path(
+        "products/<str:product_id>/", ProductDetailView.as_view(), name="product-detail"
+    ),
     # Category endpoints
     path("categories/", CategoryView.as_view(), name="category-list"),
     path(
@@ -1,9 +1,29 @@
 import json
+import re
+from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from django.http import JsonResponse
 from django.views import View
 from bson import ObjectId
+from inventory_db.bulk import outcome_counts
+from inventory_db.conditional import detail_condition, list_condition
+from inventory_db.importing import (
+    FORMATS,
+    InvalidImport,
+    import_max_workers,
+    read_rows,
+)
+from inventory_db.pagination import InvalidCursor, decode_cursor
+from inventory_db.parsing import BulkBody, InvalidBody, read_body, update_error
+from inventory_db.projection import InvalidFields, parse_fields
+from inventory_db.serialization import JsonResponse, dumps_raw
+from inventory_db.streaming import (
+    bulk_create_response,
+    stream_batch_size,
+    stream_list_response,
+    wants_raw,
+    wants_stream,
+)
 from .models import Product, Category
 
 
@@ -12,38 +32,194 @@ def validate_object_id(value):
     return ObjectId.is_valid(value)
 
 
-@method_decorator(csrf_exempt, name="dispatch")
-class ProductView(View):
-    def post(self, request):
-        """Create a new product or bulk create products"""
+class InvalidQuery(ValueError):
+    """Raised when a query parameter or request body fails validation"""
+
+
+def parse_search_params(query_params):
+    """Build Product.search arguments from search query parameters"""
+    criteria = {}
+
+    # Price range filter
+    if "min_price" in query_params or "max_price" in query_params:
         try:
-            data = json.loads(request.body)
-        except json.JSONDecodeError:
-            return JsonResponse(
-                {"status": "error", "message": "Invalid JSON format"}, status=400
-            )
+            price_filter = {}
+            if "min_price" in query_params:
+                price_filter["$gte"] = float(query_params["min_price"])
+            if "max_price" in query_params:
+                price_filter["$lte"] = float(query_params["max_price"])
+            criteria["price"] = price_filter
+        except ValueError:
+            raise InvalidQuery("Invalid price value")
+
+    # Name search (partial match). The input is matched literally; use
+    # q or prefix for index-backed searches.
+    if "name" in query_params:
+        criteria["name"] = {
+            "$regex": re.escape(query_params["name"]),
+            "$options": "i",
+        }
+
+    # Full-text search and type-ahead prefix search
+    text = query_params.get("q", "").strip()
+    prefix = query_params.get("prefix", "").strip()
+    if text and prefix:
+        raise InvalidQuery("Use either q or prefix, not both")
+
+    # Category filter
+    if "category_id" in query_params:
+        if not validate_object_id(query_params["category_id"]):
+            raise InvalidQuery("Invalid category ID")
+        criteria["category_id"] = ObjectId(query_params["category_id"])
+
+    # Quantity filter
+    if "min_quantity" in query_params:
+        try:
+            criteria["quantity"] = {"$gte": int(query_params["min_quantity"])}
+        except ValueError:
+            raise InvalidQuery("Invalid quantity value")
 
-        # Handle bulk creation
-        if isinstance(data, list):
-            product_ids = Product.bulk_create(data)
-            if not product_ids:
-                return JsonResponse(
-                    {"status": "error", "message": "Failed to create products"},
-                    status=400,
-                )
-
-            products = [Product.get_by_id(pid) for pid in product_ids]
-            return JsonResponse(
-                {
-                    "status": "success",
-                    "message": f"Created {len(products)} products",
-                    "data": products,
-                },
-                status=201,
-            )
+    # Text and prefix searches rank or scan every match, so they return a
+    # bounded page; filter-only searches keep limit=0 for all matches
+    if text or prefix:
+        maximum = getattr(settings, "PRODUCT_SEARCH_MAX_LIMIT", 100)
+        default = getattr(settings, "PRODUCT_SEARCH_DEFAULT_LIMIT", 20)
+        try:
+            limit = int(query_params.get("limit", default))
+            if not 1 <= limit <= maximum:
+                raise ValueError
+        except ValueError:
+            raise InvalidQuery(f"Limit must be between 1 and {maximum}")
+    else:
+        try:
+            limit = int(query_params.get("limit", 0))
+            if limit < 0:
+                raise ValueError
+        except ValueError:
+            raise InvalidQuery("Invalid limit value")
+
+    return {"criteria": criteria, "text": text, "prefix": prefix, "limit": limit}
 
-        # Handle single product creation
-        required_fields = [
+
+def parse_sort_params(query_params):
+    """Validate sort parameters, returning (sort_by, order, limit, skip,
+    after) where after is the decoded keyset cursor, if any"""
+    # Validate sort field
+    valid_sort_fields = Product.SORT_FIELDS
+    sort_by = query_params.get("sort_by", "price")
+    if sort_by not in valid_sort_fields:
+        raise InvalidQuery(
+            f"Invalid sort field. Valid fields: {', '.join(valid_sort_fields)}"
+        )
+
+    # Validate sort order
+    try:
+        order = int(query_params.get("order", 1))
+        if order not in (1, -1):
+            raise ValueError
+    except ValueError:
+        raise InvalidQuery("Order must be 1 (asc) or -1 (desc)")
+
+    # Validate pagination
+    try:
+        limit = int(query_params.get("limit", 10))
+        skip = int(query_params.get("skip", 0))
+        if limit < 1 or skip < 0:
+            raise ValueError
+    except ValueError:
+        raise InvalidQuery("Invalid pagination parameters")
+
+    after = None
+    if query_params.get("cursor"):
+        if skip:
+            raise InvalidQuery("Use either skip or cursor")
+        try:
+            after = decode_cursor(query_params["cursor"], sort_by, order)
+        except InvalidCursor as exc:
+            raise InvalidQuery(str(exc))
+
+    return sort_by, order, limit, skip, after
+
+
+def parse_import_params(request):
+    """Validate import parameters, returning (format, workers, skip). The
+    format defaults from the request's content type."""
+    format = request.GET.get("format")
+    if not format:
+        format = "csv" if request.content_type == "text/csv" else "ndjson"
+    if format not in FORMATS:
+        raise InvalidQuery("Format must be csv or ndjson")
+
+    try:
+        workers = int(request.GET.get("workers", 1))
+        skip = int(request.GET.get("skip", 0))
+        if not 1 <= workers <= import_max_workers() or skip < 0:
+            raise ValueError
+    except ValueError:
+        raise InvalidQuery(
+            f"Workers must be between 1 and {import_max_workers()} "
+            "and skip must not be negative"
+        )
+    return format, workers, skip
+
+
+def wants_fresh(request):
+    """Whether a metrics request asks for a recomputation (``?fresh=1``),
+    which a conditional GET must not answer with 304"""
+    return request.GET.get("fresh", "").lower() in ("1", "true", "yes")
+
+
+def parse_metrics_params(request):
+    """Validate metrics parameters, returning (fresh, breakdown)"""
+    fresh = wants_fresh(request)
+    query_params = request.GET
+    breakdown = query_params.get("breakdown")
+    if breakdown not in (None, "category", "supplier"):
+        raise InvalidQuery("Breakdown must be category or supplier")
+    return fresh, breakdown
+
+
+# Request parsing and response building shared by these views and their
+# async counterparts in async_views.py, which differ only in awaiting the
+# model calls between the two. The parsers raise InvalidQuery for a request
+# to reject.
+
+
+def parse_json(request):
+    """Decode a JSON request body"""
+    try:
+        return json.loads(request.body)
+    except json.JSONDecodeError:
+        raise InvalidQuery("Invalid JSON format")
+
+
+def parse_object_id(object_id, name):
+    """Check the ID of the ``name`` document a request is for"""
+    if not validate_object_id(object_id):
+        raise InvalidQuery(f"Invalid {name.lower()} ID format")
+
+
+def parse_create_body(request, required_fields):
+    """Read a create request's body: a BulkBody to bulk create from, or the
+    payload of a single document, which must have ``required_fields``"""
+    try:
+        data = read_body(request)
+    except InvalidBody:
+        raise InvalidQuery("Invalid JSON format")
+    if isinstance(data, BulkBody):
+        return data
+
+    missing_fields = [field for field in required_fields if field not in data]
+    if missing_fields:
+        raise InvalidQuery(f"Missing required fields: {', '.join(missing_fields)}")
+    return data
+
+
+def parse_product_body(request):
+    """Read a product create request's body, as for parse_create_body"""
+    data = parse_create_body(
+        request,
+        [
             "name",
             "description",
             "price",
@@ -51,401 +227,395 @@ class ProductView(View):
             "category_id",
             "supplier_id",
             "sku",
-        ]
-        missing_fields = [field for field in required_fields if field not in data]
-        if missing_fields:
-            return JsonResponse(
-                {
-                    "status": "error",
-                    "message": f"Missing required fields: {', '.join(missing_fields)}",
-                },
-                status=400,
-            )
+        ],
+    )
+    if not isinstance(data, BulkBody) and not (
+        validate_object_id(data["category_id"])
+        and validate_object_id(data["supplier_id"])
+    ):
+        raise InvalidQuery("Invalid category or supplier ID")
+    return data
 
-        if not validate_object_id(data["category_id"]) or not validate_object_id(
-            data["supplier_id"]
-        ):
-            return JsonResponse(
-                {"status": "error", "message": "Invalid category or supplier ID"},
-                status=400,
-            )
 
-        product_id = Product.create(**data)
-        product = Product.get_by_id(product_id)
-        return JsonResponse(
-            {
-                "status": "success",
-                "message": "Product created successfully",
-                "data": product,
-            },
-            status=201,
-        )
+def parse_category_body(request):
+    """Read a category create request's body, as for parse_create_body"""
+    return parse_create_body(request, ["name"])
 
-    def get(self, request):
-        """Get all products"""
-        products = Product.get_all()
-        return JsonResponse(
-            {
-                "status": "success",
-                "message": f"Found {len(products)} products",
-                "data": products,
-                "count": len(products),
-            },
-            status=200,
-        )
 
+def parse_update_body(request, object_id, name):
+    """Check the ID and read the body of a request updating the ``name``
+    document with ``object_id``"""
+    parse_object_id(object_id, name)
+    data = parse_json(request)
+    reason = update_error(data)
+    if reason:
+        raise InvalidQuery(reason)
+    return data
 
-@method_decorator(csrf_exempt, name="dispatch")
-class ProductDetailView(View):
-    def get(self, request, product_id):
-        """Get a specific product"""
-        if not validate_object_id(product_id):
-            return JsonResponse(
-                {"status": "error", "message": "Invalid product ID format"}, status=400
-            )
 
-        product = Product.get_by_id(product_id)
-        if not product:
-            return JsonResponse(
-                {"status": "error", "message": "Product not found"}, status=404
-            )
+def parse_product_update(request, product_id):
+    """Read a product update request, as for parse_update_body"""
+    data = parse_update_body(request, product_id, "Product")
+    if "category_id" in data and not validate_object_id(data["category_id"]):
+        raise InvalidQuery("Invalid category ID")
+    if "supplier_id" in data and not validate_object_id(data["supplier_id"]):
+        raise InvalidQuery("Invalid supplier ID")
+    return data
 
-        return JsonResponse(
-            {
-                "status": "success",
-                "message": "Product retrieved successfully",
-                "data": product,
-            },
-            status=200,
-        )
 
-    def put(self, request, product_id):
-        """Update a product"""
-        if not validate_object_id(product_id):
-            return JsonResponse(
-                {"status": "error", "message": "Invalid product ID format"}, status=400
-            )
+def parse_category_update(request, category_id):
+    """Read a category update request, as for parse_update_body"""
+    data = parse_update_body(request, category_id, "Category")
+    if "name" in data and not data["name"]:
+        raise InvalidQuery("Category name cannot be empty")
+    return data
+
+
+def parse_bulk_write_body(request, expected):
+    """Read the list body of a bulk update or delete request; ``expected``
+    describes it when it is not a list"""
+    data = parse_json(request)
+    if not isinstance(data, list):
+        raise InvalidQuery(expected)
+    return data
+
+
+def error_response(message, status=400):
+    return JsonResponse({"status": "error", "message": message}, status=status)
+
+
+def rejected_response(exc):
+    """Error response for a rejected request; an error refused by the
+    database carries its own status"""
+    return error_response(str(exc), getattr(exc, "status", 400))
+
 
+def success_response(message, status=200, **fields):
+    return JsonResponse(
+        {"status": "success", "message": message, **fields}, status=status
+    )
+
+
+def list_response(documents, message, **fields):
+    """Response listing ``documents``; ``message`` is formatted with their
+    count"""
+    count = len(documents)
+    return success_response(
+        message.format(count=count), data=documents, count=count, **fields
+    )
+
+
+def outcomes_response(outcomes, success, plural):
+    """Response for a bulk update or delete of ``plural`` whose successful
+    outcomes have status ``success``"""
+    summary = outcome_counts(outcomes)
+    return success_response(
+        f"{success.capitalize()} {summary.get(success, 0)} of {len(outcomes)} {plural}",
+        data=outcomes,
+        count=len(outcomes),
+        summary=summary,
+    )
+
+
+def created_response(document, name):
+    return success_response(f"{name} created successfully", status=201, data=document)
+
+
+def retrieved_response(document, name):
+    if not document:
+        return error_response(f"{name} not found", status=404)
+    return success_response(f"{name} retrieved successfully", data=document)
+
+
+def updated_response(document, name):
+    if not document:
+        return error_response(f"{name} update failed")
+    return success_response(f"{name} updated successfully", data=document)
+
+
+def deleted_response(deleted, name):
+    if not deleted:
+        return error_response(f"{name} not found or already deleted", status=404)
+    return success_response(f"{name} deleted successfully")
+
+
+def sorted_response(products, next_cursor):
+    return list_response(
+        products, "Retrieved {count} products", next_cursor=next_cursor
+    )
+
+
+def metrics_response(metrics):
+    return success_response("Product metrics calculated", data=metrics)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+@method_decorator(list_condition("products", "categories"), name="get")
+class ProductView(View):
+    def post(self, request):
+        """Create a new product or bulk create products"""
         try:
-            data = json.loads(request.body)
-        except json.JSONDecodeError:
-            return JsonResponse(
-                {"status": "error", "message": "Invalid JSON format"}, status=400
+            data = parse_product_body(request)
+        except InvalidQuery as exc:
+            return rejected_response(exc)
+
+        if isinstance(data, BulkBody):
+            return bulk_create_response(
+                data,
+                Product.iter_bulk_create(data),
+                "Created {count} products",
+                {"status": "error", "message": "Failed to create products"},
+                envelope={"status": "success"},
             )
 
-        # Validate category_id if present
-        if "category_id" in data and not validate_object_id(data["category_id"]):
-            return JsonResponse(
-                {"status": "error", "message": "Invalid category ID"}, status=400
+        try:
+            product = Product.create(**data)
+        except ValueError as exc:
+            return rejected_response(exc)
+        return created_response(product, "Product")
+
+    def get(self, request):
+        """Get all products"""
+        try:
+            fields = parse_fields(request)
+        except InvalidFields as exc:
+            return rejected_response(exc)
+
+        if wants_raw(request):
+            # Stored documents as Extended JSON, without category details
+            return stream_list_response(
+                Product.iter_raw(batch_size=stream_batch_size(), fields=fields),
+                "Found {count} products",
+                envelope={"status": "success"},
+                encode=dumps_raw,
             )
 
-        # Validate supplier_id if present
-        if "supplier_id" in data and not validate_object_id(data["supplier_id"]):
-            return JsonResponse(
-                {"status": "error", "message": "Invalid supplier ID"}, status=400
+        if wants_stream(request):
+            return stream_list_response(
+                Product.iter_all(batch_size=stream_batch_size(), fields=fields),
+                "Found {count} products",
+                envelope={"status": "success"},
             )
 
-        success = Product.update(product_id, data)
-        if not success:
-            return JsonResponse(
-                {"status": "error", "message": "Product update failed"}, status=400
+        return list_response(Product.get_all(fields=fields), "Found {count} products")
+
+    def patch(self, request):
+        """Bulk update products from a list of {id, changes}"""
+        try:
+            data = parse_bulk_write_body(
+                request, "Expected a list of {id, changes} objects"
             )
+        except InvalidQuery as exc:
+            return rejected_response(exc)
 
-        updated_product = Product.get_by_id(product_id)
-        return JsonResponse(
-            {
-                "status": "success",
-                "message": "Product updated successfully",
-                "data": updated_product,
-            },
-            status=200,
-        )
+        return outcomes_response(Product.bulk_update(data), "updated", "products")
+
+    def delete(self, request):
+        """Bulk delete products from a list of IDs"""
+        try:
+            data = parse_bulk_write_body(request, "Expected a list of IDs")
+        except InvalidQuery as exc:
+            return rejected_response(exc)
+
+        return outcomes_response(Product.bulk_delete(data), "deleted", "products")
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+@method_decorator(detail_condition(Product, "product_id"), name="get")
+class ProductDetailView(View):
+    def get(self, request, product_id):
+        """Get a specific product"""
+        try:
+            fields = parse_fields(request)
+            parse_object_id(product_id, "Product")
+        except ValueError as exc:
+            return rejected_response(exc)
+
+        product = Product.get_by_id(product_id, fields=fields)
+        return retrieved_response(product, "Product")
+
+    def put(self, request, product_id):
+        """Update a product"""
+        try:
+            data = parse_product_update(request, product_id)
+            product = Product.update(product_id, data)
+        except ValueError as exc:
+            return rejected_response(exc)
+        return updated_response(product, "Product")
 
     def delete(self, request, product_id):
         """Delete a product"""
-        if not validate_object_id(product_id):
-            return JsonResponse(
-                {"status": "error", "message": "Invalid product ID format"}, status=400
-            )
+        try:
+            parse_object_id(product_id, "Product")
+        except InvalidQuery as exc:
+            return rejected_response(exc)
 
-        success = Product.delete(product_id)
-        if not success:
-            return JsonResponse(
-                {"status": "error", "message": "Product not found or already deleted"},
-                status=404,
-            )
-
-        return JsonResponse(
-            {"status": "success", "message": "Product deleted successfully"}, status=200
-        )
+        return deleted_response(Product.delete(product_id), "Product")
 
 
 @method_decorator(csrf_exempt, name="dispatch")
+@method_decorator(list_condition("products", "categories"), name="get")
 class ProductSearchView(View):
     def get(self, request):
         """Search products with filters"""
-        query_params = request.GET
-        criteria = {}
-
-        # Price range filter
-        if "min_price" in query_params or "max_price" in query_params:
-            try:
-                price_filter = {}
-                if "min_price" in query_params:
-                    price_filter["$gte"] = float(query_params["min_price"])
-                if "max_price" in query_params:
-                    price_filter["$lte"] = float(query_params["max_price"])
-                criteria["price"] = price_filter
-            except ValueError:
-                return JsonResponse(
-                    {"status": "error", "message": "Invalid price value"}, status=400
-                )
-
-        # Name search (partial match)
-        if "name" in query_params:
-            criteria["name"] = {"$regex": query_params["name"], "$options": "i"}
-
-        # Category filter
-        if "category_id" in query_params:
-            if not validate_object_id(query_params["category_id"]):
-                return JsonResponse(
-                    {"status": "error", "message": "Invalid category ID"}, status=400
-                )
-            criteria["category_id"] = ObjectId(query_params["category_id"])
-
-        # Quantity filter
-        if "min_quantity" in query_params:
-            try:
-                criteria["quantity"] = {"$gte": int(query_params["min_quantity"])}
-            except ValueError:
-                return JsonResponse(
-                    {"status": "error", "message": "Invalid quantity value"}, status=400
-                )
-
-        products = Product.get_by_criteria(criteria)
-        return JsonResponse(
-            {
-                "status": "success",
-                "message": f"Found {len(products)} matching products",
-                "data": products,
-                "count": len(products),
-            },
-            status=200,
-        )
+        try:
+            fields = parse_fields(request)
+            search = parse_search_params(request.GET)
+        except ValueError as exc:
+            return rejected_response(exc)
+
+        products = Product.search(**search, fields=fields)
+        return list_response(products, "Found {count} matching products")
 
 
 @method_decorator(csrf_exempt, name="dispatch")
+@method_decorator(list_condition("products", unless=wants_fresh), name="get")
 class ProductMetricsView(View):
     def get(self, request):
         """Get product metrics"""
-        metrics = Product.calculate_metrics()
-        return JsonResponse(
-            {
-                "status": "success",
-                "message": "Product metrics calculated",
-                "data": metrics,
-            },
-            status=200,
-        )
+        try:
+            fresh, breakdown = parse_metrics_params(request)
+        except InvalidQuery as exc:
+            return rejected_response(exc)
+
+        metrics = Product.calculate_metrics(fresh=fresh, breakdown=breakdown)
+        return metrics_response(metrics)
 
 
 @method_decorator(csrf_exempt, name="dispatch")
+@method_decorator(list_condition("products", "categories"), name="get")
 class ProductSortView(View):
     def get(self, request):
         """Get sorted and paginated products"""
-        query_params = request.GET
-
-        # Validate sort field
-        valid_sort_fields = ["name", "price", "quantity", "created_at"]
-        sort_by = query_params.get("sort_by", "price")
-        if sort_by not in valid_sort_fields:
-            return JsonResponse(
-                {
-                    "status": "error",
-                    "message": f"Invalid sort field. Valid fields: {', '.join(valid_sort_fields)}",
-                },
-                status=400,
-            )
-
-        # Validate sort order
         try:
-            order = int(query_params.get("order", 1))
-            if order not in (1, -1):
-                raise ValueError
-        except ValueError:
-            return JsonResponse(
-                {"status": "error", "message": "Order must be 1 (asc) or -1 (desc)"},
-                status=400,
+            fields = parse_fields(request)
+            sort_by, order, limit, skip, after = parse_sort_params(request.GET)
+        except ValueError as exc:
+            return rejected_response(exc)
+
+        # Offset pagination is kept for existing clients; everything else is
+        # served by keyset pagination, whose cost does not grow with depth.
+        if skip:
+            products = Product.get_sorted_products(sort_by, order, limit, skip, fields)
+            next_cursor = None
+        else:
+            products, next_cursor = Product.get_sorted_page(
+                sort_by, order, limit, after, fields
             )
+        return sorted_response(products, next_cursor)
+
 
-        # Validate pagination
+@method_decorator(csrf_exempt, name="dispatch")
+class ProductImportView(View):
+    def post(self, request):
+        """Upsert products by SKU from a CSV or NDJSON request body.
+
+        The body is read and written in batches as it arrives rather than
+        loaded whole; the report's checkpoint is the row to pass as ``skip``
+        to resume an interrupted upload.
+        """
         try:
-            limit = int(query_params.get("limit", 10))
-            skip = int(query_params.get("skip", 0))
-            if limit < 1 or skip < 0:
-                raise ValueError
-        except ValueError:
-            return JsonResponse(
-                {"status": "error", "message": "Invalid pagination parameters"},
-                status=400,
+            format, workers, skip = parse_import_params(request)
+            report = Product.import_rows(
+                read_rows(request, format), workers=workers, skip=skip
             )
+        except (InvalidImport, InvalidQuery) as exc:
+            return rejected_response(exc)
 
-        products = Product.get_sorted_products(sort_by, order, limit, skip)
-        return JsonResponse(
-            {
-                "status": "success",
-                "message": f"Retrieved {len(products)} products",
-                "data": products,
-                "count": len(products),
-            },
-            status=200,
-        )
+        return success_response(f"Imported {report['rows']} rows", data=report)
 
 
 @method_decorator(csrf_exempt, name="dispatch")
+@method_decorator(list_condition("categories"), name="get")
 class CategoryView(View):
     def post(self, request):
         """Create a new category or bulk create categories"""
         try:
-            data = json.loads(request.body)
-        except json.JSONDecodeError:
-            return JsonResponse(
-                {"status": "error", "message": "Invalid JSON format"}, status=400
-            )
-
-        # Handle bulk creation
-        if isinstance(data, list):
-            category_ids = Category.bulk_create(data)
-            if not category_ids:
-                return JsonResponse(
-                    {"status": "error", "message": "Failed to create categories"},
-                    status=400,
-                )
-
-            categories = [Category.get_by_id(cid) for cid in category_ids]
-            return JsonResponse(
-                {
-                    "status": "success",
-                    "message": f"Created {len(categories)} categories",
-                    "data": categories,
-                },
-                status=201,
-            )
-
-        # Handle single category creation
-        required_fields = ["name"]
-        missing_fields = [field for field in required_fields if field not in data]
-        if missing_fields:
-            return JsonResponse(
-                {
-                    "status": "error",
-                    "message": f"Missing required fields: {', '.join(missing_fields)}",
-                },
-                status=400,
+            data = parse_category_body(request)
+        except InvalidQuery as exc:
+            return rejected_response(exc)
+
+        if isinstance(data, BulkBody):
+            return bulk_create_response(
+                data,
+                Category.iter_bulk_create(data),
+                "Created {count} categories",
+                {"status": "error", "message": "Failed to create categories"},
+                envelope={"status": "success"},
             )
 
-        category_id = Category.create(
+        category = Category.create(
             name=data["name"], description=data.get("description")
         )
-        category = Category.get_by_id(category_id)
-        return JsonResponse(
-            {
-                "status": "success",
-                "message": "Category created successfully",
-                "data": category,
-            },
-            status=201,
-        )
+        return created_response(category, "Category")
 
     def get(self, request):
         """Get all categories"""
-        categories = Category.get_all()
-        return JsonResponse(
-            {
-                "status": "success",
-                "message": f"Found {len(categories)} categories",
-                "data": categories,
-                "count": len(categories),
-            },
-            status=200,
+        try:
+            fields = parse_fields(request)
+        except InvalidFields as exc:
+            return rejected_response(exc)
+
+        if wants_stream(request):
+            return stream_list_response(
+                Category.iter_all(batch_size=stream_batch_size(), fields=fields),
+                "Found {count} categories",
+                envelope={"status": "success"},
+            )
+
+        return list_response(
+            Category.get_all(fields=fields), "Found {count} categories"
         )
 
+    def patch(self, request):
+        """Bulk update categories from a list of {id, changes}"""
+        try:
+            data = parse_bulk_write_body(
+                request, "Expected a list of {id, changes} objects"
+            )
+        except InvalidQuery as exc:
+            return rejected_response(exc)
+
+        return outcomes_response(Category.bulk_update(data), "updated", "categories")
+
+    def delete(self, request):
+        """Bulk delete categories from a list of IDs"""
+        try:
+            data = parse_bulk_write_body(request, "Expected a list of IDs")
+        except InvalidQuery as exc:
+            return rejected_response(exc)
+
+        return outcomes_response(Category.bulk_delete(data), "deleted", "categories")
+
 
 @method_decorator(csrf_exempt, name="dispatch")
+@method_decorator(detail_condition(Category, "category_id"), name="get")
 class CategoryDetailView(View):
     def get(self, request, category_id):
         """Get a specific category"""
-        if not validate_object_id(category_id):
-            return JsonResponse(
-                {"status": "error", "message": "Invalid category ID format"}, status=400
-            )
-
-        category = Category.get_by_id(category_id)
-        if not category:
-            return JsonResponse(
-                {"status": "error", "message": "Category not found"}, status=404
-            )
+        try:
+            fields = parse_fields(request)
+            parse_object_id(category_id, "Category")
+        except ValueError as exc:
+            return rejected_response(exc)
 
-        return JsonResponse(
-            {
-                "status": "success",
-                "message": "Category retrieved successfully",
-                "data": category,
-            },
-            status=200,
-        )
+        category = Category.get_by_id(category_id, fields=fields)
+        return retrieved_response(category, "Category")
 
     def put(self, request, category_id):
         """Update a category"""
-        if not validate_object_id(category_id):
-            return JsonResponse(
-                {"status": "error", "message": "Invalid category ID format"}, status=400
-            )
-
         try:
-            data = json.loads(request.body)
-        except json.JSONDecodeError:
-            return JsonResponse(
-                {"status": "error", "message": "Invalid JSON format"}, status=400
-            )
-
-        if "name" in data and not data["name"]:
-            return JsonResponse(
-                {"status": "error", "message": "Category name cannot be empty"},
-                status=400,
-            )
-
-        success = Category.update(category_id, data)
-        if not success:
-            return JsonResponse(
-                {"status": "error", "message": "Category update failed"}, status=400
-            )
-
-        updated_category = Category.get_by_id(category_id)
-        return JsonResponse(
-            {
-                "status": "success",
-                "message": "Category updated successfully",
-                "data": updated_category,
-            },
-            status=200,
-        )
+            data = parse_category_update(request, category_id)
+            category = Category.update(category_id, data)
+        except ValueError as exc:
+            return rejected_response(exc)
+        return updated_response(category, "Category")
 
     def delete(self, request, category_id):
         """Delete a category"""
-        if not validate_object_id(category_id):
-            return JsonResponse(
-                {"status": "error", "message": "Invalid category ID format"}, status=400
-            )
-
-        success = Category.delete(category_id)
-        if not success:
-            return JsonResponse(
-                {"status": "error", "message": "Category not found or already deleted"},
-                status=404,
-            )
+        try:
+            parse_object_id(category_id, "Category")
+        except InvalidQuery as exc:
+            return rejected_response(exc)
 
-        return JsonResponse(
-            {"status": "success", "message": "Category deleted successfully"},
-            status=200,
-        )
+        return deleted_response(Category.delete(category_id), "Category")
@@ -1,3 +1,233 @@
-from django.test import TestCase
+import json
+from bson import ObjectId
+from django.test import override_settings
+from inventory_db.cache import stats
+from inventory_db.testing import MongomockTestCase, response_json
 
-# Create your tests here.
+
+def supplier_payload(**fields):
+    """Body of a valid supplier create request"""
+    return {
+        "name": "Acme",
+        "contact_info": "Jo",
+        "email": "sales@acme.test",
+        "address": "1 Road",
+        "phone": "555",
+        **fields,
+    }
+
+
+class SupplierTestCase(MongomockTestCase):
+    def create_supplier(self, **fields):
+        response = self.client.post(
+            "/suppliers/suppliers/",
+            supplier_payload(**fields),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()["data"]
+
+
+class StreamingListTests(SupplierTestCase):
+    def test_stream_matches_list(self):
+        self.create_supplier()
+        self.create_supplier(name="Bolt Co", email="bolt@test")
+
+        listed = self.client.get("/suppliers/suppliers/").json()
+        streamed = response_json(self.client.get("/suppliers/suppliers/?stream=1"))
+        self.assertEqual(streamed["data"], listed["data"])
+        self.assertEqual(streamed["count"], 2)
+        self.assertEqual(streamed["message"], "Suppliers retrieved successfully")
+
+    def test_invalid_fields(self):
+        response = self.client.get("/suppliers/suppliers/?stream=1&fields=")
+        self.assertEqual(response.status_code, 400)
+        self.assertIsNone(response.json()["data"])
+
+
+class CachedReadTests(SupplierTestCase):
+    def setUp(self):
+        super().setUp()
+        self.supplier = self.create_supplier()
+        self.path = f"/suppliers/suppliers/{self.supplier['id']}/"
+
+    def get(self):
+        return self.client.get(self.path).json()["data"]
+
+    def test_reads_are_cached(self):
+        self.get()
+        hits = stats()["suppliers"]["hits"]
+        self.assertEqual(self.get(), self.supplier)
+        self.assertEqual(stats()["suppliers"]["hits"], hits + 1)
+
+    def test_writes_reach_cached_reads(self):
+        self.get()
+        self.client.put(self.path, {"phone": "556"}, content_type="application/json")
+        self.assertEqual(self.get()["phone"], "556")
+
+        self.client.patch(
+            "/suppliers/suppliers/",
+            [{"id": self.supplier["id"], "changes": {"phone": "557"}}],
+            content_type="application/json",
+        )
+        self.assertEqual(self.get()["phone"], "557")
+
+        self.client.delete(self.path)
+        response = self.client.get(self.path)
+        self.assertEqual(response.status_code, 404)
+        self.assertIsNone(response.json()["data"])
+
+    def test_missing_supplier(self):
+        path = f"/suppliers/suppliers/{ObjectId()}/"
+        for _ in range(2):
+            self.assertEqual(self.client.get(path).status_code, 404)
+        self.assertEqual(self.client.get("/suppliers/suppliers/nope/").status_code, 400)
+
+
+class UpdateTests(SupplierTestCase):
+    def setUp(self):
+        super().setUp()
+        self.supplier = self.create_supplier()
+        self.path = f"/suppliers/suppliers/{self.supplier['id']}/"
+
+    def put(self, path, data):
+        return self.client.put(path, data, content_type="application/json")
+
+    def test_update(self):
+        response = self.put(self.path, {"phone": "556"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["phone"], "556")
+        self.assertEqual(self.client.get(self.path).json()["data"]["phone"], "556")
+
+    def test_refused_updates(self):
+        for path, data, status in [
+            (self.path, [{"phone": "556"}], 400),
+            (self.path, {"_id": str(ObjectId())}, 400),
+            (f"/suppliers/suppliers/{ObjectId()}/", {"phone": "556"}, 404),
+            ("/suppliers/suppliers/nope/", {"phone": "556"}, 400),
+        ]:
+            with self.subTest(path=path, data=data):
+                response = self.put(path, data)
+                self.assertEqual(response.status_code, status)
+                self.assertIsNone(response.json()["data"])
+        self.assertEqual(self.client.get(self.path).json()["data"], self.supplier)
+
+
+class BulkWriteTests(SupplierTestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = self.create_supplier()
+        self.bolt = self.create_supplier(name="Bolt Co", email="bolt@test")
+
+    def send(self, method, data):
+        response = getattr(self.client, method)(
+            "/suppliers/suppliers/", data, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def statuses(self, body):
+        return [outcome["status"] for outcome in body["data"]]
+
+    def test_bulk_update(self):
+        missing = str(ObjectId())
+        body = self.send(
+            "patch",
+            [
+                {"id": self.acme["id"], "changes": {"phone": "1"}},
+                {"id": missing, "changes": {"phone": "2"}},
+                {"id": "nope", "changes": {"phone": "3"}},
+                {"id": self.acme["id"], "changes": {"phone": "4"}},
+                {"id": self.bolt["id"]},
+                {"id": self.bolt["id"], "changes": {"phone": "5"}},
+            ],
+        )
+        self.assertEqual(
+            self.statuses(body),
+            ["updated", "not_found", "error", "error", "error", "updated"],
+        )
+        self.assertEqual(body["data"][3]["message"], "Duplicate ID")
+        self.assertEqual(body["summary"], {"updated": 2, "not_found": 1, "error": 3})
+        self.assertEqual(body["message"], "Updated 2 of 6 suppliers")
+        # The cached reads see the writes
+        for supplier, phone in ((self.acme, "1"), (self.bolt, "5")):
+            path = f"/suppliers/suppliers/{supplier['id']}/"
+            self.assertEqual(self.client.get(path).json()["data"]["phone"], phone)
+
+    def test_bulk_delete(self):
+        body = self.send("delete", [self.acme["id"], str(ObjectId()), 7])
+        self.assertEqual(self.statuses(body), ["deleted", "not_found", "error"])
+        self.assertEqual(body["data"][2]["message"], "Invalid ID")
+        listed = self.client.get("/suppliers/suppliers/").json()["data"]
+        self.assertEqual([supplier["id"] for supplier in listed], [self.bolt["id"]])
+
+    def test_rejected_bodies(self):
+        for method in ("patch", "delete"):
+            for body in ({"id": self.acme["id"]}, "nope"):
+                with self.subTest(method=method, body=body):
+                    response = getattr(self.client, method)(
+                        "/suppliers/suppliers/", body, content_type="application/json"
+                    )
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIsNone(response.json()["data"])
+
+
+class BulkCreateTests(SupplierTestCase):
+    path = "/suppliers/suppliers/"
+
+    def post(self, body, content_type="application/json"):
+        return self.client.post(self.path, body, content_type=content_type)
+
+    def names(self):
+        return sorted(
+            supplier["name"] for supplier in self.client.get(self.path).json()["data"]
+        )
+
+    def test_array(self):
+        body = json.dumps([supplier_payload(name="A"), supplier_payload(name="B")])
+        response = self.post(body)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["errors"], [])
+        self.assertEqual(len(response.json()["data"]), 2)
+        self.assertEqual(self.names(), ["A", "B"])
+
+    def test_ndjson(self):
+        body = "\n".join(
+            [
+                json.dumps(supplier_payload(name="A")),
+                "{nope",
+                json.dumps(supplier_payload(name="B")),
+            ]
+        )
+        response = self.post(body, "application/x-ndjson")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([error["index"] for error in response.json()["errors"]], [1])
+        self.assertEqual(self.names(), ["A", "B"])
+
+    @override_settings(MONGO_BULK_BATCH_SIZE=1)
+    def test_large_bodies_are_streamed(self):
+        rows = [supplier_payload(name=str(number)) for number in range(5)]
+        # The body breaks off after the last row
+        response = self.post(json.dumps(rows)[:-1] + ', {"name":')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.streaming)
+        body = response_json(response)
+        self.assertEqual(body["count"], 5)
+        self.assertEqual(body["message"], "Suppliers created successfully")
+        self.assertEqual([error["index"] for error in body["errors"]], [5])
+        self.assertEqual(self.names(), [str(number) for number in range(5)])
+
+    def test_rejected_bodies(self):
+        for body in ("[", "[1, 2]", "{nope"):
+            with self.subTest(body=body):
+                response = self.post(body)
+                self.assertEqual(response.status_code, 400)
+                self.assertIsNone(response.json()["data"])
+        self.assertEqual(self.names(), [])
+
+    def test_syntax_errors_end_the_body(self):
+        # Items before the error are created; the rest are not read
+        response = self.post('[{"name": "A"} {"name": "B"}]')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([error["index"] for error in response.json()["errors"]], [1])
+        self.assertEqual(self.names(), ["A"])
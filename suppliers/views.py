@@ -1,9 +1,19 @@
 import json
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from django.http import JsonResponse
 from django.views import View
 from bson import ObjectId
+from inventory_db.bulk import outcome_counts
+from inventory_db.conditional import detail_condition, list_condition
+from inventory_db.parsing import BulkBody, InvalidBody, read_body, update_error
+from inventory_db.projection import InvalidFields, parse_fields
+from inventory_db.serialization import JsonResponse
+from inventory_db.streaming import (
+    bulk_create_response,
+    stream_batch_size,
+    stream_list_response,
+    wants_stream,
+)
 from .models import Supplier
 
 
@@ -13,24 +23,23 @@ def validate_object_id(value):
 
 
 @method_decorator(csrf_exempt, name="dispatch")
+@method_decorator(list_condition("suppliers"), name="get")
 class SupplierView(View):
     def post(self, request):
         """Create a new supplier or bulk create suppliers"""
         try:
-            data = json.loads(request.body)
-        except json.JSONDecodeError:
+            data = read_body(request)
+        except InvalidBody:
             return JsonResponse(
                 {"message": "Invalid JSON format", "data": None}, status=400
             )
 
-        if isinstance(data, list):
-            supplier_ids = Supplier.bulk_create(data)
-            new_suppliers = [
-                Supplier.get_by_id(supplier_id) for supplier_id in supplier_ids
-            ]
-            return JsonResponse(
-                {"message": "Suppliers created successfully", "data": new_suppliers},
-                status=201,
+        if isinstance(data, BulkBody):
+            return bulk_create_response(
+                data,
+                Supplier.iter_bulk_create(data),
+                "Suppliers created successfully",
+                {"message": "Failed to create suppliers", "data": None},
             )
 
         required_fields = ["name", "contact_info", "email", "phone"]
@@ -39,8 +48,7 @@ class SupplierView(View):
                 {"message": "Missing required fields", "data": None}, status=400
             )
 
-        supplier_id = Supplier.create(**data)
-        new_supplier = Supplier.get_by_id(supplier_id)
+        new_supplier = Supplier.create(**data)
         return JsonResponse(
             {"message": "Supplier created successfully", "data": new_supplier},
             status=201,
@@ -48,7 +56,18 @@ class SupplierView(View):
 
     def get(self, request):
         """Get all suppliers"""
-        suppliers = Supplier.get_all()
+        try:
+            fields = parse_fields(request)
+        except InvalidFields as exc:
+            return JsonResponse({"message": str(exc), "data": None}, status=400)
+
+        if wants_stream(request):
+            return stream_list_response(
+                Supplier.iter_all(batch_size=stream_batch_size(), fields=fields),
+                "Suppliers retrieved successfully",
+            )
+
+        suppliers = Supplier.get_all(fields=fields)
         return JsonResponse(
             {
                 "message": "Suppliers retrieved successfully",
@@ -59,17 +78,74 @@ class SupplierView(View):
             safe=False,
         )
 
+    def patch(self, request):
+        """Bulk update suppliers from a list of {id, changes}"""
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse(
+                {"message": "Invalid JSON format", "data": None}, status=400
+            )
+        if not isinstance(data, list):
+            return JsonResponse(
+                {"message": "Expected a list of {id, changes} objects", "data": None},
+                status=400,
+            )
+
+        outcomes = Supplier.bulk_update(data)
+        summary = outcome_counts(outcomes)
+        return JsonResponse(
+            {
+                "message": f"Updated {summary.get('updated', 0)} of {len(outcomes)} suppliers",
+                "data": outcomes,
+                "count": len(outcomes),
+                "summary": summary,
+            },
+            status=200,
+        )
+
+    def delete(self, request):
+        """Bulk delete suppliers from a list of IDs"""
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse(
+                {"message": "Invalid JSON format", "data": None}, status=400
+            )
+        if not isinstance(data, list):
+            return JsonResponse(
+                {"message": "Expected a list of IDs", "data": None}, status=400
+            )
+
+        outcomes = Supplier.bulk_delete(data)
+        summary = outcome_counts(outcomes)
+        return JsonResponse(
+            {
+                "message": f"Deleted {summary.get('deleted', 0)} of {len(outcomes)} suppliers",
+                "data": outcomes,
+                "count": len(outcomes),
+                "summary": summary,
+            },
+            status=200,
+        )
+
 
 @method_decorator(csrf_exempt, name="dispatch")
+@method_decorator(detail_condition(Supplier, "supplier_id"), name="get")
 class SupplierDetailView(View):
     def get(self, request, supplier_id):
         """Get a specific supplier by ID"""
+        try:
+            fields = parse_fields(request)
+        except InvalidFields as exc:
+            return JsonResponse({"message": str(exc), "data": None}, status=400)
+
         if not validate_object_id(supplier_id):
             return JsonResponse(
                 {"message": "Invalid supplier ID format", "data": None}, status=400
             )
 
-        supplier = Supplier.get_by_id(supplier_id)
+        supplier = Supplier.get_by_id(supplier_id, fields=fields)
         if not supplier:
             return JsonResponse(
                 {"message": "Supplier not found", "data": None}, status=404
@@ -92,9 +168,18 @@ class SupplierDetailView(View):
                 {"message": "Invalid JSON format", "data": None}, status=400
             )
 
-        success = Supplier.update(supplier_id, data)
-        if success:
-            updated_supplier = Supplier.get_by_id(supplier_id)
+        reason = update_error(data)
+        if reason:
+            return JsonResponse({"message": reason, "data": None}, status=400)
+
+        try:
+            updated_supplier = Supplier.update(supplier_id, data)
+        except ValueError as exc:
+            return JsonResponse(
+                {"message": str(exc), "data": None},
+                status=getattr(exc, "status", 400),
+            )
+        if updated_supplier:
             return JsonResponse(
                 {"message": "Supplier updated successfully", "data": updated_supplier},
                 status=200,
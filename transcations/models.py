@@ -1,73 +1,795 @@
 from bson import ObjectId
-from datetime import datetime
+from datetime import datetime, timedelta
+from django.conf import settings
+from pymongo import DeleteMany, IndexModel, ReplaceOne, ReturnDocument, UpdateMany
 from db_connection import db
+from inventory_db.bulk import bulk_batch_size
+from inventory_db.conditional import bump_version
+from inventory_db.pagination import encode_cursor, keyset_filter
+from inventory_db.projection import build_projection
+from inventory_db.repository import Repository, refused_writes, utcnow
+from locations.models import StockLevel
+from products.models import Product
 
 
-class InventoryTransaction:
+class InventoryTransaction(Repository):
     collection = db["inventory_transactions"]
 
+    # Time-series storage: rows are bucketed per product by created_at, which
+    # compresses them and makes product/time range scans cheap, but there is
+    # no _id index (see id_filter)
+    TIMESERIES = getattr(settings, "INVENTORY_TRANSACTIONS_TIMESERIES", False)
+    TIMESERIES_OPTIONS = {
+        "timeField": "created_at",
+        "metaField": "product_id",
+        "granularity": "hours",
+    }
+
+    # How far a row's created_at may be from its _id's timestamp; bounds the
+    # buckets an _id lookup has to open in time-series mode
+    ID_TIME_WINDOW = timedelta(hours=1)
+
+    # History queries filter by product or reference and page by
+    # (created_at, _id), so each index ends with both and a page is a range
+    # scan without an in-memory sort; (created_at, _id) serves unfiltered and
+    # type/date-only history
+    indexes = [
+        IndexModel([("product_id", 1), ("created_at", 1), ("_id", 1)]),
+        IndexModel([("reference", 1), ("created_at", 1), ("_id", 1)]),
+        IndexModel([("created_at", 1), ("_id", 1)]),
+        # Time-series collections only take partial indexes on the meta and
+        # time fields
+        (
+            IndexModel([("posted", 1), ("created_at", 1)], name="unposted")
+            if TIMESERIES
+            else IndexModel(
+                [("created_at", 1)],
+                partialFilterExpression={"posted": False},
+                name="unposted",
+            )
+        ),
+    ]
+
+    # Sign applied to a transaction's quantity when it is posted to product
+    # stock; adjustments carry their own sign
+    TRANSACTION_TYPES = {"purchase": 1, "return": 1, "sale": -1, "adjustment": 1}
+
+    # Fields that decide a transaction's effect on stock, fixed once posted
+    LEDGER_FIELDS = ["product_id", "location_id", "quantity", "transaction_type"]
+
+    # References of the adjustments that record stock set on products
+    # directly rather than through transactions (see record_stock_changes)
+    OPENING_BALANCE = "opening-balance"
+    STOCK_SET = "stock-set"
+
+    # Fields the ledger maintains itself; snapshots and as-of replay rely on
+    # them, so no update may set them
+    SYSTEM_FIELDS = ["delta", "posted", "created_at", "updated_at"]
+
+    # Query shapes issued by the transaction views, checked by
+    # `manage.py ensure_indexes --explain`
+    explain_queries = [
+        (
+            "lookup by id",
+            (
+                {"_id": ObjectId(), "created_at": {"$gte": datetime.utcnow()}}
+                if TIMESERIES
+                else {"_id": ObjectId()}
+            ),
+            None,
+        ),
+        (
+            "history of a product",
+            {"product_id": ObjectId()},
+            [("created_at", -1), ("_id", -1)],
+        ),
+        (
+            "history of a reference",
+            {"reference": ""},
+            [("created_at", -1), ("_id", -1)],
+        ),
+        (
+            "history in a date range",
+            {"created_at": {"$gte": datetime.utcnow()}},
+            [("created_at", -1), ("_id", -1)],
+        ),
+    ]
+
+    @classmethod
+    def ensure_collection(cls):
+        """Create the collection as a time-series collection when that storage
+        mode is enabled; run by `manage.py ensure_indexes`.
+
+        Returns a message when the collection was created. Raises ValueError
+        if it already exists with the other storage mode, since MongoDB cannot
+        convert a collection in place.
+        """
+        if not cls.TIMESERIES:
+            return None
+
+        database = cls.collection.database
+        existing = list(database.list_collections(filter={"name": cls.collection.name}))
+        if not existing:
+            database.create_collection(
+                cls.collection.name, timeseries=cls.TIMESERIES_OPTIONS
+            )
+            return "created time-series collection"
+        if existing[0].get("type") != "timeseries":
+            raise ValueError(
+                "exists as a regular collection; copy it into a new time-series "
+                "collection to switch storage modes"
+            )
+        return None
+
+    @classmethod
+    def id_filter(cls, transaction_id):
+        """Filter matching a transaction by ID.
+
+        Time-series collections have no _id index, so the filter is bounded to
+        the created_at window around the ID's timestamp, letting the server
+        skip every bucket outside it.
+        """
+        transaction_id = ObjectId(transaction_id)
+        if not cls.TIMESERIES:
+            return {"_id": transaction_id}
+        created = transaction_id.generation_time.replace(tzinfo=None)
+        return {
+            "_id": transaction_id,
+            "created_at": {
+                "$gte": created - cls.ID_TIME_WINDOW,
+                "$lte": created + cls.ID_TIME_WINDOW,
+            },
+        }
+
+    @classmethod
+    def ids_filter(cls, transaction_ids):
+        """Filter matching several transactions by ID, bounded like id_filter
+        by the created_at window around their timestamps"""
+        transaction_ids = list(transaction_ids)
+        if not cls.TIMESERIES:
+            return super().ids_filter(transaction_ids)
+        created = [
+            transaction_id.generation_time.replace(tzinfo=None)
+            for transaction_id in transaction_ids
+        ]
+        return {
+            "_id": {"$in": transaction_ids},
+            "created_at": {
+                "$gte": min(created) - cls.ID_TIME_WINDOW,
+                "$lte": max(created) + cls.ID_TIME_WINDOW,
+            },
+        }
+
+    @classmethod
+    def update_operation(cls, transaction_id, update):
+        # Time-series collections only support multi-document writes
+        if cls.TIMESERIES:
+            return UpdateMany(cls.id_filter(transaction_id), update)
+        return super().update_operation(transaction_id, update)
+
+    @classmethod
+    def delete_operation(cls, transaction_id):
+        if cls.TIMESERIES:
+            return DeleteMany(cls.id_filter(transaction_id))
+        return super().delete_operation(transaction_id)
+
+    @classmethod
+    def reject(cls, transaction, changes=None):
+        """Posted transactions cannot be deleted or change their ledger fields"""
+        if "posted" not in transaction:
+            return None
+        if changes is None:
+            return "Posted transactions cannot be deleted; post an adjustment instead"
+        if any(field in changes for field in cls.LEDGER_FIELDS):
+            return (
+                "Posted transactions cannot change "
+                + ", ".join(cls.LEDGER_FIELDS)
+                + "; post an adjustment instead"
+            )
+        return None
+
+    @staticmethod
+    def batch_filter(transactions):
+        """Filter matching a batch of stored transactions by ID, bounded by
+        their created_at range"""
+        created = [transaction["created_at"] for transaction in transactions]
+        return {
+            "_id": {"$in": [transaction["_id"] for transaction in transactions]},
+            "created_at": {"$gte": min(created), "$lte": max(created)},
+        }
+
     @classmethod
-    def create(cls, product_id, quantity, transaction_type, reference):
-        """Create a new inventory transaction"""
+    def create(
+        cls, product_id, quantity, transaction_type, reference=None, location_id=None
+    ):
+        """Create a new inventory transaction and post it to product stock"""
         transaction_data = {
-            "product_id": ObjectId(product_id),
-            "quantity": int(quantity),
+            "product_id": product_id,
+            "quantity": quantity,
             "transaction_type": transaction_type,
             "reference": reference,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow(),
         }
-        result = cls.collection.insert_one(transaction_data)
-        return str(result.inserted_id)
-
-    @classmethod
-    def get_all(cls):
-        """Get all inventory transactions with _id and product_id converted to string"""
-        transactions = []
-        for transaction in cls.collection.find():
-            transaction["id"] = str(transaction["_id"])
-            transaction["product_id"] = str(transaction["product_id"])
-            del transaction["_id"]
-            transactions.append(transaction)
-        return transactions
-
-    @classmethod
-    def get_by_id(cls, transaction_id):
-        """Get single inventory transaction by ID"""
-        try:
-            transaction = cls.collection.find_one({"_id": ObjectId(transaction_id)})
-            if transaction:
-                transaction["id"] = str(transaction["_id"])
-                transaction["product_id"] = str(transaction["product_id"])
-                del transaction["_id"]
-                return transaction
-            return None
-        except:
-            return None
+        if location_id:
+            transaction_data["location_id"] = location_id
+        return cls.insert(transaction_data)
+
+    @classmethod
+    def prepare(cls, transaction):
+        """Convert a payload into the unposted ledger row stored for it"""
+        if transaction.get("transaction_type") not in cls.TRANSACTION_TYPES:
+            raise ValueError(
+                "Invalid transaction type. Valid types: "
+                + ", ".join(cls.TRANSACTION_TYPES)
+            )
+        transaction["product_id"] = ObjectId(transaction["product_id"])
+        if transaction.get("location_id"):
+            transaction["location_id"] = ObjectId(transaction["location_id"])
+        transaction["quantity"] = int(transaction["quantity"])
+        transaction["delta"] = (
+            cls.TRANSACTION_TYPES[transaction["transaction_type"]]
+            * transaction["quantity"]
+        )
+        transaction["posted"] = False
+        return super().prepare(transaction)
+
+    @classmethod
+    def created(cls, transactions):
+        """Post new transactions to stock; posting bumps the collection
+        version"""
+        cls.post(transactions)
+
+    @classmethod
+    def post(cls, transactions):
+        """Apply transactions' signed quantities to product stock, and to the
+        stock level at their location for location-aware transactions.
+
+        Updates are grouped per product (and location) and carry an
+        apply-marker, so posting a transaction twice (e.g. from post_pending
+        after a crash) moves stock only once. Transactions are marked
+        ``posted`` afterwards.
+        """
+        batch_size = bulk_batch_size()
+        for start in range(0, len(transactions), batch_size):
+            batch = transactions[start : start + batch_size]
+            Product.apply_stock_deltas(
+                [
+                    (
+                        transaction["product_id"],
+                        transaction["_id"],
+                        transaction["delta"],
+                    )
+                    for transaction in batch
+                ]
+            )
+            cls.post_locations(batch)
+            now = utcnow()
+            cls.collection.update_many(
+                cls.batch_filter(batch), {"$set": {"posted": True, "updated_at": now}}
+            )
+            cls.cache.discard(*(transaction["_id"] for transaction in batch))
+            bump_version(cls.collection.name)
+            for transaction in batch:
+                transaction["posted"] = True
+                transaction["updated_at"] = now
+
+    @classmethod
+    def record_stock_changes(cls, changes, reference):
+        """Record stock set on products outside the ledger (on create, import
+        or a quantity update) as adjustments, so that replaying the ledger
+        gives the products' quantities.
+
+        ``changes`` holds ``(product_id, delta, at)``. The products already
+        carry the new quantities, so the adjustments are written as posted.
+        Returns the number written.
+        """
+        transactions = [
+            {
+                "product_id": product_id,
+                "quantity": delta,
+                "transaction_type": "adjustment",
+                "reference": reference,
+                "delta": delta,
+                "posted": True,
+                "created_at": at,
+                "updated_at": at,
+            }
+            for product_id, delta, at in changes
+            if delta
+        ]
+        if transactions:
+            cls.collection.insert_many(transactions, ordered=False)
+            bump_version(cls.collection.name)
+        return len(transactions)
+
+    @classmethod
+    def backfill(cls, batch_size=1000):
+        """Record opening balances for products created before stock set
+        outside the ledger was recorded. A product without one gets an
+        adjustment at its creation for the stock its posted transactions do
+        not account for. Run by `manage.py ensure_indexes`; returns the
+        number recorded."""
+        recorded, batch = 0, []
+        for product in Product.collection.find(
+            {}, {"_id": 1}, batch_size=batch_size
+        ).sort("_id", 1):
+            batch.append(product["_id"])
+            if len(batch) >= batch_size:
+                recorded += cls._backfill_batch(batch)
+                batch = []
+        if batch:
+            recorded += cls._backfill_batch(batch)
+        return recorded
+
+    @classmethod
+    def _backfill_batch(cls, product_ids):
+        opened = set(
+            cls.collection.distinct(
+                "product_id",
+                {"reference": cls.OPENING_BALANCE, "product_id": {"$in": product_ids}},
+            )
+        )
+        missing = [product_id for product_id in product_ids if product_id not in opened]
+        if not missing:
+            return 0
+        # Unposted transactions are not in the quantities yet; posting them
+        # keeps the two in step
+        ledger = {
+            row["_id"]: row["delta"]
+            for row in cls.collection.aggregate(
+                [
+                    {
+                        "$match": {
+                            "product_id": {"$in": missing},
+                            "posted": {"$ne": False},
+                        }
+                    },
+                    {
+                        "$group": {
+                            "_id": "$product_id",
+                            "delta": {"$sum": StockSnapshot.delta_expression()},
+                        }
+                    },
+                ]
+            )
+        }
+        return cls.record_stock_changes(
+            [
+                (
+                    product["_id"],
+                    (product.get("quantity") or 0) - ledger.get(product["_id"], 0),
+                    product.get("created_at")
+                    or product["_id"].generation_time.replace(tzinfo=None),
+                )
+                for product in Product.collection.find(
+                    {"_id": {"$in": missing}}, {"quantity": 1, "created_at": 1}
+                )
+            ],
+            cls.OPENING_BALANCE,
+        )
+
+    @staticmethod
+    def post_locations(transactions):
+        """Apply location-aware transactions to their stock levels"""
+        StockLevel.apply_stock_deltas(
+            [
+                (
+                    transaction["product_id"],
+                    transaction["location_id"],
+                    transaction["_id"],
+                    transaction["delta"],
+                )
+                for transaction in transactions
+                if transaction.get("location_id")
+            ]
+        )
+
+    @classmethod
+    def post_pending(cls, older_than=60):
+        """Post transactions left unposted by an interrupted write.
+
+        Transactions already recorded on their product are only marked
+        posted. A transaction whose marker may have been trimmed from a busy
+        product (over POSTED_MARKER_LIMIT postings since) cannot be told
+        apart from an unapplied one and is left for review. Returns the
+        numbers of transactions posted and left unresolved.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=older_than)
+        pending = list(
+            cls.collection.find({"posted": False, "created_at": {"$lt": cutoff}})
+        )
+        markers = {
+            product["_id"]: product.get("posted_transactions", [])
+            for product in Product.collection.find(
+                {"_id": {"$in": list({t["product_id"] for t in pending})}},
+                {"posted_transactions": 1},
+            )
+        }
+
+        applied, unapplied, unresolved = [], [], []
+        for transaction in pending:
+            recorded = markers.get(transaction["product_id"], [])
+            if transaction["_id"] in recorded:
+                applied.append(transaction)
+            elif (
+                len(recorded) >= Product.POSTED_MARKER_LIMIT
+                and recorded[0] > transaction["_id"]
+            ):
+                unresolved.append(transaction)
+            else:
+                unapplied.append(transaction)
+
+        cls.post(unapplied)
+        # The stock level write follows the product one, so it may be the
+        # part that was interrupted; its own marker makes this safe to repeat
+        cls.post_locations(applied)
+        if applied:
+            cls.collection.update_many(
+                cls.batch_filter(applied),
+                {"$set": {"posted": True, "updated_at": datetime.utcnow()}},
+            )
+            cls.cache.discard(*(transaction["_id"] for transaction in applied))
+            bump_version(cls.collection.name)
+        return len(unapplied), len(unresolved)
+
+    @classmethod
+    def iter_history(cls, criteria, order=-1, batch_size=1000, fields=None):
+        """Iterate over the transactions matching ``criteria`` in created_at
+        order"""
+        cursor = cls.collection.find(
+            criteria, build_projection(fields), batch_size=batch_size
+        ).sort([("created_at", order), ("_id", order)])
+        for transaction in cursor:
+            yield cls.serialize(transaction)
+
+    @classmethod
+    def get_history_page(cls, criteria, order=-1, limit=100, after=None, fields=None):
+        """Get one page of the transactions matching ``criteria`` in created_at
+        order using keyset pagination.
+
+        Returns the transactions and the cursor for the next page, or None
+        on the last page.
+        """
+        if after:
+            criteria = {**criteria, **keyset_filter("created_at", *after, order)}
+        transactions = list(
+            cls.collection.find(criteria, build_projection(fields, ("created_at",)))
+            .sort([("created_at", order), ("_id", order)])
+            .limit(limit + 1)
+        )
+
+        next_cursor = None
+        if len(transactions) > limit:
+            transactions = transactions[:limit]
+            last = transactions[-1]
+            next_cursor = encode_cursor(
+                last["created_at"], last["_id"], "created_at", order
+            )
+
+        transactions = [cls.serialize(transaction) for transaction in transactions]
+        if fields and "created_at" not in fields:
+            # created_at was only read to build the cursor
+            for transaction in transactions:
+                transaction.pop("created_at", None)
+        return transactions, next_cursor
 
     @classmethod
     def update(cls, transaction_id, update_data):
-        """Update inventory transaction information"""
+        """Update inventory transaction information.
+
+        Raises ValueError when setting the fields the ledger maintains, or
+        changing the ledger fields of a posted transaction; post an
+        adjustment instead.
+        """
+        if any(field in update_data for field in cls.LEDGER_FIELDS):
+            if cls.collection.count_documents(
+                {**cls.id_filter(transaction_id), "posted": {"$exists": True}}
+            ):
+                raise ValueError(
+                    "Posted transactions cannot change "
+                    + ", ".join(cls.LEDGER_FIELDS)
+                    + "; post an adjustment instead"
+                )
+        update_data = cls.prepare_update(update_data)
+        with refused_writes():
+            if cls.TIMESERIES:
+                # Time-series collections only support multi-document updates
+                cls.collection.update_many(
+                    cls.id_filter(transaction_id), {"$set": update_data}
+                )
+                transaction = cls.collection.find_one(cls.id_filter(transaction_id))
+            else:
+                transaction = cls.collection.find_one_and_update(
+                    {"_id": ObjectId(transaction_id)},
+                    {"$set": update_data},
+                    return_document=ReturnDocument.AFTER,
+                )
+        cls.written(transaction_id)
+        return cls.serialize(transaction) if transaction else None
+
+    @classmethod
+    def prepare_update(cls, update_data):
+        """Convert an update payload into the $set stored for it. Raises
+        ValueError when it sets a field the ledger maintains."""
+        if any(field in update_data for field in cls.SYSTEM_FIELDS):
+            raise ValueError(
+                "Transactions cannot change " + ", ".join(cls.SYSTEM_FIELDS)
+            )
         if "product_id" in update_data:
             update_data["product_id"] = ObjectId(update_data["product_id"])
-        update_data["updated_at"] = datetime.utcnow()
-        result = cls.collection.update_one(
-            {"_id": ObjectId(transaction_id)}, {"$set": update_data}
-        )
-        return result.modified_count > 0
+        if update_data.get("location_id"):
+            update_data["location_id"] = ObjectId(update_data["location_id"])
+        return super().prepare_update(update_data)
 
     @classmethod
     def delete(cls, transaction_id):
-        """Delete an inventory transaction"""
-        result = cls.collection.delete_one({"_id": ObjectId(transaction_id)})
+        """Delete an inventory transaction.
+
+        Raises ValueError for posted transactions; post an adjustment instead.
+        """
+        criteria = {**cls.id_filter(transaction_id), "posted": {"$exists": False}}
+        if cls.TIMESERIES:
+            result = cls.collection.delete_many(criteria)
+        else:
+            result = cls.collection.delete_one(criteria)
+        if not result.deleted_count and cls.collection.count_documents(
+            cls.id_filter(transaction_id)
+        ):
+            raise ValueError(
+                "Posted transactions cannot be deleted; post an adjustment instead"
+            )
+        cls.written(transaction_id)
         return result.deleted_count > 0
 
+
+class StockSnapshot:
+    """Ledger-derived on-hand quantity of a product at a point in time.
+
+    A snapshot at ``as_of`` sums the deltas of every transaction created
+    before it, so stock at any time T is the nearest earlier snapshot plus
+    the transactions between the two. Snapshots hold the product-wide
+    quantity (``location_id`` None) and, when built with locations, one per
+    location; all of a product's snapshots share the same ``as_of`` times.
+    Stock set on products directly is in the ledger as adjustments (see
+    InventoryTransaction.record_stock_changes), so stock as of now is the
+    products' quantity.
+    """
+
+    collection = db["stock_snapshots"]
+
+    indexes = [
+        IndexModel(
+            [("product_id", 1), ("location_id", 1), ("as_of", 1)],
+            unique=True,
+            name="product_location_as_of",
+        ),
+        IndexModel([("product_id", 1), ("as_of", 1)]),
+    ]
+
+    # Query shapes issued by the as-of view and snapshot builds, checked by
+    # `manage.py ensure_indexes --explain`
+    explain_queries = [
+        (
+            "nearest snapshot",
+            {
+                "product_id": ObjectId(),
+                "location_id": None,
+                "as_of": {"$lte": datetime.utcnow()},
+            },
+            [("as_of", -1)],
+        ),
+        (
+            "latest snapshot time of a product",
+            {"product_id": ObjectId(), "as_of": {"$lt": datetime.utcnow()}},
+            [("as_of", -1)],
+        ),
+    ]
+
+    @staticmethod
+    def delta_expression():
+        """Aggregation expression for a transaction's signed quantity; rows
+        written before deltas were stored derive it from their type"""
+        return {
+            "$ifNull": [
+                "$delta",
+                {
+                    "$multiply": [
+                        "$quantity",
+                        {
+                            "$switch": {
+                                "branches": [
+                                    {
+                                        "case": {"$eq": ["$transaction_type", name]},
+                                        "then": sign,
+                                    }
+                                    for name, sign in InventoryTransaction.TRANSACTION_TYPES.items()
+                                ],
+                                "default": 0,
+                            }
+                        },
+                    ]
+                },
+            ]
+        }
+
+    @classmethod
+    def latest(cls, product_ids, before):
+        """Each product's most recent snapshots taken before ``before``.
+
+        Returns a dict of product ID to ``{"product": (as_of, quantity),
+        "locations": (as_of, {location_id: quantity})}``, either part missing
+        when the product has no such snapshot. Product-wide and per-location
+        snapshots are tracked separately since builds may skip locations.
+        """
+        times = cls.collection.aggregate(
+            [
+                {
+                    "$match": {
+                        "product_id": {"$in": list(product_ids)},
+                        "as_of": {"$lt": before},
+                    }
+                },
+                {
+                    "$group": {
+                        "_id": {
+                            "product_id": "$product_id",
+                            "located": {"$ne": ["$location_id", None]},
+                        },
+                        "as_of": {"$max": "$as_of"},
+                    }
+                },
+            ]
+        )
+        clauses = [
+            {
+                "product_id": time["_id"]["product_id"],
+                "location_id": {"$ne": None} if time["_id"]["located"] else None,
+                "as_of": time["as_of"],
+            }
+            for time in times
+        ]
+
+        latest = {}
+        for snapshot in cls.collection.find({"$or": clauses}) if clauses else []:
+            product = latest.setdefault(snapshot["product_id"], {})
+            if snapshot["location_id"] is None:
+                product["product"] = (snapshot["as_of"], snapshot["quantity"])
+            else:
+                _, quantities = product.setdefault("locations", (snapshot["as_of"], {}))
+                quantities[snapshot["location_id"]] = snapshot["quantity"]
+        return latest
+
+    @classmethod
+    def movements(cls, as_of, since, located=False):
+        """Sum the deltas of transactions before ``as_of`` per product (and
+        per location when ``located``); ``since`` maps each product to the
+        time to count from, or None for its whole history"""
+        clauses = []
+        for product_id, start in since.items():
+            clause = {"product_id": product_id, "created_at": {"$lt": as_of}}
+            if start:
+                clause["created_at"]["$gte"] = start
+            if located:
+                clause["location_id"] = {"$ne": None}
+            clauses.append(clause)
+        if not clauses:
+            return []
+
+        key = {"product_id": "$product_id"}
+        if located:
+            key["location_id"] = "$location_id"
+        return InventoryTransaction.collection.aggregate(
+            [
+                {"$match": {"$or": clauses}},
+                {"$group": {"_id": key, "delta": {"$sum": cls.delta_expression()}}},
+            ]
+        )
+
     @classmethod
-    def bulk_create(cls, transactions):
-        """Bulk create inventory transactions"""
-        for transaction in transactions:
-            transaction["product_id"] = ObjectId(transaction["product_id"])
-            transaction["created_at"] = datetime.utcnow()
-            transaction["updated_at"] = datetime.utcnow()
-        result = cls.collection.insert_many(transactions)
-        return [str(inserted_id) for inserted_id in result.inserted_ids]
+    def build(cls, as_of, product_ids, locations=False):
+        """Write snapshots at ``as_of`` for the given products.
+
+        Each product starts from its latest earlier snapshot and adds the
+        transactions since, so only products with movements in between get
+        new snapshots; with ``locations`` every location the product has
+        stock history at is snapshotted too. Re-running a build replaces its
+        snapshots. Returns the number of products snapshotted.
+        """
+        latest = cls.latest(product_ids, as_of)
+        levels = {}
+
+        since = {
+            product_id: latest.get(product_id, {}).get("product", (None,))[0]
+            for product_id in product_ids
+        }
+        for movement in cls.movements(as_of, since):
+            product_id = movement["_id"]["product_id"]
+            _, quantity = latest.get(product_id, {}).get("product", (None, 0))
+            levels[product_id] = {None: quantity + movement["delta"]}
+
+        if locations:
+            since = {
+                product_id: latest.get(product_id, {}).get("locations", (None,))[0]
+                for product_id in product_ids
+            }
+            moved = {}
+            for movement in cls.movements(as_of, since, located=True):
+                product_id = movement["_id"]["product_id"]
+                moved.setdefault(product_id, {})[movement["_id"]["location_id"]] = (
+                    movement["delta"]
+                )
+            for product_id, deltas in moved.items():
+                if product_id not in levels:
+                    # Location snapshots lag the product-wide one; carry that
+                    # forward so every snapshot of the product shares as_of
+                    _, quantity = latest[product_id]["product"]
+                    levels[product_id] = {None: quantity}
+                _, quantities = latest.get(product_id, {}).get("locations", (None, {}))
+                for location_id in set(quantities) | set(deltas):
+                    levels[product_id][location_id] = quantities.get(
+                        location_id, 0
+                    ) + deltas.get(location_id, 0)
+
+        now = datetime.utcnow()
+        operations = [
+            ReplaceOne(
+                {"product_id": product_id, "location_id": location_id, "as_of": as_of},
+                {
+                    "product_id": product_id,
+                    "location_id": location_id,
+                    "as_of": as_of,
+                    "quantity": quantity,
+                    "created_at": now,
+                },
+                upsert=True,
+            )
+            for product_id, quantities in levels.items()
+            for location_id, quantity in quantities.items()
+        ]
+        if operations:
+            cls.collection.bulk_write(operations, ordered=False)
+        return len(levels)
+
+    @classmethod
+    def stock_as_of(cls, product_id, as_of, location_id=None):
+        """On-hand quantity of a product (at a location) at ``as_of``, from
+        the nearest earlier snapshot plus the transactions since"""
+        product_id = ObjectId(product_id)
+        location_id = ObjectId(location_id) if location_id else None
+        snapshot = cls.collection.find_one(
+            {
+                "product_id": product_id,
+                "location_id": location_id,
+                "as_of": {"$lte": as_of},
+            },
+            sort=[("as_of", -1)],
+        )
+
+        criteria = {"product_id": product_id, "created_at": {"$lt": as_of}}
+        if snapshot:
+            criteria["created_at"]["$gte"] = snapshot["as_of"]
+        if location_id:
+            criteria["location_id"] = location_id
+        result = list(
+            InventoryTransaction.collection.aggregate(
+                [
+                    {"$match": criteria},
+                    {
+                        "$group": {
+                            "_id": None,
+                            "delta": {"$sum": cls.delta_expression()},
+                            "transactions": {"$sum": 1},
+                        }
+                    },
+                ]
+            )
+        )
+        replayed = result[0] if result else {"delta": 0, "transactions": 0}
+
+        return {
+            "product_id": str(product_id),
+            "location_id": str(location_id) if location_id else None,
+            "as_of": as_of,
+            "quantity": (snapshot["quantity"] if snapshot else 0) + replayed["delta"],
+            "snapshot_as_of": snapshot["as_of"] if snapshot else None,
+            "replayed_transactions": replayed["transactions"],
+        }
@@ -1,3 +1,488 @@
-from django.test import TestCase
+import io
+from datetime import datetime, timedelta
+from unittest import mock
+from bson import ObjectId
+from django.core.management import CommandError, call_command
+from inventory_db.testing import MongomockTestCase, response_json
+from products.models import Product
+from products.tests import product_payload
+from .models import InventoryTransaction
 
-# Create your tests here.
+
+class TransactionTestCase(MongomockTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = self.create_product()
+
+    def create_product(self, **fields):
+        response = self.client.post(
+            "/products/products/",
+            product_payload(**fields),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()["data"]
+
+    def create_transaction(self, **fields):
+        response = self.post(
+            {
+                "product_id": self.product["id"],
+                "quantity": 5,
+                "transaction_type": "purchase",
+                **fields,
+            }
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()["data"]
+
+    def post(self, body):
+        return self.client.post(
+            "/transactions/transactions/", body, content_type="application/json"
+        )
+
+    def quantity(self, product=None):
+        return Product.get_by_id((product or self.product)["id"])["quantity"]
+
+
+class PostingTests(TransactionTestCase):
+    def test_transactions_move_stock(self):
+        purchase = self.create_transaction(quantity=5)
+        self.create_transaction(quantity=2, transaction_type="sale")
+        self.create_transaction(quantity=-1, transaction_type="adjustment")
+        self.assertEqual(self.quantity(), 3 + 5 - 2 - 1)
+        self.assertTrue(purchase["posted"])
+        self.assertEqual(purchase["delta"], 5)
+
+    def test_bulk_posts_group_per_product(self):
+        other = self.create_product(sku="B", quantity=0)
+        response = self.post(
+            [
+                {
+                    "product_id": self.product["id"],
+                    "quantity": 4,
+                    "transaction_type": "purchase",
+                },
+                {
+                    "product_id": other["id"],
+                    "quantity": 6,
+                    "transaction_type": "return",
+                },
+                {
+                    "product_id": self.product["id"],
+                    "quantity": 1,
+                    "transaction_type": "sale",
+                },
+                {
+                    "product_id": self.product["id"],
+                    "quantity": 1,
+                    "transaction_type": "gift",
+                },
+            ]
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([error["index"] for error in response.json()["errors"]], [3])
+        self.assertEqual(self.quantity(), 6)
+        self.assertEqual(self.quantity(other), 6)
+
+    def test_posting_twice_moves_stock_once(self):
+        transaction = self.create_transaction()
+        stored = InventoryTransaction.collection.find_one(
+            {"_id": ObjectId(transaction["id"])}
+        )
+        InventoryTransaction.post([stored])
+        self.assertEqual(self.quantity(), 8)
+
+    def test_pending_transactions_are_posted(self):
+        applied = self.create_transaction(quantity=2)
+        unapplied = InventoryTransaction.prepare(
+            {
+                "product_id": self.product["id"],
+                "quantity": 4,
+                "transaction_type": "purchase",
+            }
+        )
+        InventoryTransaction.collection.insert_one(unapplied)
+        # The write that posted this one was interrupted before marking it
+        InventoryTransaction.collection.update_one(
+            {"_id": ObjectId(applied["id"])}, {"$set": {"posted": False}}
+        )
+        InventoryTransaction.collection.update_many(
+            {"posted": False},
+            {"$set": {"created_at": datetime.utcnow() - timedelta(minutes=5)}},
+        )
+        call_command("post_transactions", stdout=io.StringIO())
+        self.assertEqual(self.quantity(), 3 + 2 + 4)
+        self.assertEqual(
+            InventoryTransaction.collection.count_documents({"posted": False}), 0
+        )
+
+
+class PostedTransactionTests(TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.transaction = self.create_transaction()
+        self.path = f"/transactions/transactions/{self.transaction['id']}/"
+
+    def put(self, changes):
+        return self.client.put(self.path, changes, content_type="application/json")
+
+    def test_reference_can_change(self):
+        response = self.put({"reference": "PO-7"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["reference"], "PO-7")
+
+    def test_ledger_fields_are_fixed(self):
+        for changes in (
+            {"quantity": 50},
+            {"transaction_type": "sale"},
+            {"product_id": str(ObjectId())},
+            {"delta": 1},
+            {"posted": False},
+        ):
+            with self.subTest(changes=changes):
+                response = self.put(changes)
+                self.assertEqual(response.status_code, 400)
+                self.assertIsNone(response.json()["data"])
+        self.assertEqual(self.quantity(), 8)
+
+    def test_cannot_be_deleted(self):
+        response = self.client.delete(self.path)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(),
+            {
+                "message": "Posted transactions cannot be deleted; post an "
+                "adjustment instead",
+                "data": None,
+            },
+        )
+
+        response = self.client.delete(
+            "/transactions/transactions/",
+            [self.transaction["id"]],
+            content_type="application/json",
+        )
+        self.assertEqual(response.json()["summary"], {"error": 1})
+        self.assertIsNotNone(InventoryTransaction.get_by_id(self.transaction["id"]))
+
+    def test_bulk_update(self):
+        other = self.create_transaction(quantity=1)
+        response = self.client.patch(
+            "/transactions/transactions/",
+            [
+                {"id": self.transaction["id"], "changes": {"reference": "PO-7"}},
+                {"id": other["id"], "changes": {"quantity": 50}},
+            ],
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        outcomes = response.json()["data"]
+        self.assertEqual(
+            [outcome["status"] for outcome in outcomes], ["updated", "error"]
+        )
+        self.assertIn("post an adjustment", outcomes[1]["message"])
+        self.assertEqual(
+            InventoryTransaction.get_by_id(self.transaction["id"])["reference"], "PO-7"
+        )
+        self.assertEqual(self.quantity(), 9)
+
+    def test_products_cannot_set_their_markers(self):
+        response = self.client.put(
+            f"/products/products/{self.product['id']}/",
+            {"posted_transactions": []},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.quantity(), 8)
+
+
+@mock.patch.object(InventoryTransaction, "TIMESERIES", True)
+class TimeSeriesModeTests(TransactionTestCase):
+    def database(self):
+        return type(InventoryTransaction.collection.database)
+
+    def test_ids_are_looked_up_within_their_time_window(self):
+        transaction_id = ObjectId()
+        criteria = InventoryTransaction.id_filter(str(transaction_id))
+        created = transaction_id.generation_time.replace(tzinfo=None)
+        self.assertEqual(criteria["_id"], transaction_id)
+        self.assertLess(criteria["created_at"]["$gte"], created)
+        self.assertGreater(criteria["created_at"]["$lte"], created)
+
+    def test_reads_and_writes_by_id(self):
+        transaction = self.create_transaction()
+        path = f"/transactions/transactions/{transaction['id']}/"
+        response = self.client.get(path)
+        self.assertEqual(response.json()["data"]["quantity"], 5)
+
+        response = self.client.put(
+            path, {"reference": "PO-1"}, content_type="application/json"
+        )
+        self.assertEqual(response.json()["data"]["reference"], "PO-1")
+        response = self.client.patch(
+            "/transactions/transactions/",
+            [{"id": transaction["id"], "changes": {"reference": "PO-2"}}],
+            content_type="application/json",
+        )
+        self.assertEqual(response.json()["summary"], {"updated": 1})
+        self.assertEqual(
+            InventoryTransaction.get_by_id(transaction["id"])["reference"], "PO-2"
+        )
+        self.assertEqual(self.client.delete(path).status_code, 400)
+
+        # Rows written before the ledger have no posted flag and may go
+        legacy = {
+            "product_id": ObjectId(self.product["id"]),
+            "quantity": 1,
+            "transaction_type": "sale",
+            "created_at": datetime.utcnow(),
+        }
+        InventoryTransaction.collection.insert_one(legacy)
+        response = self.client.delete(f"/transactions/transactions/{legacy['_id']}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(InventoryTransaction.get_by_id(legacy["_id"]))
+
+    def test_collection_is_created_as_time_series(self):
+        with mock.patch.object(
+            self.database(), "list_collections", return_value=[]
+        ), mock.patch.object(self.database(), "create_collection") as create:
+            message = InventoryTransaction.ensure_collection()
+        self.assertEqual(message, "created time-series collection")
+        create.assert_called_once_with(
+            "inventory_transactions",
+            timeseries=InventoryTransaction.TIMESERIES_OPTIONS,
+        )
+
+        existing = [{"name": "inventory_transactions", "type": "timeseries"}]
+        with mock.patch.object(
+            self.database(), "list_collections", return_value=existing
+        ):
+            self.assertIsNone(InventoryTransaction.ensure_collection())
+
+    def test_regular_collection_is_not_converted(self):
+        existing = [{"name": "inventory_transactions", "type": "collection"}]
+        with mock.patch.object(
+            self.database(), "list_collections", return_value=existing
+        ):
+            with self.assertRaisesMessage(ValueError, "exists as a regular collection"):
+                InventoryTransaction.ensure_collection()
+
+
+class HistoryTests(TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = self.create_product(sku="B")
+        # Product creates record opening balances; start from an empty ledger
+        InventoryTransaction.collection.delete_many({})
+        start = datetime(2025, 3, 1, 12)
+        rows = [
+            (self.product, "purchase", "PO-1"),
+            (self.product, "sale", "SO-1"),
+            (self.other, "purchase", "PO-1"),
+            (self.product, "purchase", "PO-2"),
+            (self.product, "return", None),
+        ]
+        for day, (product, transaction_type, reference) in enumerate(rows):
+            transaction = self.create_transaction(
+                product_id=product["id"],
+                transaction_type=transaction_type,
+                reference=reference,
+            )
+            InventoryTransaction.collection.update_one(
+                {"_id": ObjectId(transaction["id"])},
+                {"$set": {"created_at": start + timedelta(days=day)}},
+            )
+
+    def history(self, query):
+        response = self.client.get(f"/transactions/transactions/?{query}")
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def days(self, transactions):
+        return [transaction["created_at"][8:10] for transaction in transactions]
+
+    def test_filters(self):
+        product = f"product_id={self.product['id']}"
+        for query, expected in [
+            (product, ["05", "04", "02", "01"]),
+            (f"{product}&order=1", ["01", "02", "04", "05"]),
+            ("transaction_type=purchase", ["04", "03", "01"]),
+            ("reference=PO-1", ["03", "01"]),
+            ("from=2025-03-02&to=2025-03-04", ["04", "03", "02"]),
+            ("from=2025-03-02T12:00:00%2B01:00&to=2025-03-02", ["02"]),
+        ]:
+            with self.subTest(query=query):
+                self.assertEqual(self.days(self.history(query)["data"]), expected)
+
+    def test_pages(self):
+        for order in (1, -1):
+            with self.subTest(order=order):
+                days, cursor = [], ""
+                while True:
+                    body = self.history(f"order={order}&limit=2&cursor={cursor}")
+                    days += self.days(body["data"])
+                    cursor = body["next_cursor"]
+                    if not cursor:
+                        break
+                expected = ["01", "02", "03", "04", "05"]
+                self.assertEqual(days, expected[::order])
+
+    def test_stream_matches_pages(self):
+        query = f"product_id={self.product['id']}&limit=1000"
+        streamed = response_json(
+            self.client.get(f"/transactions/transactions/?{query}&stream=1")
+        )
+        self.assertEqual(streamed["data"], self.history(query)["data"])
+
+    def test_fields(self):
+        body = self.history("order=1&limit=1&fields=quantity")
+        self.assertEqual(set(body["data"][0]), {"id", "quantity"})
+        body = self.history(
+            f"order=1&limit=1&fields=quantity&cursor={body['next_cursor']}"
+        )
+        self.assertEqual(len(body["data"]), 1)
+
+    def test_raw_reads(self):
+        product = f"product_id={self.product['id']}"
+        listed = self.history(f"{product}&limit=1000")["data"]
+        for query in ("raw=1", f"raw=1&{product}&fields=quantity"):
+            with self.subTest(query=query):
+                response = self.client.get(f"/transactions/transactions/?{query}")
+                body = response_json(response)
+                self.assertEqual(body["count"], len(body["data"]))
+                self.assertIn("$oid", body["data"][0]["_id"])
+        # History filters keep their order, newest first
+        self.assertEqual(
+            [document["_id"]["$oid"] for document in body["data"]],
+            [transaction["id"] for transaction in listed],
+        )
+        self.assertEqual(set(body["data"][0]), {"_id", "quantity"})
+
+        response = self.client.get("/transactions/transactions/?raw=1&order=0")
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_parameters(self):
+        cursor = self.history("limit=1")["next_cursor"]
+        for query in [
+            "product_id=nope",
+            "transaction_type=gift",
+            "from=yesterday",
+            "to=2025-13-01",
+            "order=0",
+            "limit=0",
+            "limit=1001",
+            "cursor=nope",
+            f"order=1&cursor={cursor}",
+        ]:
+            with self.subTest(query=query):
+                response = self.client.get(f"/transactions/transactions/?{query}")
+                self.assertEqual(response.status_code, 400)
+                self.assertIsNone(response.json()["data"])
+
+
+class StockAsOfTests(TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.location = self.create_location()
+        # Opening balance of 3 on March 1st, then one movement a day
+        movements = [
+            (5, "purchase", None),
+            (2, "sale", self.location),
+            (4, "purchase", self.location),
+            (1, "return", None),
+        ]
+        for quantity, transaction_type, location in movements:
+            self.create_transaction(
+                quantity=quantity,
+                transaction_type=transaction_type,
+                **({"location_id": location["id"]} if location else {}),
+            )
+        for day, row in enumerate(
+            InventoryTransaction.collection.find().sort("_id", 1), start=1
+        ):
+            InventoryTransaction.collection.update_one(
+                {"_id": row["_id"]},
+                {"$set": {"created_at": datetime(2025, 3, day, 12)}},
+            )
+
+    def create_location(self):
+        response = self.client.post(
+            "/locations/locations/",
+            {
+                "name": "Main",
+                "address": "1 Road",
+                "city": "Leeds",
+                "state": "WY",
+                "country": "UK",
+                "postal_code": "LS1",
+            },
+            content_type="application/json",
+        )
+        return response.json()["data"]
+
+    def stock(self, as_of, location=None):
+        query = f"as_of={as_of}"
+        if location:
+            query += f"&location_id={location['id']}"
+        response = self.client.get(f"/transactions/stock/{self.product['id']}/?{query}")
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["data"]
+
+    def build(self, *args):
+        call_command("build_snapshots", *args, stdout=io.StringIO())
+
+    def assertStock(self, expected, location=None):
+        for as_of, quantity in expected.items():
+            with self.subTest(as_of=as_of, location=location):
+                self.assertEqual(self.stock(as_of, location)["quantity"], quantity)
+
+    def test_replay(self):
+        expected = {
+            "2025-02-28": 0,
+            "2025-03-01T12:00:00": 0,
+            "2025-03-01": 3,
+            "2025-03-02T13:00:00": 8,
+            "2025-03-03": 6,
+            "2025-03-04": 10,
+            "2025-03-05": 11,
+        }
+        self.assertStock(expected)
+        self.assertEqual(self.stock("2025-03-05")["quantity"], self.quantity())
+        self.assertStock(
+            {"2025-03-02": 0, "2025-03-03": -2, "2025-03-04": 2}, self.location
+        )
+
+    def test_snapshots_give_the_same_stock(self):
+        self.build("--from", "2025-03-02", "--as-of", "2025-03-04", "--locations")
+        stock = self.stock("2025-03-05")
+        self.assertEqual(stock["snapshot_as_of"], "2025-03-04T00:00:00")
+        self.assertEqual(stock["replayed_transactions"], 2)
+        self.assertStock({"2025-03-02T13:00:00": 8, "2025-03-03": 6, "2025-03-05": 11})
+        self.assertStock({"2025-03-03": -2, "2025-03-04T13:00:00": 2}, self.location)
+
+        # Rebuilding replaces the snapshots rather than adding to them
+        self.build("--as-of", "2025-03-04", "--locations")
+        self.assertStock({"2025-03-05": 11})
+        self.assertStock({"2025-03-05": 2}, self.location)
+
+    def test_invalid_requests(self):
+        for path in [
+            f"/transactions/stock/{self.product['id']}/?as_of=soon",
+            f"/transactions/stock/{self.product['id']}/?location_id=nope",
+            "/transactions/stock/nope/",
+        ]:
+            with self.subTest(path=path):
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, 400)
+                self.assertIsNone(response.json()["data"])
+
+    def test_invalid_builds(self):
+        future = (datetime.utcnow() + timedelta(minutes=1)).isoformat()
+        for args, message in [
+            (["--as-of", future], "--as-of must be at least"),
+            (["--as-of", "2025-03-01", "--from", "2025-03-02"], "--from must be"),
+            (["--as-of", "March"], "Invalid date"),
+        ]:
+            with self.subTest(args=args):
+                with self.assertRaisesMessage(CommandError, message):
+                    self.build(*args)
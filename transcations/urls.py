@@ -1,5 +1,9 @@
 from django.urls import path
-from .views import InventoryTransactionView, InventoryTransactionDetailView
+from .views import (
+    InventoryTransactionView,
+    InventoryTransactionDetailView,
+    StockAsOfView,
+)
 
 urlpatterns = [
     path("transactions/", InventoryTransactionView.as_view(), name="transaction_view"),
@@ -8,4 +12,5 @@ urlpatterns = [
         InventoryTransactionDetailView.as_view(),
         name="transaction_detail_view",
     ),
+    path("stock/<str:product_id>/", StockAsOfView.as_view(), name="stock_as_of_view"),
 ]
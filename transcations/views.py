@@ -1,10 +1,23 @@
 import json
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from django.http import JsonResponse
 from django.views import View
 from bson import ObjectId
-from .models import InventoryTransaction
+from datetime import date, datetime, timedelta, timezone
+from inventory_db.bulk import outcome_counts
+from inventory_db.conditional import detail_condition, list_condition
+from inventory_db.pagination import InvalidCursor, decode_cursor
+from inventory_db.parsing import BulkBody, InvalidBody, read_body, update_error
+from inventory_db.projection import InvalidFields, parse_fields
+from inventory_db.serialization import JsonResponse, dumps_raw
+from inventory_db.streaming import (
+    bulk_create_response,
+    stream_batch_size,
+    stream_list_response,
+    wants_raw,
+    wants_stream,
+)
+from .models import InventoryTransaction, StockSnapshot
 
 
 def validate_object_id(value):
@@ -12,29 +25,110 @@ def validate_object_id(value):
     return ObjectId.is_valid(value)
 
 
+class InvalidQuery(ValueError):
+    """Raised when query parameters fail validation"""
+
+
+# Query parameters that select a page of history instead of every transaction
+HISTORY_PARAMS = [
+    "product_id",
+    "transaction_type",
+    "reference",
+    "from",
+    "to",
+    "order",
+    "limit",
+    "cursor",
+]
+
+
+def parse_date(name, value, end=False):
+    """Parse an ISO 8601 date or datetime into a naive UTC datetime.
+
+    A bare date used as the ``end`` of a range covers that whole day.
+    """
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise InvalidQuery(f"Invalid {name} date, expected ISO 8601")
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    if end and len(value) == len(date.min.isoformat()):
+        parsed += timedelta(days=1)
+    return parsed
+
+
+def parse_history_params(query_params):
+    """Validate history parameters, returning (criteria, order, limit,
+    after) where after is the decoded keyset cursor, if any"""
+    criteria = {}
+    product_id = query_params.get("product_id")
+    if product_id is not None:
+        if not validate_object_id(product_id):
+            raise InvalidQuery("Invalid product ID format")
+        criteria["product_id"] = ObjectId(product_id)
+    transaction_type = query_params.get("transaction_type")
+    if transaction_type is not None:
+        if transaction_type not in InventoryTransaction.TRANSACTION_TYPES:
+            raise InvalidQuery(
+                "Invalid transaction type. Valid types: "
+                + ", ".join(InventoryTransaction.TRANSACTION_TYPES)
+            )
+        criteria["transaction_type"] = transaction_type
+    if query_params.get("reference") is not None:
+        criteria["reference"] = query_params["reference"]
+
+    # from is inclusive and to is exclusive
+    created_at = {}
+    if query_params.get("from"):
+        created_at["$gte"] = parse_date("from", query_params["from"])
+    if query_params.get("to"):
+        created_at["$lt"] = parse_date("to", query_params["to"], end=True)
+    if created_at:
+        criteria["created_at"] = created_at
+
+    try:
+        order = int(query_params.get("order", -1))
+        if order not in (1, -1):
+            raise ValueError
+    except ValueError:
+        raise InvalidQuery("Order must be 1 (oldest first) or -1 (newest first)")
+
+    try:
+        limit = int(query_params.get("limit", 100))
+        if not 1 <= limit <= 1000:
+            raise ValueError
+    except ValueError:
+        raise InvalidQuery("Limit must be between 1 and 1000")
+
+    after = None
+    if query_params.get("cursor"):
+        try:
+            after = decode_cursor(query_params["cursor"], "created_at", order)
+        except InvalidCursor as exc:
+            raise InvalidQuery(str(exc))
+
+    return criteria, order, limit, after
+
+
 @method_decorator(csrf_exempt, name="dispatch")
+@method_decorator(list_condition("inventory_transactions"), name="get")
 class InventoryTransactionView(View):
     def post(self, request):
         """Create a new inventory transaction or bulk create transactions"""
         try:
-            data = json.loads(request.body)
-        except json.JSONDecodeError:
+            data = read_body(request)
+        except InvalidBody:
             return JsonResponse(
                 {"message": "Invalid JSON format", "data": None}, status=400
             )
 
-        if isinstance(data, list):
-            transaction_ids = InventoryTransaction.bulk_create(data)
-            new_transactions = [
-                InventoryTransaction.get_by_id(transaction_id)
-                for transaction_id in transaction_ids
-            ]
-            return JsonResponse(
-                {
-                    "message": "Transactions created successfully",
-                    "data": new_transactions,
-                },
-                status=201,
+        if isinstance(data, BulkBody):
+            return bulk_create_response(
+                data,
+                InventoryTransaction.iter_bulk_create(data),
+                "Transactions created successfully",
+                {"message": "Failed to create transactions", "data": None},
             )
 
         required_fields = ["product_id", "quantity", "transaction_type"]
@@ -43,16 +137,53 @@ class InventoryTransactionView(View):
                 {"message": "Missing required fields", "data": None}, status=400
             )
 
-        transaction_id = InventoryTransaction.create(**data)
-        new_transaction = InventoryTransaction.get_by_id(transaction_id)
+        if not validate_object_id(data["product_id"]):
+            return JsonResponse(
+                {"message": "Invalid product ID format", "data": None}, status=400
+            )
+        if data.get("location_id") and not validate_object_id(data["location_id"]):
+            return JsonResponse(
+                {"message": "Invalid location ID format", "data": None}, status=400
+            )
+
+        try:
+            new_transaction = InventoryTransaction.create(**data)
+        except ValueError as exc:
+            return JsonResponse({"message": str(exc), "data": None}, status=400)
         return JsonResponse(
             {"message": "Transaction created successfully", "data": new_transaction},
             status=201,
         )
 
     def get(self, request):
-        """Get all inventory transactions"""
-        transactions = InventoryTransaction.get_all()
+        """Get all inventory transactions, or a page of history filtered by
+        product_id, transaction_type, reference and a from/to date range"""
+        try:
+            fields = parse_fields(request)
+        except InvalidFields as exc:
+            return JsonResponse({"message": str(exc), "data": None}, status=400)
+
+        if any(param in request.GET for param in HISTORY_PARAMS):
+            return self.get_history(request, fields)
+
+        if wants_raw(request):
+            return stream_list_response(
+                InventoryTransaction.iter_raw(
+                    batch_size=stream_batch_size(), fields=fields
+                ),
+                "Transactions retrieved successfully",
+                encode=dumps_raw,
+            )
+
+        if wants_stream(request):
+            return stream_list_response(
+                InventoryTransaction.iter_all(
+                    batch_size=stream_batch_size(), fields=fields
+                ),
+                "Transactions retrieved successfully",
+            )
+
+        transactions = InventoryTransaction.get_all(fields=fields)
         return JsonResponse(
             {
                 "message": "Transactions retrieved successfully",
@@ -63,17 +194,115 @@ class InventoryTransactionView(View):
             safe=False,
         )
 
+    def get_history(self, request, fields):
+        """Get transaction history one keyset page at a time, or all of it
+        when streamed"""
+        try:
+            criteria, order, limit, after = parse_history_params(request.GET)
+        except InvalidQuery as exc:
+            return JsonResponse({"message": str(exc), "data": None}, status=400)
+
+        if wants_raw(request):
+            return stream_list_response(
+                InventoryTransaction.iter_raw(
+                    criteria,
+                    [("created_at", order), ("_id", order)],
+                    batch_size=stream_batch_size(),
+                    fields=fields,
+                ),
+                "Transactions retrieved successfully",
+                encode=dumps_raw,
+            )
+
+        if wants_stream(request):
+            return stream_list_response(
+                InventoryTransaction.iter_history(
+                    criteria, order, batch_size=stream_batch_size(), fields=fields
+                ),
+                "Transactions retrieved successfully",
+            )
+
+        transactions, next_cursor = InventoryTransaction.get_history_page(
+            criteria, order, limit, after, fields=fields
+        )
+        return JsonResponse(
+            {
+                "message": "Transactions retrieved successfully",
+                "data": transactions,
+                "count": len(transactions),
+                "next_cursor": next_cursor,
+            },
+            status=200,
+        )
+
+    def patch(self, request):
+        """Bulk update transactions from a list of {id, changes}"""
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse(
+                {"message": "Invalid JSON format", "data": None}, status=400
+            )
+        if not isinstance(data, list):
+            return JsonResponse(
+                {"message": "Expected a list of {id, changes} objects", "data": None},
+                status=400,
+            )
+
+        outcomes = InventoryTransaction.bulk_update(data)
+        summary = outcome_counts(outcomes)
+        return JsonResponse(
+            {
+                "message": f"Updated {summary.get('updated', 0)} of {len(outcomes)} transactions",
+                "data": outcomes,
+                "count": len(outcomes),
+                "summary": summary,
+            },
+            status=200,
+        )
+
+    def delete(self, request):
+        """Bulk delete transactions from a list of IDs"""
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse(
+                {"message": "Invalid JSON format", "data": None}, status=400
+            )
+        if not isinstance(data, list):
+            return JsonResponse(
+                {"message": "Expected a list of IDs", "data": None}, status=400
+            )
+
+        outcomes = InventoryTransaction.bulk_delete(data)
+        summary = outcome_counts(outcomes)
+        return JsonResponse(
+            {
+                "message": f"Deleted {summary.get('deleted', 0)} of {len(outcomes)} transactions",
+                "data": outcomes,
+                "count": len(outcomes),
+                "summary": summary,
+            },
+            status=200,
+        )
+
 
 @method_decorator(csrf_exempt, name="dispatch")
+@method_decorator(detail_condition(InventoryTransaction, "transaction_id"), name="get")
 class InventoryTransactionDetailView(View):
     def get(self, request, transaction_id):
         """Get a specific inventory transaction by ID"""
+        try:
+            fields = parse_fields(request)
+        except InvalidFields as exc:
+            return JsonResponse({"message": str(exc), "data": None}, status=400)
+
         if not validate_object_id(transaction_id):
             return JsonResponse(
                 {"message": "Invalid transaction ID format", "data": None}, status=400
             )
 
-        transaction = InventoryTransaction.get_by_id(transaction_id)
+        transaction = InventoryTransaction.get_by_id(transaction_id, fields=fields)
         if not transaction:
             return JsonResponse(
                 {"message": "Transaction not found", "data": None}, status=404
@@ -97,9 +326,18 @@ class InventoryTransactionDetailView(View):
                 {"message": "Invalid JSON format", "data": None}, status=400
             )
 
-        success = InventoryTransaction.update(transaction_id, data)
-        if success:
-            updated_transaction = InventoryTransaction.get_by_id(transaction_id)
+        reason = update_error(data)
+        if reason:
+            return JsonResponse({"message": reason, "data": None}, status=400)
+
+        try:
+            updated_transaction = InventoryTransaction.update(transaction_id, data)
+        except ValueError as exc:
+            return JsonResponse(
+                {"message": str(exc), "data": None},
+                status=getattr(exc, "status", 400),
+            )
+        if updated_transaction:
             return JsonResponse(
                 {
                     "message": "Transaction updated successfully",
@@ -118,7 +356,10 @@ class InventoryTransactionDetailView(View):
                 {"message": "Invalid transaction ID format", "data": None}, status=400
             )
 
-        success = InventoryTransaction.delete(transaction_id)
+        try:
+            success = InventoryTransaction.delete(transaction_id)
+        except ValueError as exc:
+            return JsonResponse({"message": str(exc), "data": None}, status=400)
         return JsonResponse(
             {
                 "message": (
@@ -129,3 +370,33 @@ class InventoryTransactionDetailView(View):
             },
             status=200 if success else 500,
         )
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class StockAsOfView(View):
+    def get(self, request, product_id):
+        """Get a product's on-hand stock at ``as_of`` (default: now), across
+        locations or at ``location_id``; a bare date means the end of that day"""
+        location_id = request.GET.get("location_id")
+        if not validate_object_id(product_id):
+            return JsonResponse(
+                {"message": "Invalid product ID format", "data": None}, status=400
+            )
+        if location_id is not None and not validate_object_id(location_id):
+            return JsonResponse(
+                {"message": "Invalid location ID format", "data": None}, status=400
+            )
+
+        try:
+            as_of = (
+                parse_date("as_of", request.GET["as_of"], end=True)
+                if request.GET.get("as_of")
+                else datetime.utcnow()
+            )
+        except InvalidQuery as exc:
+            return JsonResponse({"message": str(exc), "data": None}, status=400)
+
+        stock = StockSnapshot.stock_as_of(product_id, as_of, location_id)
+        return JsonResponse(
+            {"message": "Stock retrieved successfully", "data": stock}, status=200
+        )
@@ -1,3 +1,100 @@
-from django.test import TestCase
+from bson import ObjectId
+from inventory_db.indexes import ensure_indexes
+from inventory_db.testing import MongomockTestCase
+from .models import User
 
-# Create your tests here.
+
+def user_payload(**fields):
+    """Body of a valid user create request"""
+    return {
+        "username": "ada",
+        "email": "ada@example.com",
+        "password": "secret",
+        "first_name": "Ada",
+        **fields,
+    }
+
+
+class UserTestCase(MongomockTestCase):
+    def create_user(self, **fields):
+        response = self.client.post(
+            "/users/users/", user_payload(**fields), content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()["data"]
+
+    def put(self, path, data):
+        return self.client.put(path, data, content_type="application/json")
+
+
+class RepositoryTests(UserTestCase):
+    def setUp(self):
+        super().setUp()
+        ensure_indexes(User)
+        self.user = self.create_user()
+        self.path = f"/users/users/{self.user['id']}/"
+
+    def test_crud(self):
+        self.assertEqual(self.client.get(self.path).json()["data"], self.user)
+        self.assertEqual(
+            self.client.get("/users/users/?fields=username").json()["data"],
+            [{"id": self.user["id"], "username": "ada"}],
+        )
+
+        response = self.put(self.path, {"first_name": "Augusta"})
+        self.assertEqual(response.status_code, 200)
+        updated = response.json()["data"]
+        self.assertEqual(updated["first_name"], "Augusta")
+        self.assertEqual(updated["created_at"], self.user["created_at"])
+        self.assertGreaterEqual(updated["updated_at"], self.user["updated_at"])
+
+        self.assertEqual(self.client.delete(self.path).status_code, 200)
+        self.assertEqual(self.client.get(self.path).status_code, 404)
+
+    def test_refused_updates(self):
+        self.create_user(username="grace", email="grace@example.com")
+        for data, status in [
+            ([{"first_name": "Augusta"}], 400),
+            ("nope", 400),
+            ({"_id": str(ObjectId())}, 400),
+            ({"username": "grace"}, 409),
+            ({"email": "grace@example.com"}, 409),
+        ]:
+            with self.subTest(data=data):
+                response = self.put(self.path, data)
+                self.assertEqual(response.status_code, status)
+                self.assertIsNone(response.json()["data"])
+        self.assertEqual(User.collection.find_one()["username"], "ada")
+
+    def test_missing_and_invalid_ids(self):
+        for path, status in [
+            (f"/users/users/{ObjectId()}/", 404),
+            ("/users/users/nope/", 400),
+        ]:
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(path).status_code, status)
+                self.assertEqual(
+                    self.put(path, {"first_name": "A"}).status_code, status
+                )
+
+
+class BulkWriteTests(UserTestCase):
+    def test_duplicate_keys_fail_their_item_only(self):
+        ensure_indexes(User)
+        ada = self.create_user()
+        grace = self.create_user(username="grace", email="grace@example.com")
+        response = self.client.patch(
+            "/users/users/",
+            [
+                {"id": ada["id"], "changes": {"username": "grace"}},
+                {"id": grace["id"], "changes": {"first_name": "Grace"}},
+            ],
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        outcomes = response.json()["data"]
+        self.assertEqual(
+            [outcome["status"] for outcome in outcomes], ["error", "updated"]
+        )
+        self.assertEqual(User.get_by_id(ada["id"])["username"], "ada")
+        self.assertEqual(User.get_by_id(grace["id"])["first_name"], "Grace")
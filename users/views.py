@@ -1,9 +1,19 @@
 import json
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from django.http import JsonResponse
 from django.views import View
 from bson import ObjectId
+from inventory_db.bulk import outcome_counts
+from inventory_db.conditional import detail_condition, list_condition
+from inventory_db.parsing import BulkBody, InvalidBody, read_body, update_error
+from inventory_db.projection import InvalidFields, parse_fields
+from inventory_db.serialization import JsonResponse
+from inventory_db.streaming import (
+    bulk_create_response,
+    stream_batch_size,
+    stream_list_response,
+    wants_stream,
+)
 from .models import User
 
 
@@ -13,21 +23,23 @@ def validate_object_id(value):
 
 
 @method_decorator(csrf_exempt, name="dispatch")
+@method_decorator(list_condition("users"), name="get")
 class UserView(View):
     def post(self, request):
         """Create a new user or bulk create users"""
         try:
-            data = json.loads(request.body)
-        except json.JSONDecodeError:
+            data = read_body(request)
+        except InvalidBody:
             return JsonResponse(
                 {"message": "Invalid JSON format", "data": None}, status=400
             )
 
-        if isinstance(data, list):
-            user_ids = User.bulk_create(data)
-            new_users = [User.get_by_id(user_id) for user_id in user_ids]
-            return JsonResponse(
-                {"message": "Users created successfully", "data": new_users}, status=201
+        if isinstance(data, BulkBody):
+            return bulk_create_response(
+                data,
+                User.iter_bulk_create(data),
+                "Users created successfully",
+                {"message": "Failed to create users", "data": None},
             )
 
         required_fields = ["username", "email", "password"]
@@ -36,8 +48,7 @@ class UserView(View):
                 {"message": "Missing required fields", "data": None}, status=400
             )
 
-        user_id = User.create(**data)
-        new_user = User.get_by_id(user_id)
+        new_user = User.create(**data)
         return JsonResponse(
             {"message": "User created successfully", "data": new_user},
             status=201,
@@ -45,7 +56,18 @@ class UserView(View):
 
     def get(self, request):
         """Get all users"""
-        users = User.get_all()
+        try:
+            fields = parse_fields(request)
+        except InvalidFields as exc:
+            return JsonResponse({"message": str(exc), "data": None}, status=400)
+
+        if wants_stream(request):
+            return stream_list_response(
+                User.iter_all(batch_size=stream_batch_size(), fields=fields),
+                "Users retrieved successfully",
+            )
+
+        users = User.get_all(fields=fields)
         return JsonResponse(
             {
                 "message": "Users retrieved successfully",
@@ -56,17 +78,74 @@ class UserView(View):
             safe=False,
         )
 
+    def patch(self, request):
+        """Bulk update users from a list of {id, changes}"""
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse(
+                {"message": "Invalid JSON format", "data": None}, status=400
+            )
+        if not isinstance(data, list):
+            return JsonResponse(
+                {"message": "Expected a list of {id, changes} objects", "data": None},
+                status=400,
+            )
+
+        outcomes = User.bulk_update(data)
+        summary = outcome_counts(outcomes)
+        return JsonResponse(
+            {
+                "message": f"Updated {summary.get('updated', 0)} of {len(outcomes)} users",
+                "data": outcomes,
+                "count": len(outcomes),
+                "summary": summary,
+            },
+            status=200,
+        )
+
+    def delete(self, request):
+        """Bulk delete users from a list of IDs"""
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse(
+                {"message": "Invalid JSON format", "data": None}, status=400
+            )
+        if not isinstance(data, list):
+            return JsonResponse(
+                {"message": "Expected a list of IDs", "data": None}, status=400
+            )
+
+        outcomes = User.bulk_delete(data)
+        summary = outcome_counts(outcomes)
+        return JsonResponse(
+            {
+                "message": f"Deleted {summary.get('deleted', 0)} of {len(outcomes)} users",
+                "data": outcomes,
+                "count": len(outcomes),
+                "summary": summary,
+            },
+            status=200,
+        )
+
 
 @method_decorator(csrf_exempt, name="dispatch")
+@method_decorator(detail_condition(User, "user_id"), name="get")
 class UserDetailView(View):
     def get(self, request, user_id):
         """Get a specific user by ID"""
+        try:
+            fields = parse_fields(request)
+        except InvalidFields as exc:
+            return JsonResponse({"message": str(exc), "data": None}, status=400)
+
         if not validate_object_id(user_id):
             return JsonResponse(
                 {"message": "Invalid user ID format", "data": None}, status=400
             )
 
-        user = User.get_by_id(user_id)
+        user = User.get_by_id(user_id, fields=fields)
         if not user:
             return JsonResponse({"message": "User not found", "data": None}, status=404)
         return JsonResponse(
@@ -88,9 +167,18 @@ class UserDetailView(View):
                 {"message": "Invalid JSON format", "data": None}, status=400
             )
 
-        success = User.update(user_id, data)
-        if success:
-            updated_user = User.get_by_id(user_id)
+        reason = update_error(data)
+        if reason:
+            return JsonResponse({"message": reason, "data": None}, status=400)
+
+        try:
+            updated_user = User.update(user_id, data)
+        except ValueError as exc:
+            return JsonResponse(
+                {"message": str(exc), "data": None},
+                status=getattr(exc, "status", 400),
+            )
+        if updated_user:
             return JsonResponse(
                 {"message": "User updated successfully", "data": updated_user},
                 status=200,